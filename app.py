@@ -7,7 +7,7 @@ from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from config import Config
 from database.operations import init_database
-from services.openai_service import init_openai, openai_error_message
+from services.openai_service import init_openai
 from routes.admin_routes import admin_bp
 from routes.api_routes import api_bp
 
@@ -33,10 +33,6 @@ limiter.init_app(app)
 # Session configuration
 app.permanent_session_lifetime = Config.PERMANENT_SESSION_LIFETIME
 
-# Store OpenAI status in app config so it persists
-app.config['OPENAI_AVAILABLE'] = False
-app.config['OPENAI_ERROR_MESSAGE'] = ""
-
 # Initialize DB and OpenAI on startup
 init_database()
 
@@ -47,9 +43,8 @@ try:
 except Exception as e:
     print(f"Admin creation warning: {e}")
 
-openai_success = init_openai()
-app.config['OPENAI_AVAILABLE'] = openai_success
-app.config['OPENAI_ERROR_MESSAGE'] = openai_error_message
+# Non-blocking: availability comes from services.openai_health, refreshed in the background
+init_openai()
 
 # Session middleware for automatic timeout handling
 @app.before_request
@@ -91,6 +86,9 @@ app.register_blueprint(api_bp)
 # EXEMPT API BLUEPRINT FROM CSRF
 csrf.exempt(api_bp)
 
+# Async job polling is frequent and cheap; keep it out of the hourly limits
+limiter.exempt(app.view_functions['api_bp.get_analysis_job_status'])
+
 @app.errorhandler(429)
 def ratelimit_handler(e):
     return {"error": "Rate limit exceeded", "message": str(e.description)}, 429
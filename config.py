@@ -7,8 +7,119 @@ class Config:
     SECRET_KEY = os.environ.get('SESSION_SECRET', 'fallback-secret-key-for-dev')
     DATABASE_URL = os.environ.get('DATABASE_URL')
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+    OPENAI_API_KEYS = os.environ.get('OPENAI_API_KEYS', '')  # pool: "label=sk-...|org-id,label2=sk-..." (see services/openai_clients.py)
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None  # e.g. http://127.0.0.1:8765/v1 for tools/mock_openai_server.py
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB
 
+    # Chart Image Loading
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 8 * 1024 * 1024))  # 8MB download cap
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))  # decompression bomb guard
+    IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))  # vision API downscales beyond this
+    IMAGE_DOWNLOAD_TIMEOUT = 10
+
+    # Outbound HTTP (image CDNs, Telegram) - one pooled session per worker
+    HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 10))
+    HTTP_POOL_MAXSIZE_PER_HOST = int(os.environ.get('HTTP_POOL_MAXSIZE_PER_HOST', 8))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+
+    # OpenAI Resilience
+    OPENAI_REQUEST_BUDGET_SECONDS = float(os.environ.get('OPENAI_REQUEST_BUDGET_SECONDS', 100))  # under gunicorn --timeout=120
+    OPENAI_RETRY_MAX_ATTEMPTS = int(os.environ.get('OPENAI_RETRY_MAX_ATTEMPTS', 3))
+    OPENAI_RETRY_BASE_DELAY_SECONDS = float(os.environ.get('OPENAI_RETRY_BASE_DELAY_SECONDS', 0.5))
+    OPENAI_RETRY_MAX_DELAY_SECONDS = float(os.environ.get('OPENAI_RETRY_MAX_DELAY_SECONDS', 8))
+    OPENAI_RETRY_MIN_ATTEMPT_SECONDS = float(os.environ.get('OPENAI_RETRY_MIN_ATTEMPT_SECONDS', 5))
+    OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('OPENAI_BREAKER_FAILURE_THRESHOLD', 5))
+    OPENAI_BREAKER_COOLDOWN_SECONDS = float(os.environ.get('OPENAI_BREAKER_COOLDOWN_SECONDS', 30))
+
+    # OpenAI Health (shared by all workers on the host through a status file)
+    OPENAI_HEALTH_FILE = os.environ.get('OPENAI_HEALTH_FILE', '/tmp/xflexai_openai_health.json')
+    OPENAI_HEALTH_REFRESH_SECONDS = float(os.environ.get('OPENAI_HEALTH_REFRESH_SECONDS', 300))
+    OPENAI_HEALTH_UNAVAILABLE_REFRESH_SECONDS = float(os.environ.get('OPENAI_HEALTH_UNAVAILABLE_REFRESH_SECONDS', 60))
+
+    # OpenAI Key Pool
+    OPENAI_KEY_QUARANTINE_SECONDS = int(os.environ.get('OPENAI_KEY_QUARANTINE_SECONDS', 900))
+    OPENAI_KEY_RATE_LIMIT_PENALTY_SECONDS = float(os.environ.get('OPENAI_KEY_RATE_LIMIT_PENALTY_SECONDS', 30))
+
+    # OpenAI Scheduler: per-model RPM/TPM token buckets shared by all workers on the host
+    OPENAI_SCHEDULER_ENABLED = os.environ.get('OPENAI_SCHEDULER_ENABLED', 'True').lower() == 'true'
+    OPENAI_SCHEDULER_FILE = os.environ.get('OPENAI_SCHEDULER_FILE', '/tmp/xflexai_openai_scheduler.json')
+    OPENAI_SCHEDULER_MAX_WAIT_SECONDS = float(os.environ.get('OPENAI_SCHEDULER_MAX_WAIT_SECONDS', 15))
+    OPENAI_DEFAULT_RPM = float(os.environ.get('OPENAI_DEFAULT_RPM', 500))
+    OPENAI_DEFAULT_TPM = float(os.environ.get('OPENAI_DEFAULT_TPM', 30000))
+    OPENAI_RATE_LIMITS = os.environ.get('OPENAI_RATE_LIMITS', '')  # JSON {"gpt-4o": {"rpm": 500, "tpm": 30000}}
+
+    # OpenAI Dispatch: fair queuing of OpenAI calls across users and endpoint priority classes,
+    # with slots shared by all workers on the host through a flock'd state file
+    OPENAI_DISPATCH_ENABLED = os.environ.get('OPENAI_DISPATCH_ENABLED', 'True').lower() == 'true'
+    OPENAI_DISPATCH_FILE = os.environ.get('OPENAI_DISPATCH_FILE', '/tmp/xflexai_openai_dispatch.json')
+    OPENAI_DISPATCH_MAX_CONCURRENCY = int(os.environ.get('OPENAI_DISPATCH_MAX_CONCURRENCY', 4))
+    OPENAI_DISPATCH_PER_USER_LIMIT = int(os.environ.get('OPENAI_DISPATCH_PER_USER_LIMIT', 2))
+    OPENAI_DISPATCH_QUANTUM_TOKENS = int(os.environ.get('OPENAI_DISPATCH_QUANTUM_TOKENS', 2000))
+    OPENAI_DISPATCH_MAX_WAIT_SECONDS = float(os.environ.get('OPENAI_DISPATCH_MAX_WAIT_SECONDS', 30))
+    OPENAI_ENDPOINT_PRIORITIES = os.environ.get('OPENAI_ENDPOINT_PRIORITIES', '')  # JSON {"analyze_single": "background"}
+
+    # OpenAI Hedged Requests (detection calls only, opt-in)
+    OPENAI_HEDGING_ENABLED = os.environ.get('OPENAI_HEDGING_ENABLED', 'False').lower() == 'true'
+    OPENAI_HEDGE_MIN_SAMPLES = int(os.environ.get('OPENAI_HEDGE_MIN_SAMPLES', 20))
+    OPENAI_HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get('OPENAI_HEDGE_DEFAULT_DELAY_SECONDS', 4))
+    OPENAI_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get('OPENAI_HEDGE_MIN_DELAY_SECONDS', 1))
+    OPENAI_HEDGE_MAX_THREADS = int(os.environ.get('OPENAI_HEDGE_MAX_THREADS', 8))
+
+    # Analysis Length Fitting (local engine always runs; the gpt-4o rewrite is an opt-in fallback)
+    ANALYSIS_LLM_SHORTENING_ENABLED = os.environ.get('ANALYSIS_LLM_SHORTENING_ENABLED', 'False').lower() == 'true'
+
+    # Adaptive max_tokens for the 1024-char analyses: p90 completion length per action plus headroom.
+    # Off until the dashboard's static vs adaptive shortening/truncation rates have been compared
+    ADAPTIVE_MAX_TOKENS_ENABLED = os.environ.get('ADAPTIVE_MAX_TOKENS_ENABLED', 'False').lower() == 'true'
+    ADAPTIVE_MAX_TOKENS_REFRESH_SECONDS = int(os.environ.get('ADAPTIVE_MAX_TOKENS_REFRESH_SECONDS', 900))
+    ADAPTIVE_MAX_TOKENS_LOOKBACK_DAYS = int(os.environ.get('ADAPTIVE_MAX_TOKENS_LOOKBACK_DAYS', 14))
+    ADAPTIVE_MAX_TOKENS_MIN_SAMPLES = int(os.environ.get('ADAPTIVE_MAX_TOKENS_MIN_SAMPLES', 30))
+    ADAPTIVE_MAX_TOKENS_HEADROOM = float(os.environ.get('ADAPTIVE_MAX_TOKENS_HEADROOM', 1.25))
+    ADAPTIVE_MAX_TOKENS_MIN = int(os.environ.get('ADAPTIVE_MAX_TOKENS_MIN', 300))
+    ADAPTIVE_MAX_TOKENS_MAX = int(os.environ.get('ADAPTIVE_MAX_TOKENS_MAX', 900))
+
+    # Tiered model routing: JSON {"action_type": ["cheap-model", "gpt-4o"]} overriding services/model_router.py
+    OPENAI_MODEL_ROUTES = os.environ.get('OPENAI_MODEL_ROUTES', '')
+
+    # Single-flight: identical in-flight analysis requests share one OpenAI run, also across workers.
+    # The wait is capped at 60s (gunicorn --timeout is 120); results only bridge the lock hand-over
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+    SINGLE_FLIGHT_WAIT_SECONDS = int(os.environ.get('SINGLE_FLIGHT_WAIT_SECONDS', 45))
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS = int(os.environ.get('SINGLE_FLIGHT_RESULT_TTL_SECONDS', 10))
+
+    # Idempotency-Key / request_id replay window for the analysis endpoints
+    IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'True').lower() == 'true'
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400))
+
+    # Async analysis jobs ("async": true), run by `python -m services.job_worker`; enable only
+    # once that worker runs as its own service (railway.json starts gunicorn alone)
+    ASYNC_JOBS_ENABLED = os.environ.get('ASYNC_JOBS_ENABLED', 'False').lower() == 'true'
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 10))
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1.0))
+    JOB_LOCK_TIMEOUT_SECONDS = int(os.environ.get('JOB_LOCK_TIMEOUT_SECONDS', 300))
+    JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))
+    JOB_CALLBACK_TIMEOUT = float(os.environ.get('JOB_CALLBACK_TIMEOUT', 10))
+    JOB_CALLBACK_MAX_ATTEMPTS = int(os.environ.get('JOB_CALLBACK_MAX_ATTEMPTS', 3))
+    # Callback hosts; empty means callback_url is rejected
+    JOB_CALLBACK_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get('JOB_CALLBACK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+    # Merged second step: one vision completion writes the H4 and the combined final analysis
+    MERGED_FINAL_ANALYSIS_ENABLED = os.environ.get('MERGED_FINAL_ANALYSIS_ENABLED', 'False').lower() == 'true'
+
+    # Inline timeframe check: M15/H4 analyses report "TF=..;SYMBOL=.." on their first line instead of a separate detection call
+    INLINE_TIMEFRAME_CHECK_ENABLED = os.environ.get('INLINE_TIMEFRAME_CHECK_ENABLED', 'False').lower() == 'true'
+
+    # Structured analyses: the model returns JSON, services/analysis_renderer.py renders it within 1024 chars
+    STRUCTURED_ANALYSIS_ENABLED = os.environ.get('STRUCTURED_ANALYSIS_ENABLED', 'False').lower() == 'true'
+
+    # Structured logging (utils/structured_log.py); response/prompt bodies only for a sample of requests
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_BODY_SAMPLE_RATE = float(os.environ.get('LOG_BODY_SAMPLE_RATE', 0.01))
+    LOG_BODY_MAX_CHARS = int(os.environ.get('LOG_BODY_MAX_CHARS', 2000))
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(minutes=15)  # 15 minute timeout
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
@@ -23,3 +134,4 @@ class Config:
     RATELIMIT_STORAGE_URI = os.environ.get('REDIS_URL', 'memory://')
     RATELIMIT_STORAGE_URL = RATELIMIT_STORAGE_URI
     RATELIMIT_DEFAULT = "100 per hour"
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'  # tools/load_test.py turns it off
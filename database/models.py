@@ -82,10 +82,94 @@ def get_table_definitions():
               prompt_tokens INTEGER NOT NULL DEFAULT 0,
               completion_tokens INTEGER NOT NULL DEFAULT 0,
               total_tokens INTEGER NOT NULL DEFAULT 0,
+              cached_tokens INTEGER NOT NULL DEFAULT 0,
               estimated_cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
               success BOOLEAN NOT NULL DEFAULT TRUE,
               error_message TEXT,
+              attempt_count INTEGER NOT NULL DEFAULT 1,
+              hedge_role VARCHAR(16),
+              latency_ms INTEGER,
+              first_token_ms INTEGER,
+              output_chars INTEGER,
+              max_tokens INTEGER,
+              finish_reason VARCHAR(32),
+              token_budget_source VARCHAR(16),
+              api_key_label VARCHAR(64),
+              image_bytes INTEGER,
+              image_width INTEGER,
+              image_height INTEGER,
+              cache_hit BOOLEAN,
               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
+        ''',
+        # Short-lived results of in-flight analyses, read by duplicate requests waiting in other workers
+        'single_flight_results': '''
+            CREATE TABLE IF NOT EXISTS single_flight_results (
+              flight_key CHAR(64) PRIMARY KEY,
+              status_code INTEGER NOT NULL,
+              mimetype VARCHAR(64) NOT NULL,
+              response_body TEXT NOT NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''',
+        # Final responses of requests sent with an Idempotency-Key, replayed on client retries
+        'idempotent_responses': '''
+            CREATE TABLE IF NOT EXISTS idempotent_responses (
+              endpoint_name VARCHAR(64) NOT NULL,
+              telegram_user_id BIGINT NOT NULL,
+              idempotency_key VARCHAR(255) NOT NULL,
+              request_hash CHAR(64) NOT NULL,
+              status_code INTEGER NOT NULL,
+              mimetype VARCHAR(64) NOT NULL,
+              response_body TEXT NOT NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              PRIMARY KEY (endpoint_name, telegram_user_id, idempotency_key)
+            )
+        ''',
+        # Async analysis jobs, claimed by services/job_worker.py with FOR UPDATE SKIP LOCKED
+        'analysis_jobs': '''
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+              job_id VARCHAR(32) PRIMARY KEY,
+              telegram_user_id BIGINT NOT NULL,
+              endpoint_name VARCHAR(64) NOT NULL,
+              request_path VARCHAR(128) NOT NULL,
+              request_payload TEXT NOT NULL,
+              callback_url TEXT,
+              status VARCHAR(16) NOT NULL DEFAULT 'queued',
+              attempts INTEGER NOT NULL DEFAULT 0,
+              max_attempts INTEGER NOT NULL DEFAULT 3,
+              run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              locked_by VARCHAR(64),
+              locked_at TIMESTAMP,
+              status_code INTEGER,
+              response_body TEXT,
+              last_error TEXT,
+              callback_status VARCHAR(16),
+              callback_attempts INTEGER NOT NULL DEFAULT 0,
+              callback_error TEXT,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              started_at TIMESTAMP,
+              finished_at TIMESTAMP
+            )
         '''
     }
+
+
+def get_openai_usage_event_column_additions():
+    # (column, DDL) pairs applied with ADD COLUMN IF NOT EXISTS so older databases catch up
+    return [
+        ('attempt_count', 'INTEGER NOT NULL DEFAULT 1'),
+        ('hedge_role', 'VARCHAR(16)'),
+        ('latency_ms', 'INTEGER'),
+        ('first_token_ms', 'INTEGER'),
+        ('cached_tokens', 'INTEGER NOT NULL DEFAULT 0'),
+        ('output_chars', 'INTEGER'),
+        ('max_tokens', 'INTEGER'),
+        ('finish_reason', 'VARCHAR(32)'),
+        ('token_budget_source', 'VARCHAR(16)'),
+        ('api_key_label', 'VARCHAR(64)'),
+        ('image_bytes', 'INTEGER'),
+        ('image_width', 'INTEGER'),
+        ('image_height', 'INTEGER'),
+        ('cache_hit', 'BOOLEAN')
+    ]
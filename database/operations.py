@@ -1,6 +1,7 @@
 # database/operations.py
 import psycopg2
 import json
+from psycopg2.errors import LockNotAvailable
 from psycopg2.extras import RealDictCursor
 from config import Config
 from datetime import datetime, timedelta
@@ -15,7 +16,7 @@ def get_db_connection():
     return psycopg2.connect(db_url)
 
 def init_database():
-    from database.models import get_table_definitions
+    from database.models import get_table_definitions, get_openai_usage_event_column_additions
     print("DEBUG: Starting database initialization (init_database).")
     conn = None
     cur = None
@@ -53,6 +54,22 @@ def init_database():
         cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_openai_usage_events_flow_id ON openai_usage_events (flow_id);
         """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_single_flight_results_created_at ON single_flight_results (created_at);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_idempotent_responses_created_at ON idempotent_responses (created_at);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_analysis_jobs_queue ON analysis_jobs (status, run_after);
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_analysis_jobs_created_at ON analysis_jobs (created_at DESC);
+        """)
+
+        # Columns added to openai_usage_events after its first release
+        for column_name, column_ddl in get_openai_usage_event_column_additions():
+            cur.execute(f"ALTER TABLE openai_usage_events ADD COLUMN IF NOT EXISTS {column_name} {column_ddl}")
 
         # Seed basic key_types if not present
         cur.execute("""
@@ -206,6 +223,297 @@ def count_analysis_sessions():
         return 0
     return int(rows[0].get('session_count', 0))
 
+# Single-flight operations
+def try_advisory_lock(lock_id):
+    """
+    Session-level advisory lock on a dedicated connection. Returns the connection
+    holding the lock (pass it to release_advisory_lock), or None if another session has it.
+    """
+    conn = get_db_connection()
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (lock_id,))
+        acquired = cur.fetchone()[0]
+        cur.close()
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        return None
+    return conn
+
+def release_advisory_lock(conn, lock_id):
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+        cur.close()
+    except Exception as e:
+        print(f"ERROR: release_advisory_lock failed: {e}")
+    finally:
+        conn.close()
+
+def wait_for_advisory_lock(lock_id, timeout_seconds):
+    """Block until the current holder releases the lock (or timeout). Returns True if it was released."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SET lock_timeout = %s", (f"{max(1, int(timeout_seconds * 1000))}ms",))
+        try:
+            cur.execute("SELECT pg_advisory_lock(%s)", (lock_id,))
+        except LockNotAvailable:
+            conn.rollback()
+            return False
+        cur.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+        conn.commit()
+        cur.close()
+        return True
+    finally:
+        conn.close()
+
+def get_single_flight_result(flight_key, max_age_seconds):
+    rows = execute_query(
+        """
+        SELECT status_code, mimetype, response_body
+        FROM single_flight_results
+        WHERE flight_key = %s
+          AND created_at >= NOW() - (%s * INTERVAL '1 second')
+        """,
+        (flight_key, float(max_age_seconds)),
+        fetch=True,
+        dict_cursor=True
+    )
+    return rows[0] if rows else None
+
+def store_single_flight_result(flight_key, status_code, mimetype, response_body, max_age_seconds):
+    execute_query(
+        """
+        WITH expired AS (
+            DELETE FROM single_flight_results
+            WHERE created_at < NOW() - (%s * INTERVAL '1 second')
+        )
+        INSERT INTO single_flight_results (flight_key, status_code, mimetype, response_body, created_at)
+        VALUES (%s, %s, %s, %s, NOW())
+        ON CONFLICT (flight_key) DO UPDATE
+        SET status_code = EXCLUDED.status_code,
+            mimetype = EXCLUDED.mimetype,
+            response_body = EXCLUDED.response_body,
+            created_at = NOW()
+        """,
+        (float(max_age_seconds), flight_key, status_code, mimetype, response_body)
+    )
+
+# Idempotency operations
+def get_idempotent_response(endpoint_name, telegram_user_id, idempotency_key, max_age_seconds):
+    rows = execute_query(
+        """
+        SELECT request_hash, status_code, mimetype, response_body
+        FROM idempotent_responses
+        WHERE endpoint_name = %s
+          AND telegram_user_id = %s
+          AND idempotency_key = %s
+          AND created_at >= NOW() - (%s * INTERVAL '1 second')
+        """,
+        (endpoint_name, telegram_user_id, idempotency_key, float(max_age_seconds)),
+        fetch=True,
+        dict_cursor=True
+    )
+    return rows[0] if rows else None
+
+def store_idempotent_response(endpoint_name, telegram_user_id, idempotency_key, request_hash,
+                              status_code, mimetype, response_body, max_age_seconds):
+    execute_query(
+        """
+        WITH expired AS (
+            DELETE FROM idempotent_responses
+            WHERE created_at < NOW() - (%s * INTERVAL '1 second')
+        )
+        INSERT INTO idempotent_responses (
+            endpoint_name, telegram_user_id, idempotency_key, request_hash,
+            status_code, mimetype, response_body, created_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (endpoint_name, telegram_user_id, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash,
+            status_code = EXCLUDED.status_code,
+            mimetype = EXCLUDED.mimetype,
+            response_body = EXCLUDED.response_body,
+            created_at = NOW()
+        """,
+        (float(max_age_seconds), endpoint_name, telegram_user_id, idempotency_key, request_hash,
+         status_code, mimetype, response_body)
+    )
+
+# Analysis job operations
+def create_analysis_job(job_id, telegram_user_id, endpoint_name, request_path, request_payload,
+                        callback_url=None, max_attempts=3):
+    rows = execute_query(
+        """
+        INSERT INTO analysis_jobs (
+            job_id, telegram_user_id, endpoint_name, request_path, request_payload,
+            callback_url, max_attempts, status, run_after, created_at
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, 'queued', NOW(), NOW())
+        RETURNING *
+        """,
+        (job_id, telegram_user_id, endpoint_name, request_path, json.dumps(request_payload),
+         callback_url, max_attempts),
+        fetch=True,
+        dict_cursor=True
+    )
+    return rows[0] if rows else None
+
+def get_analysis_job(job_id):
+    rows = execute_query(
+        "SELECT * FROM analysis_jobs WHERE job_id = %s",
+        (job_id,),
+        fetch=True,
+        dict_cursor=True
+    )
+    return rows[0] if rows else None
+
+def claim_analysis_job(worker_id):
+    """Lock the oldest runnable job for this worker; concurrent workers skip rows already locked."""
+    rows = execute_query(
+        """
+        UPDATE analysis_jobs
+        SET status = 'running',
+            attempts = attempts + 1,
+            locked_by = %s,
+            locked_at = NOW(),
+            started_at = COALESCE(started_at, NOW())
+        WHERE job_id = (
+            SELECT job_id
+            FROM analysis_jobs
+            WHERE status = 'queued'
+              AND run_after <= NOW()
+            ORDER BY run_after, created_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+        """,
+        (worker_id,),
+        fetch=True,
+        dict_cursor=True
+    )
+    return rows[0] if rows else None
+
+def complete_analysis_job(job_id, status, status_code=None, response_body=None, last_error=None):
+    execute_query(
+        """
+        UPDATE analysis_jobs
+        SET status = %s,
+            status_code = %s,
+            response_body = %s,
+            last_error = %s,
+            locked_by = NULL,
+            locked_at = NULL,
+            finished_at = NOW()
+        WHERE job_id = %s
+        """,
+        (status, status_code, response_body, last_error, job_id)
+    )
+
+def retry_analysis_job(job_id, last_error, delay_seconds):
+    execute_query(
+        """
+        UPDATE analysis_jobs
+        SET status = 'queued',
+            last_error = %s,
+            locked_by = NULL,
+            locked_at = NULL,
+            run_after = NOW() + (%s * INTERVAL '1 second')
+        WHERE job_id = %s
+        """,
+        (last_error, float(delay_seconds), job_id)
+    )
+
+def requeue_stale_analysis_jobs(lock_timeout_seconds):
+    """Jobs whose worker died mid-run go back to the queue, or fail once out of attempts."""
+    rows = execute_query(
+        """
+        UPDATE analysis_jobs
+        SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+            last_error = 'Worker stopped while running the job',
+            finished_at = CASE WHEN attempts >= max_attempts THEN NOW() ELSE finished_at END,
+            locked_by = NULL,
+            locked_at = NULL
+        WHERE status = 'running'
+          AND locked_at < NOW() - (%s * INTERVAL '1 second')
+        RETURNING job_id
+        """,
+        (float(lock_timeout_seconds),),
+        fetch=True,
+        dict_cursor=True
+    )
+    return len(rows or [])
+
+def update_analysis_job_callback(job_id, callback_status, callback_attempts, callback_error=None):
+    execute_query(
+        """
+        UPDATE analysis_jobs
+        SET callback_status = %s,
+            callback_attempts = %s,
+            callback_error = %s
+        WHERE job_id = %s
+        """,
+        (callback_status, callback_attempts, callback_error, job_id)
+    )
+
+def get_analysis_job_report(days=7):
+    """Counts, retries and queue/run timings per endpoint and status for the admin dashboard."""
+    normalized_days = max(1, int(days or 7))
+    rows = execute_query(
+        """
+        SELECT
+            endpoint_name,
+            status,
+            COUNT(*) AS job_count,
+            AVG(attempts) AS avg_attempts,
+            SUM(CASE WHEN attempts > 1 THEN 1 ELSE 0 END) AS retried_count,
+            AVG(EXTRACT(EPOCH FROM (started_at - created_at))) AS avg_queue_seconds,
+            AVG(EXTRACT(EPOCH FROM (finished_at - created_at))) AS avg_total_seconds,
+            SUM(CASE WHEN callback_status = 'failed' THEN 1 ELSE 0 END) AS callback_failures
+        FROM analysis_jobs
+        WHERE created_at >= NOW() - (%s::int * INTERVAL '1 day')
+        GROUP BY endpoint_name, status
+        ORDER BY endpoint_name, status
+        """,
+        (normalized_days,),
+        fetch=True,
+        dict_cursor=True
+    )
+
+    report_rows = []
+    for row in rows or []:
+        report_rows.append({
+            'endpoint_name': row.get('endpoint_name'),
+            'status': row.get('status'),
+            'job_count': int(row.get('job_count', 0) or 0),
+            'avg_attempts': float(row.get('avg_attempts', 0) or 0),
+            'retried_count': int(row.get('retried_count', 0) or 0),
+            'avg_queue_seconds': float(row.get('avg_queue_seconds', 0) or 0),
+            'avg_total_seconds': float(row.get('avg_total_seconds', 0) or 0),
+            'callback_failures': int(row.get('callback_failures', 0) or 0)
+        })
+    return report_rows
+
+def get_recent_analysis_jobs(limit=20):
+    return execute_query(
+        """
+        SELECT job_id, telegram_user_id, endpoint_name, status, attempts, max_attempts,
+               last_error, callback_status, created_at, started_at, finished_at
+        FROM analysis_jobs
+        ORDER BY created_at DESC
+        LIMIT %s
+        """,
+        (int(limit),),
+        fetch=True,
+        dict_cursor=True
+    ) or []
+
 def create_openai_usage_event(event_data):
     payload = event_data or {}
     execute_query(
@@ -226,9 +534,23 @@ def create_openai_usage_event(event_data):
             total_tokens,
             estimated_cost_usd,
             success,
-            error_message
+            error_message,
+            attempt_count,
+            hedge_role,
+            latency_ms,
+            first_token_ms,
+            cached_tokens,
+            output_chars,
+            max_tokens,
+            finish_reason,
+            token_budget_source,
+            api_key_label,
+            image_bytes,
+            image_width,
+            image_height,
+            cache_hit
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """,
         (
             payload.get('telegram_user_id'),
@@ -246,7 +568,21 @@ def create_openai_usage_event(event_data):
             int(payload.get('total_tokens') or 0),
             float(payload.get('estimated_cost_usd') or 0),
             bool(payload.get('success', True)),
-            payload.get('error_message')
+            payload.get('error_message'),
+            int(payload.get('attempt_count', 1) or 0),
+            payload.get('hedge_role'),
+            payload.get('latency_ms'),
+            payload.get('first_token_ms'),
+            int(payload.get('cached_tokens') or 0),
+            payload.get('output_chars'),
+            payload.get('max_tokens'),
+            payload.get('finish_reason'),
+            payload.get('token_budget_source'),
+            payload.get('api_key_label'),
+            payload.get('image_bytes'),
+            payload.get('image_width'),
+            payload.get('image_height'),
+            payload.get('cache_hit')
         )
     )
 
@@ -331,6 +667,8 @@ def get_openai_action_breakdown(days=7, limit=20):
             model_name,
             request_mode,
             COUNT(*) AS call_count,
+            COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+            COALESCE(SUM(cached_tokens), 0) AS cached_tokens,
             COALESCE(SUM(total_tokens), 0) AS total_tokens,
             COALESCE(SUM(estimated_cost_usd), 0) AS estimated_cost_usd
         FROM openai_usage_events
@@ -346,16 +684,252 @@ def get_openai_action_breakdown(days=7, limit=20):
 
     breakdown_rows = []
     for row in rows or []:
+        prompt_tokens = int(row.get('prompt_tokens', 0) or 0)
+        cached_tokens = int(row.get('cached_tokens', 0) or 0)
         breakdown_rows.append({
             'action_type': row.get('action_type'),
             'model_name': row.get('model_name'),
             'request_mode': row.get('request_mode'),
             'call_count': int(row.get('call_count', 0) or 0),
+            'cached_tokens': cached_tokens,
+            'cached_ratio': round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
             'total_tokens': int(row.get('total_tokens', 0) or 0),
             'estimated_cost_usd': float(row.get('estimated_cost_usd', 0) or 0)
         })
     return breakdown_rows
 
+def get_completion_length_stats(days=14, min_samples=30):
+    """
+    Per-action output characters per completion token, from successful prose calls with
+    recorded output (structured JSON replies have their own fixed budget).
+    """
+    normalized_days = max(1, int(days or 14))
+    rows = execute_query(
+        """
+        SELECT
+            action_type,
+            COUNT(*) AS sample_count,
+            percentile_cont(0.5) WITHIN GROUP (
+                ORDER BY output_chars::float / completion_tokens
+            ) AS chars_per_token,
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY output_chars) AS p90_output_chars
+        FROM openai_usage_events
+        WHERE created_at >= NOW() - (%s::int * INTERVAL '1 day')
+          AND success = TRUE
+          AND completion_tokens > 0
+          AND output_chars > 0
+          AND COALESCE(token_budget_source, 'static') <> 'structured'
+        GROUP BY action_type
+        HAVING COUNT(*) >= %s
+        """,
+        (normalized_days, max(1, int(min_samples or 1))),
+        fetch=True,
+        dict_cursor=True
+    )
+
+    stats = {}
+    for row in rows or []:
+        stats[row.get('action_type')] = {
+            'sample_count': int(row.get('sample_count', 0) or 0),
+            'chars_per_token': float(row.get('chars_per_token', 0) or 0),
+            'p90_output_chars': float(row.get('p90_output_chars', 0) or 0)
+        }
+    return stats
+
+def get_token_budget_report(days=7, char_limit=1024):
+    """
+    Static (before) vs adaptive (after) max_tokens per action: how often the analysis
+    came back over char_limit and had to be shortened, how often it was followed by
+    a shorten_analysis_text LLM call in the same flow, and how often max_tokens cut it off.
+    """
+    normalized_days = max(1, int(days or 7))
+    rows = execute_query(
+        """
+        SELECT
+            e.action_type,
+            COALESCE(e.token_budget_source, 'static') AS token_budget_source,
+            COUNT(*) AS call_count,
+            AVG(e.max_tokens) AS avg_max_tokens,
+            AVG(e.completion_tokens) AS avg_completion_tokens,
+            AVG(CASE WHEN e.output_chars > %s THEN 1 ELSE 0 END) AS shortened_rate,
+            AVG(CASE WHEN EXISTS (
+                SELECT 1
+                FROM openai_usage_events s
+                WHERE s.flow_id = e.flow_id
+                  AND s.action_type = 'shorten_analysis_text'
+                  AND s.created_at BETWEEN e.created_at AND e.created_at + INTERVAL '2 minutes'
+            ) THEN 1 ELSE 0 END) AS shortening_call_rate,
+            AVG(CASE WHEN e.finish_reason = 'length' THEN 1 ELSE 0 END) AS truncated_rate,
+            AVG(e.latency_ms) AS avg_latency_ms
+        FROM openai_usage_events e
+        WHERE e.created_at >= NOW() - (%s::int * INTERVAL '1 day')
+          AND e.success = TRUE
+          AND e.max_tokens IS NOT NULL
+          AND e.output_chars IS NOT NULL
+          AND e.action_type <> 'shorten_analysis_text'
+        GROUP BY e.action_type, COALESCE(e.token_budget_source, 'static')
+        ORDER BY e.action_type, token_budget_source
+        """,
+        (int(char_limit), normalized_days),
+        fetch=True,
+        dict_cursor=True
+    )
+
+    report_rows = []
+    for row in rows or []:
+        report_rows.append({
+            'action_type': row.get('action_type'),
+            'token_budget_source': row.get('token_budget_source'),
+            'call_count': int(row.get('call_count', 0) or 0),
+            'avg_max_tokens': float(row.get('avg_max_tokens', 0) or 0),
+            'avg_completion_tokens': float(row.get('avg_completion_tokens', 0) or 0),
+            'shortened_rate': float(row.get('shortened_rate', 0) or 0),
+            'shortening_call_rate': float(row.get('shortening_call_rate', 0) or 0),
+            'truncated_rate': float(row.get('truncated_rate', 0) or 0),
+            'avg_latency_ms': float(row.get('avg_latency_ms', 0) or 0)
+        })
+    return report_rows
+
+def get_second_step_mode_report(days=7):
+    """
+    Per-flow OpenAI cost of the /analyze second step (H4 + final analysis), merged
+    mode vs separate calls. Only calls from the flow's first second_analysis /
+    merged_analysis event onward count, so first-step shortening is left out;
+    the currency and timeframe detections run in both modes and are excluded.
+    """
+    normalized_days = max(1, int(days or 7))
+    rows = execute_query(
+        """
+        WITH second_step AS (
+            SELECT
+                flow_id,
+                BOOL_OR(action_type = 'merged_analysis') AS merged,
+                MIN(created_at) AS started_at
+            FROM openai_usage_events
+            WHERE created_at >= NOW() - (%s::int * INTERVAL '1 day')
+              AND flow_id IS NOT NULL
+              AND action_type IN ('second_analysis', 'merged_analysis')
+              AND success = TRUE
+            GROUP BY flow_id
+        ),
+        flow_cost AS (
+            SELECT
+                second_step.flow_id,
+                second_step.merged,
+                COUNT(*) AS call_count,
+                SUM(COALESCE(events.latency_ms, 0)) AS latency_ms,
+                SUM(events.prompt_tokens) AS prompt_tokens,
+                SUM(events.completion_tokens) AS completion_tokens,
+                SUM(events.estimated_cost_usd) AS estimated_cost_usd
+            FROM second_step
+            JOIN openai_usage_events AS events
+              ON events.flow_id = second_step.flow_id
+             AND events.created_at >= second_step.started_at
+            WHERE events.action_type IN ('second_analysis', 'merged_analysis', 'final_analysis', 'shorten_analysis_text')
+            GROUP BY second_step.flow_id, second_step.merged
+        )
+        SELECT
+            merged,
+            COUNT(*) AS flow_count,
+            AVG(call_count) AS avg_calls,
+            AVG(latency_ms) AS avg_latency_ms,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms) AS p50_latency_ms,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms,
+            AVG(prompt_tokens) AS avg_prompt_tokens,
+            AVG(completion_tokens) AS avg_completion_tokens,
+            AVG(estimated_cost_usd) AS avg_cost_usd
+        FROM flow_cost
+        GROUP BY merged
+        ORDER BY merged
+        """,
+        (normalized_days,),
+        fetch=True,
+        dict_cursor=True
+    )
+
+    report_rows = []
+    for row in rows or []:
+        report_rows.append({
+            'mode': 'merged' if row.get('merged') else 'separate',
+            'flow_count': int(row.get('flow_count', 0) or 0),
+            'avg_calls': float(row.get('avg_calls', 0) or 0),
+            'avg_latency_ms': float(row.get('avg_latency_ms', 0) or 0),
+            'p50_latency_ms': float(row.get('p50_latency_ms', 0) or 0),
+            'p95_latency_ms': float(row.get('p95_latency_ms', 0) or 0),
+            'avg_prompt_tokens': float(row.get('avg_prompt_tokens', 0) or 0),
+            'avg_completion_tokens': float(row.get('avg_completion_tokens', 0) or 0),
+            'avg_cost_usd': float(row.get('avg_cost_usd', 0) or 0)
+        })
+    return report_rows
+
+def get_openai_latency_percentiles(days=7, since=None):
+    """
+    p50/p95/p99 completion latency per action and model, over the last N days or since
+    a timestamp, with retries, prompt-cache hits and the image size and prompt tokens
+    of the vision calls.
+    """
+    normalized_days = max(1, int(days or 7))
+    rows = execute_query(
+        """
+        SELECT
+            action_type,
+            model_name,
+            COUNT(*) AS call_count,
+            AVG(CASE WHEN success THEN 0 ELSE 1 END) AS error_rate,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms) AS p50_latency_ms,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY latency_ms) AS p99_latency_ms,
+            AVG(attempt_count) AS avg_attempts,
+            AVG(CASE WHEN cache_hit THEN 1 ELSE 0 END) FILTER (WHERE cache_hit IS NOT NULL) AS cache_hit_rate,
+            COUNT(*) FILTER (WHERE image_bytes IS NOT NULL) AS image_call_count,
+            AVG(image_bytes) AS avg_image_bytes,
+            AVG(image_width::bigint * image_height) AS avg_image_pixels,
+            AVG(prompt_tokens) FILTER (WHERE image_bytes IS NOT NULL AND success = TRUE) AS prompt_tokens_per_image
+        FROM openai_usage_events
+        WHERE created_at >= COALESCE(%s, NOW() - (%s::int * INTERVAL '1 day'))
+          AND latency_ms IS NOT NULL
+        GROUP BY action_type, model_name
+        ORDER BY action_type, model_name
+        """,
+        (since, normalized_days),
+        fetch=True,
+        dict_cursor=True
+    )
+
+    report_rows = []
+    for row in rows or []:
+        report_rows.append({
+            'action_type': row.get('action_type'),
+            'model_name': row.get('model_name'),
+            'call_count': int(row.get('call_count', 0) or 0),
+            'error_rate': float(row.get('error_rate', 0) or 0),
+            'p50_latency_ms': float(row.get('p50_latency_ms', 0) or 0),
+            'p95_latency_ms': float(row.get('p95_latency_ms', 0) or 0),
+            'p99_latency_ms': float(row.get('p99_latency_ms', 0) or 0),
+            'avg_attempts': float(row.get('avg_attempts', 0) or 0),
+            'cache_hit_rate': float(row.get('cache_hit_rate', 0) or 0),
+            'image_call_count': int(row.get('image_call_count', 0) or 0),
+            'avg_image_bytes': float(row.get('avg_image_bytes', 0) or 0),
+            'avg_image_pixels': float(row.get('avg_image_pixels', 0) or 0),
+            'prompt_tokens_per_image': float(row.get('prompt_tokens_per_image', 0) or 0)
+        })
+    return report_rows
+
+def get_db_connection_counts():
+    """Connections to this database by state (active, idle, idle in transaction), excluding the caller."""
+    rows = execute_query(
+        """
+        SELECT COALESCE(state, 'unknown') AS state, COUNT(*) AS connection_count
+        FROM pg_stat_activity
+        WHERE datname = current_database()
+          AND pid <> pg_backend_pid()
+        GROUP BY COALESCE(state, 'unknown')
+        """,
+        fetch=True,
+        dict_cursor=True
+    )
+    return {row.get('state'): int(row.get('connection_count', 0) or 0) for row in rows or []}
+
 # Admin operations
 def get_admin_by_username(username):
     rows = execute_query(
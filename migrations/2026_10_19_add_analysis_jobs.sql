@@ -0,0 +1,31 @@
+BEGIN;
+
+-- Async analysis jobs, claimed by services/job_worker.py with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+  job_id VARCHAR(32) PRIMARY KEY,
+  telegram_user_id BIGINT NOT NULL,
+  endpoint_name VARCHAR(64) NOT NULL,
+  request_path VARCHAR(128) NOT NULL,
+  request_payload TEXT NOT NULL,
+  callback_url TEXT,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 3,
+  run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  locked_by VARCHAR(64),
+  locked_at TIMESTAMP,
+  status_code INTEGER,
+  response_body TEXT,
+  last_error TEXT,
+  callback_status VARCHAR(16),
+  callback_attempts INTEGER NOT NULL DEFAULT 0,
+  callback_error TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_queue ON analysis_jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_created_at ON analysis_jobs (created_at DESC);
+
+COMMIT;
@@ -0,0 +1,18 @@
+BEGIN;
+
+-- Final responses of requests sent with an Idempotency-Key, replayed on client retries
+CREATE TABLE IF NOT EXISTS idempotent_responses (
+  endpoint_name VARCHAR(64) NOT NULL,
+  telegram_user_id BIGINT NOT NULL,
+  idempotency_key VARCHAR(255) NOT NULL,
+  request_hash CHAR(64) NOT NULL,
+  status_code INTEGER NOT NULL,
+  mimetype VARCHAR(64) NOT NULL,
+  response_body TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (endpoint_name, telegram_user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotent_responses_created_at ON idempotent_responses (created_at);
+
+COMMIT;
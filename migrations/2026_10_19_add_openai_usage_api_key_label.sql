@@ -0,0 +1,7 @@
+BEGIN;
+
+-- Which pooled API key (OPENAI_API_KEYS label) served the call, for per-key cost attribution
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS api_key_label VARCHAR(64);
+
+COMMIT;
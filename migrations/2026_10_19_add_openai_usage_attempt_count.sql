@@ -0,0 +1,6 @@
+BEGIN;
+
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS attempt_count INTEGER NOT NULL DEFAULT 1;
+
+COMMIT;
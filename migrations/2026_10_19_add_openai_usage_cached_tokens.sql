@@ -0,0 +1,7 @@
+BEGIN;
+
+-- Prompt tokens served from OpenAI's prefix cache (usage.prompt_tokens_details.cached_tokens)
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS cached_tokens INTEGER NOT NULL DEFAULT 0;
+
+COMMIT;
@@ -0,0 +1,7 @@
+BEGIN;
+
+-- primary_won / primary_lost / hedge_won / hedge_lost for hedged detection calls, NULL otherwise
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS hedge_role VARCHAR(16);
+
+COMMIT;
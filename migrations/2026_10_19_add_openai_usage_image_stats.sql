@@ -0,0 +1,10 @@
+BEGIN;
+
+-- Size of the chart sent with vision calls and whether the prompt prefix came from OpenAI's cache
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS image_bytes INTEGER,
+  ADD COLUMN IF NOT EXISTS image_width INTEGER,
+  ADD COLUMN IF NOT EXISTS image_height INTEGER,
+  ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN;
+
+COMMIT;
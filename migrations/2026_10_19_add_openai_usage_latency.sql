@@ -0,0 +1,8 @@
+BEGIN;
+
+-- Wall-clock latency of the call (all attempts) and, for streamed completions, time to first token
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS latency_ms INTEGER,
+  ADD COLUMN IF NOT EXISTS first_token_ms INTEGER;
+
+COMMIT;
@@ -0,0 +1,10 @@
+BEGIN;
+
+-- Output length and the max_tokens budget behind it, for adaptive per-action token budgets
+ALTER TABLE openai_usage_events
+  ADD COLUMN IF NOT EXISTS output_chars INTEGER,
+  ADD COLUMN IF NOT EXISTS max_tokens INTEGER,
+  ADD COLUMN IF NOT EXISTS finish_reason VARCHAR(32),
+  ADD COLUMN IF NOT EXISTS token_budget_source VARCHAR(16);
+
+COMMIT;
@@ -0,0 +1,14 @@
+BEGIN;
+
+-- Short-lived results of in-flight analyses, read by duplicate webhook deliveries waiting in other workers
+CREATE TABLE IF NOT EXISTS single_flight_results (
+  flight_key VARCHAR(128) PRIMARY KEY,
+  status_code INTEGER NOT NULL,
+  mimetype VARCHAR(64) NOT NULL,
+  response_body TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_single_flight_results_created_at ON single_flight_results (created_at);
+
+COMMIT;
@@ -0,0 +1,9 @@
+BEGIN;
+
+-- Flight keys are now a sha256 hex digest of (endpoint, user, action_type, body hash).
+-- Rows live for seconds, so old-format keys are simply dropped.
+DELETE FROM single_flight_results;
+ALTER TABLE single_flight_results
+  ALTER COLUMN flight_key TYPE CHAR(64);
+
+COMMIT;
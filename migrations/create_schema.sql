@@ -69,4 +69,11 @@ CREATE INDEX IF NOT EXISTS idx_users_telegram_user_id ON users (telegram_user_id
 CREATE INDEX IF NOT EXISTS idx_registration_keys_key_value ON registration_keys (key_value);
 CREATE INDEX IF NOT EXISTS idx_registration_keys_allowed_telegram_user_id ON registration_keys (allowed_telegram_user_id);
 
+-- openai_usage_events itself is created by the app (database/models.py); keep its image stats columns in step
+ALTER TABLE IF EXISTS openai_usage_events
+  ADD COLUMN IF NOT EXISTS image_bytes INTEGER,
+  ADD COLUMN IF NOT EXISTS image_width INTEGER,
+  ADD COLUMN IF NOT EXISTS image_height INTEGER,
+  ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN;
+
 COMMIT;
@@ -1,6 +1,5 @@
 # routes/admin_routes.py - Enhanced with security and better session handling
 import os
-import requests
 import bcrypt
 from datetime import datetime, timedelta
 from flask import Blueprint, session, render_template, redirect, request, jsonify, url_for, flash
@@ -15,9 +14,16 @@ from database.operations import (
     deactivate_registration_key,
     get_openai_usage_summary,
     get_openai_user_daily_usage,
-    get_openai_action_breakdown
+    get_openai_action_breakdown,
+    get_token_budget_report,
+    get_openai_latency_percentiles,
+    get_second_step_mode_report,
+    get_analysis_job_report,
+    get_recent_analysis_jobs
 )
 from services.key_service import generate_unique_key
+from services.token_budget import get_token_budget_snapshot
+from services.http_client import http_get
 from utils.key_helpers import normalize_registration_key
 
 admin_bp = Blueprint('admin_bp', __name__)
@@ -29,7 +35,7 @@ def resolve_username_to_id(username):
     if not username.startswith('@'):
         username = '@' + username
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-    resp = requests.get(url, params={"chat_id": username}, timeout=10)
+    resp = http_get(url, params={"chat_id": username})
     data = resp.json()
     if resp.status_code == 200 and data.get("ok"):
         return data["result"]["id"]
@@ -95,6 +101,12 @@ def admin_dashboard():
         usage_summary = get_openai_usage_summary(usage_days)
         usage_rows = get_openai_user_daily_usage(usage_days)
         usage_breakdown = get_openai_action_breakdown(usage_days)
+        token_budget_report = get_token_budget_report(usage_days)
+        latency_report = get_openai_latency_percentiles(usage_days)
+        token_budgets = get_token_budget_snapshot()
+        second_step_report = get_second_step_mode_report(usage_days)
+        job_report = get_analysis_job_report(usage_days)
+        recent_jobs = get_recent_analysis_jobs()
 
         # Format users with enhanced information
         display_users = []
@@ -194,6 +206,12 @@ def admin_dashboard():
                              usage_days=usage_days,
                              usage_rows=usage_rows,
                              usage_breakdown=usage_breakdown,
+                             token_budget_report=token_budget_report,
+                             latency_report=latency_report,
+                             token_budgets=token_budgets,
+                             second_step_report=second_step_report,
+                             job_report=job_report,
+                             recent_jobs=recent_jobs,
                              session_expires=session.get('last_activity'))
 
     except Exception as e:
@@ -221,7 +239,13 @@ def admin_dashboard():
             stats=fallback_stats,
             usage_days=7,
             usage_rows=[],
-            usage_breakdown=[]
+            usage_breakdown=[],
+            token_budget_report=[],
+            latency_report=[],
+            token_budgets=[],
+            second_step_report=[],
+            job_report=[],
+            recent_jobs=[]
         )
 
 @admin_bp.route('/admin/generate-key', methods=['POST'])
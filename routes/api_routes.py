@@ -1,11 +1,13 @@
 # routes/api_routes.py
+import json
 import time
 from datetime import datetime, timedelta
 from uuid import uuid4
-from flask import Blueprint, request, jsonify, current_app, g
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
+from config import Config
 from services.openai_service import (
     analyze_with_openai,
-    load_image_from_url,
+    analyze_merged_h4_final,
     detect_timeframe_from_image,
     analyze_technical_chart,
     analyze_user_drawn_feedback_simple,
@@ -14,16 +16,36 @@ from services.openai_service import (
     shorten_analysis_text,
     detect_investing_frame,
     extract_investing_data,
-    analyze_simple_chart_fallback
+    analyze_simple_chart_fallback,
+    stream_analysis_with_openai,
+    stream_technical_chart,
+    get_structured_analysis
 )
+from services.image_service import load_image_from_url
+from services.http_client import get_http_client_stats
+from services.openai_resilience import get_circuit_breaker_states
+from services.openai_health import get_openai_status
+from services.openai_scheduler import get_openai_scheduler_snapshot
+from services.openai_clients import get_client_pool_snapshot
+from services.openai_dispatcher import get_dispatcher_snapshot
+from services.job_queue import build_job_status
+from utils.structured_log import get_logger, get_logging_stats
 
 from database.operations import get_user_by_telegram_id, redeem_registration_key
 from database.operations import clear_analysis_sessions, count_analysis_sessions, get_analysis_session, upsert_analysis_session
+from database.operations import get_analysis_job
 from utils.key_helpers import normalize_registration_key
-from utils.decorators import admin_session_required, subscription_required
+from utils.decorators import (
+    admin_session_required,
+    async_job_request,
+    idempotent_request,
+    single_flight_request,
+    subscription_required
+)
 
 api_bp = Blueprint('api_bp', __name__)
 ANALYSIS_SESSION_TTL = timedelta(hours=1)
+logger = get_logger('api')
 
 def create_analysis_session():
     return {
@@ -35,6 +57,8 @@ def create_analysis_session():
         'first_currency': None,
         'second_currency': None,
         'user_analysis': None,
+        # action_type -> the JSON behind a structured analysis (STRUCTURED_ANALYSIS_ENABLED)
+        'analysis_data': {},
         'flow_id': uuid4().hex,
         'status': 'ready'
     }
@@ -47,6 +71,7 @@ def set_openai_usage_context(telegram_user_id, endpoint_name, flow_type, flow_id
         'flow_type': flow_type,
         'flow_id': flow_id
     }
+    g.openai_request_deadline = time.monotonic() + Config.OPENAI_REQUEST_BUDGET_SECONDS
 
 def load_analysis_session(telegram_user_id, reset=False):
     if reset:
@@ -62,7 +87,7 @@ def load_analysis_session(telegram_user_id, reset=False):
 
     updated_at = record.get('updated_at')
     if updated_at and datetime.utcnow() - updated_at > ANALYSIS_SESSION_TTL:
-        print(f"⏳ ANALYZE ENDPOINT: Session expired for Telegram ID {telegram_user_id}, resetting")
+        logger.info('session.expired', telegram_user_id=telegram_user_id)
         session_data = create_analysis_session()
         upsert_analysis_session(telegram_user_id, session_data)
         return session_data
@@ -76,6 +101,12 @@ def load_analysis_session(telegram_user_id, reset=False):
 def save_analysis_session(telegram_user_id, session_data):
     upsert_analysis_session(telegram_user_id, session_data)
 
+def store_structured_analysis(session_data, action_type):
+    """Keep the entries/stop loss/targets behind a rendered analysis next to its text."""
+    analysis_data = get_structured_analysis(action_type)
+    if analysis_data is not None:
+        session_data['analysis_data'] = {**session_data.get('analysis_data', {}), action_type: analysis_data}
+
 def format_instrument_label(currency_pair):
     if currency_pair and currency_pair != 'UNKNOWN':
         return currency_pair
@@ -84,8 +115,18 @@ def format_instrument_label(currency_pair):
 
 def log_api_request_summary(endpoint_name, data):
     payload = data or {}
-    print(f"🚨 {endpoint_name}: Request keys: {sorted(payload.keys())}")
-    print(f"🚨 {endpoint_name}: Has image URL: {bool(payload.get('image_url'))}")
+    logger.info('request.received', endpoint=endpoint_name, content_type=request.content_type,
+                keys=sorted(payload.keys()), has_image_url=bool(payload.get('image_url')))
+
+
+def log_shortened(action_type, original_length, shortened_text):
+    logger.info('length.shortened', action_type=action_type, before=original_length, after=len(shortened_text))
+
+
+def log_final_response(action_type, response_data, text):
+    """One summary event per response; the body itself only for sampled requests."""
+    logger.info('response.ready', action_type=action_type, analysis_chars=len(text))
+    logger.body('response.body', response_data, action_type=action_type)
 
 
 def build_final_analysis_response(session_data):
@@ -116,9 +157,9 @@ def build_final_analysis_response(session_data):
     )
 
     if len(final_analysis) > 1024:
-        print(f"📏 LENGTH CHECK: Final analysis too long ({len(final_analysis)} chars), shortening...")
+        original_length = len(final_analysis)
         final_analysis = shorten_analysis_text(final_analysis, timeframe="مدمج", currency=final_currency)
-        print(f"📏 LENGTH CHECK: After shortening: {len(final_analysis)} chars")
+        log_shortened('final_analysis', original_length, final_analysis)
 
     return {
         "success": True,
@@ -128,10 +169,156 @@ def build_final_analysis_response(session_data):
         "next_prompt": "هل تريد مشاركة تحليلك الشخصي للحصول على تقييم؟"
     }
 
+def is_refused_analysis(analysis):
+    # Refusals or very short responses mean the model did not actually analyze the chart
+    return (analysis.startswith('❌') or
+            any(word in analysis.lower() for word in ['sorry', 'apology', 'اسف', 'اعتذر', 'لا استطيع', 'عذرًا']) or
+            len(analysis) < 100)
+
+
+def elapsed_ms(started_at):
+    return int((time.monotonic() - started_at) * 1000)
+
+
+def detect_chart_context(image_str, image_format, strict_frame_check=True):
+    """
+    Frame/timeframe/currency detection shared by the JSON and streaming endpoints.
+    Returns (frame_type, timeframe, currency, error). strict_frame_check also
+    re-detects when the investing.com detector apologised or returned UNKNOWN.
+    """
+    started_at = time.monotonic()
+    frame_type, detected_timeframe = detect_investing_frame(image_str, image_format)
+    logger.info('detect.frame', frame_type=frame_type, timeframe=detected_timeframe, ms=elapsed_ms(started_at))
+
+    needs_timeframe_detection = frame_type == "unknown"
+    if strict_frame_check:
+        # If investing.com detection returned an error message (starts with apology), treat as unknown
+        if frame_type and any(word in frame_type.lower() for word in ['sorry', 'apology', 'اسف', 'اعتذر']):
+            logger.warning('detect.frame_refused', frame_type=frame_type)
+            frame_type = "unknown"
+            detected_timeframe = "UNKNOWN"
+        needs_timeframe_detection = frame_type == "unknown" or detected_timeframe == "UNKNOWN"
+
+    if needs_timeframe_detection:
+        started_at = time.monotonic()
+        detected_timeframe, detection_error = detect_timeframe_from_image(image_str, image_format)
+        logger.info('detect.timeframe', timeframe=detected_timeframe, ms=elapsed_ms(started_at))
+        if detection_error:
+            logger.warning('detect.timeframe_failed', error=detection_error)
+            return frame_type, detected_timeframe, None, detection_error
+
+    started_at = time.monotonic()
+    detected_currency, currency_error = detect_currency_from_image(image_str, image_format)
+    logger.info('detect.currency', currency=detected_currency, ms=elapsed_ms(started_at))
+    return frame_type, detected_timeframe, detected_currency, None
+
+
+def sse_event(event_name, payload):
+    return f"event: {event_name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def sse_response(event_stream):
+    response = Response(stream_with_context(event_stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream until it ends
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def stream_chart_analysis_events(image_url, strict_frame_check, open_stream, refusal_fallback=None):
+    """
+    SSE generator: `detection` as soon as frame/timeframe/currency are known,
+    `token` events while the analysis streams, then one `analysis` event with
+    the final text after fallback/shortening (clients should replace the
+    streamed text with it). Failures end the stream with an `error` event.
+    """
+    try:
+        image_str, image_format = load_image_from_url(image_url)
+        logger.info('image.loaded', loaded=bool(image_str), format=image_format)
+        if not image_str:
+            yield sse_event('error', {"success": False, "error": "Could not load image from URL"})
+            return
+
+        frame_type, detected_timeframe, detected_currency, detection_error = detect_chart_context(
+            image_str, image_format, strict_frame_check=strict_frame_check
+        )
+        if detection_error:
+            yield sse_event('error', {"success": False, "error": detection_error})
+            return
+
+        yield sse_event('detection', {
+            "detected_timeframe": detected_timeframe,
+            "detected_currency": detected_currency,
+            "frame_type": frame_type
+        })
+
+        streamed_parts = []
+        for delta in open_stream(image_str, image_format, detected_timeframe, detected_currency):
+            streamed_parts.append(delta)
+            yield sse_event('token', {"text": delta})
+
+        analysis = ''.join(streamed_parts).strip()
+        replaced = False
+        if refusal_fallback and is_refused_analysis(analysis):
+            logger.warning('analysis.refused', chars=len(analysis), fallback=True)
+            analysis = refusal_fallback(image_str, image_format, detected_timeframe, detected_currency)
+            replaced = True
+
+        if len(analysis) > 1024:
+            original_length = len(analysis)
+            analysis = shorten_analysis_text(analysis, timeframe=detected_timeframe, currency=detected_currency)
+            replaced = True
+            log_shortened('stream', original_length, analysis)
+
+        logger.info('stream.completed', analysis_chars=len(analysis), replaced=replaced)
+        yield sse_event('analysis', {
+            "success": True,
+            "analysis": analysis,
+            "replaced": replaced,
+            "detected_timeframe": detected_timeframe,
+            "detected_currency": detected_currency,
+            "frame_type": frame_type
+        })
+    except Exception as e:
+        logger.exception('stream.failed', error=str(e))
+        yield sse_event('error', {"success": False, "error": f"Analysis failed: {str(e)}"})
+
+
+def start_streaming_request(endpoint_name, flow_type):
+    """Validate the request like the JSON endpoints; returns (image_url, error_response)."""
+    data = request.get_json()
+    log_api_request_summary(endpoint_name, data)
+    if not data:
+        return None, (jsonify({"success": False, "error": "No JSON data provided"}), 200)
+
+    telegram_user_id = data.get('telegram_user_id')
+    set_openai_usage_context(
+        telegram_user_id=int(telegram_user_id) if telegram_user_id else None,
+        endpoint_name=endpoint_name,
+        flow_type=flow_type,
+        flow_id=uuid4().hex
+    )
+
+    image_url = data.get('image_url')
+    if not image_url:
+        return None, (jsonify({"success": False, "error": "Missing image_url"}), 200)
+
+    openai_status = get_openai_status()
+    if not openai_status['available']:
+        openai_error = openai_status['error'] or 'Unknown error'
+        return None, (jsonify({
+            "success": False,
+            "error": "OpenAI service unavailable",
+            "message": openai_error
+        }), 200)
+
+    return image_url, None
+
 @api_bp.route('/')
 def home():
-    openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
-    openai_error = current_app.config.get('OPENAI_ERROR_MESSAGE', 'Unknown error')
+    openai_status = get_openai_status()
+    openai_available = openai_status['available']
+    openai_error = openai_status['error'] or 'Unknown error'
     status = "✅" if openai_available else "❌"
     return f"XFLEXAI Server is running {status} - OpenAI: {'Available' if openai_available else openai_error}"
 
@@ -162,6 +349,8 @@ def redeem_key_route():
 
 @api_bp.route('/analyze', methods=['POST'])
 @subscription_required
+@idempotent_request
+@single_flight_request
 def analyze():
     """
     SIMPLIFIED ANALYSIS ENDPOINT - handles all analysis types
@@ -169,46 +358,42 @@ def analyze():
     ALL RESPONSES LIMITED TO 1024 CHARACTERS FOR SENDPULSE
     """
     try:
-        # LOG INCOMING REQUEST
-        print(f"🚨 ANALYZE ENDPOINT: Received request at {datetime.now()}")
-        print(f"🚨 ANALYZE ENDPOINT: Content-Type: {request.content_type}")
-
         if not request.is_json:
             error_response = {
                 "success": False,
                 "message": "نوع المحتوى غير مدعوم"
             }
-            print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - Not JSON: {error_response}")
+            logger.warning('request.rejected', endpoint='analyze', reason='not_json', content_type=request.content_type)
             return jsonify(error_response), 415
 
         data = request.get_json()
-        log_api_request_summary("ANALYZE ENDPOINT", data)
+        log_api_request_summary('analyze', data)
 
         if not data:
             error_response = {
                 "success": False,
                 "message": "لم يتم إرسال بيانات"
             }
-            print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - No data: {error_response}")
+            logger.warning('request.rejected', endpoint='analyze', reason='no_data')
             return jsonify(error_response), 400
 
         telegram_user_id = int(data.get('telegram_user_id'))
         action_type = data.get('action_type', 'first_analysis')
         image_url = data.get('image_url')
 
-        print(f"🚨 ANALYZE ENDPOINT: 👤 Telegram ID: {telegram_user_id}")
-        print(f"🚨 ANALYZE ENDPOINT: 🎯 Action Type: {action_type}")
+        logger.info('analyze.action', telegram_user_id=telegram_user_id, action_type=action_type)
 
-        # Check OpenAI availability using current_app.config
-        openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
+        # Check OpenAI availability from the shared health status
+        openai_status = get_openai_status()
+        openai_available = openai_status['available']
         if not openai_available:
-            openai_error = current_app.config.get('OPENAI_ERROR_MESSAGE', 'Unknown error')
+            openai_error = openai_status['error'] or 'Unknown error'
             error_response = {
                 "success": False,
                 "message": "خدمة الذكاء الاصطناعي غير متوفرة",
                 "analysis": openai_error
             }
-            print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - OpenAI unavailable: {error_response}")
+            logger.warning('request.rejected', endpoint='analyze', reason='openai_unavailable', error=openai_error)
             return jsonify(error_response), 503
 
         session_data = load_analysis_session(telegram_user_id, reset=(action_type == 'first_analysis'))
@@ -221,14 +406,13 @@ def analyze():
         user_analysis_text = data.get('user_analysis')
         timeframe = data.get('timeframe', 'M15')
 
-        print(f"🚨 ANALYZE ENDPOINT: 💾 Session data: {session_data}")
+        logger.body('session.loaded', session_data, status=session_data.get('status'))
 
         # Load image if provided
         image_str, image_format = None, None
         if image_url:
-            print(f"🚨 ANALYZE ENDPOINT: 📥 Loading image from URL: {image_url}")
             image_str, image_format = load_image_from_url(image_url)
-            print(f"🚨 ANALYZE ENDPOINT: 🖼️ Image loaded - String: {bool(image_str)}, Format: {image_format}")
+            logger.info('image.loaded', loaded=bool(image_str), format=image_format)
 
         # Handle different action types
         if action_type == 'first_analysis':
@@ -237,15 +421,13 @@ def analyze():
                     "success": False,
                     "message": "صورة غير صالحة"
                 }
-                print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - Invalid image: {error_response}")
+                logger.warning('request.rejected', reason='invalid_image', action_type=action_type)
                 return jsonify(error_response), 200
 
-            print(f"🚨 ANALYZE ENDPOINT: 🧠 Starting first analysis with timeframe: {timeframe}")
-            
             # Detect currency from first image
-            print(f"🪙 ANALYZE ENDPOINT: Detecting currency from first image...")
             first_currency, currency_error = detect_currency_from_image(image_str, image_format)
-            print(f"🪙 ANALYZE ENDPOINT: First currency detected: {first_currency}")
+            logger.info('detect.currency', currency=first_currency)
+            logger.info('analysis.started', action_type=action_type, timeframe=timeframe)
             
             # Pass currency pair to analysis for proper stop loss rules
             analysis = analyze_with_openai(image_str, image_format, timeframe, action_type='first_analysis', currency_pair=first_currency)
@@ -258,19 +440,20 @@ def analyze():
                     "validation_error": True,
                     "expected_timeframe": "M15"
                 }
-                print(f"🚨 ANALYZE ENDPOINT: ⚠️ Timeframe validation failed (returning 200): {analysis}")
+                logger.warning('analysis.validation_failed', action_type=action_type, message=analysis)
                 return jsonify(error_response), 200
 
             # ✅ Check length and shorten if needed - UPDATED WITH TIMEFRAME AND CURRENCY
             if len(analysis) > 1024:
-                print(f"📏 LENGTH CHECK: First analysis too long ({len(analysis)} chars), shortening...")
+                original_length = len(analysis)
                 analysis = shorten_analysis_text(analysis, timeframe=timeframe, currency=first_currency)
-                print(f"📏 LENGTH CHECK: After shortening: {len(analysis)} chars")
+                log_shortened(action_type, original_length, analysis)
 
             session_data['first_analysis'] = analysis
             session_data['first_timeframe'] = timeframe
             session_data['first_currency'] = first_currency
             session_data['status'] = 'first_done'
+            store_structured_analysis(session_data, action_type)
             save_analysis_session(telegram_user_id, session_data)
             instrument_label = format_instrument_label(first_currency)
 
@@ -282,28 +465,17 @@ def analyze():
                 "next_prompt": f"الآن أرسل صورة الإطار الزمني الثاني (H4) لـ {instrument_label}"
             }
 
-            # Final logging before sending to SendPulse
-            print(f"🔍 FINAL RESPONSE TO SENDPULSE - {action_type.upper()}")
-            print(f"📊 Analysis length: {len(analysis)} characters")
-            print(f"📋 Final analysis preview: {analysis[:100]}...")
-            print(f"🔚 Final analysis ending: ...{analysis[-100:] if len(analysis) > 100 else analysis}")
-            print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-            print(f"📊 Response data size: {len(str(response_data))} characters")
-            print(f"📊 Analysis field size: {len(analysis)} characters")
-            print(f"🚀 Sending to SendPulse...")
-
-            print(f"🚨 ANALYZE ENDPOINT: ✅ First analysis completed - Response: {response_data}")
+            log_final_response(action_type, response_data, analysis)
             return jsonify(response_data), 200
 
         elif action_type == 'second_analysis':
-            print(f"🚨 ANALYZE ENDPOINT: 🔄 Starting second analysis")
-
             if session_data['status'] == 'both_done' and session_data.get('second_analysis'):
-                print("🚨 ANALYZE ENDPOINT: ♻️ Returning stored combined analysis for retry")
+                logger.info('analysis.replayed', action_type=action_type, status=session_data['status'])
                 response_data = build_final_analysis_response(session_data)
                 if response_data:
                     if not session_data.get('final_analysis'):
                         session_data['final_analysis'] = response_data['analysis']
+                        store_structured_analysis(session_data, 'final_analysis')
                         save_analysis_session(telegram_user_id, session_data)
                     return jsonify(response_data), 200
 
@@ -319,19 +491,21 @@ def analyze():
                     "success": False,
                     "message": "يجب تحليل الإطار الأول قبل الثاني"
                 }
-                print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - First analysis not done: {error_response}")
+                logger.warning('request.rejected', reason='first_analysis_missing', status=session_data['status'])
                 return jsonify(error_response), 200
 
             # Use H4 for second analysis
             second_timeframe = 'H4'
             
             # Detect currency from second image
-            print(f"🪙 ANALYZE ENDPOINT: Detecting currency from second image...")
-            second_currency, currency_error = detect_currency_from_image(image_str, image_format)
-            print(f"🪙 ANALYZE ENDPOINT: Second currency detected: {second_currency}")
+            # The first chart's pair is the signal a cheaper detection tier must agree with
+            first_currency = session_data.get('first_currency')
+            second_currency, currency_error = detect_currency_from_image(
+                image_str, image_format, expected_currency=first_currency
+            )
+            logger.info('detect.currency', currency=second_currency, expected=first_currency)
             
             # Validate currency consistency
-            first_currency = session_data.get('first_currency')
             if first_currency:
                 is_currency_valid, currency_error_msg = validate_currency_consistency(first_currency, second_currency)
                 if not is_currency_valid:
@@ -341,13 +515,21 @@ def analyze():
                         "validation_error": True,
                         "expected_currency": first_currency
                     }
-                    print(f"🚨 ANALYZE ENDPOINT: ⚠️ Currency validation failed (returning 200): {currency_error_msg}")
+                    logger.warning('currency.mismatch', expected=first_currency, detected=second_currency)
                     return jsonify(error_response), 200
 
-            print(f"🚨 ANALYZE ENDPOINT: 🧠 Starting second analysis with timeframe: {second_timeframe}")
-            
+            logger.info('analysis.started', action_type=action_type, timeframe=second_timeframe,
+                        merged=Config.MERGED_FINAL_ANALYSIS_ENABLED)
+            second_step_started_at = time.monotonic()
+
             # Pass currency pair to analysis for proper stop loss rules
-            analysis = analyze_with_openai(image_str, image_format, second_timeframe, session_data['first_analysis'], action_type='second_analysis', currency_pair=second_currency)
+            merged_final_analysis = None
+            if Config.MERGED_FINAL_ANALYSIS_ENABLED:
+                analysis, merged_final_analysis = analyze_merged_h4_final(
+                    image_str, image_format, session_data['first_analysis'], currency_pair=second_currency
+                )
+            else:
+                analysis = analyze_with_openai(image_str, image_format, second_timeframe, session_data['first_analysis'], action_type='second_analysis', currency_pair=second_currency)
 
             # Check if analysis returned a validation error (starts with ❌)
             if analysis.startswith('❌'):
@@ -357,22 +539,31 @@ def analyze():
                     "validation_error": True,
                     "expected_timeframe": "H4"
                 }
-                print(f"🚨 ANALYZE ENDPOINT: ⚠️ Timeframe validation failed (returning 200): {analysis}")
+                logger.warning('analysis.validation_failed', action_type=action_type, message=analysis)
                 return jsonify(error_response), 200
 
             # ✅ Check length and shorten if needed - UPDATED WITH TIMEFRAME AND CURRENCY
             if len(analysis) > 1024:
-                print(f"📏 LENGTH CHECK: Second analysis too long ({len(analysis)} chars), shortening...")
+                original_length = len(analysis)
                 analysis = shorten_analysis_text(analysis, timeframe=second_timeframe, currency=second_currency)
-                print(f"📏 LENGTH CHECK: After shortening: {len(analysis)} chars")
+                log_shortened(action_type, original_length, analysis)
+
+            if merged_final_analysis and len(merged_final_analysis) > 1024:
+                original_length = len(merged_final_analysis)
+                merged_final_analysis = shorten_analysis_text(merged_final_analysis, timeframe="مدمج", currency=second_currency)
+                log_shortened('final_analysis', original_length, merged_final_analysis)
 
             session_data['second_analysis'] = analysis
             session_data['second_timeframe'] = second_timeframe
             session_data['second_currency'] = second_currency
+            # A merged reply already carries the final analysis; build_final_analysis_response then only formats it
+            session_data['final_analysis'] = merged_final_analysis
             session_data['status'] = 'both_done'
+            store_structured_analysis(session_data, action_type)
             save_analysis_session(telegram_user_id, session_data)
 
-            print(f"🚨 ANALYZE ENDPOINT: 🧠 Generating final combined analysis")
+            if not merged_final_analysis:
+                logger.info('analysis.started', action_type='final_analysis')
             response_data = build_final_analysis_response(session_data)
             if not response_data:
                 return jsonify({
@@ -380,42 +571,36 @@ def analyze():
                     "message": "تعذر إنشاء التحليل الشامل"
                 }), 500
 
-            session_data['final_analysis'] = response_data['analysis']
-            save_analysis_session(telegram_user_id, session_data)
+            if not merged_final_analysis:
+                session_data['final_analysis'] = response_data['analysis']
+                store_structured_analysis(session_data, 'final_analysis')
+                save_analysis_session(telegram_user_id, session_data)
+
+            logger.info('second_step.completed', merged=bool(merged_final_analysis),
+                        ms=elapsed_ms(second_step_started_at))
 
-            # Final logging before sending to SendPulse
-            print(f"🔍 FINAL RESPONSE TO SENDPULSE - {action_type.upper()}")
-            print(f"📊 Analysis length: {len(response_data['analysis'])} characters")
-            print(f"📋 Final analysis preview: {response_data['analysis'][:100]}...")
-            print(f"🔚 Final analysis ending: ...{response_data['analysis'][-100:] if len(response_data['analysis']) > 100 else response_data['analysis']}")
-            print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-            print(f"📊 Response data size: {len(str(response_data))} characters")
-            print(f"📊 Analysis field size: {len(response_data['analysis'])} characters")
-            print(f"🚀 Sending to SendPulse...")
-
-            print(f"🚨 ANALYZE ENDPOINT: ✅ Second analysis completed - Response: {response_data}")
+            log_final_response(action_type, response_data, response_data['analysis'])
             return jsonify(response_data), 200
 
         elif action_type == 'user_analysis':
-            print(f"🚨 ANALYZE ENDPOINT: 👤 Starting user analysis feedback")
-
             if not user_analysis_text:
                 error_response = {
                     "success": False,
                     "message": "تحليل نصي مطلوب"
                 }
-                print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - No user analysis: {error_response}")
+                logger.warning('request.rejected', reason='missing_user_analysis', action_type=action_type)
                 return jsonify(error_response), 400
 
+            logger.info('analysis.started', action_type=action_type, chars=len(user_analysis_text))
             feedback = analyze_with_openai(
                 None, None, None, None, user_analysis_text, "user_analysis_feedback"
             )
 
             # ✅ Check length and shorten if needed (no timeframe/currency for user analysis)
             if len(feedback) > 1024:
-                print(f"📏 LENGTH CHECK: User feedback too long ({len(feedback)} chars), shortening...")
+                original_length = len(feedback)
                 feedback = shorten_analysis_text(feedback)
-                print(f"📏 LENGTH CHECK: After shortening: {len(feedback)} chars")
+                log_shortened(action_type, original_length, feedback)
 
             session_data['user_analysis'] = user_analysis_text
             session_data['status'] = 'completed'
@@ -429,21 +614,10 @@ def analyze():
                 "next_prompt": "يمكنك بدء تحليل جديد"
             }
 
-            # Final logging before sending to SendPulse
-            print(f"🔍 FINAL RESPONSE TO SENDPULSE - {action_type.upper()}")
-            print(f"📊 Analysis length: {len(feedback)} characters")
-            print(f"📋 Final analysis preview: {feedback[:100]}...")
-            print(f"🔚 Final analysis ending: ...{feedback[-100:] if len(feedback) > 100 else feedback}")
-            print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-            print(f"📊 Response data size: {len(str(response_data))} characters")
-            print(f"📊 Analysis field size: {len(feedback)} characters")
-            print(f"🚀 Sending to SendPulse...")
-
-            print(f"🚨 ANALYZE ENDPOINT: ✅ User analysis completed - Response: {response_data}")
+            log_final_response(action_type, response_data, feedback)
             return jsonify(response_data), 200
 
         elif action_type == 'new_session':
-            print(f"🚨 ANALYZE ENDPOINT: 🔄 Starting new session")
             session_data = create_analysis_session()
             save_analysis_session(telegram_user_id, session_data)
 
@@ -453,7 +627,7 @@ def analyze():
                 "next_action": "first_analysis",
                 "next_prompt": "أرسل صورة الرسم البياني الأول للتحليل"
             }
-            print(f"🚨 ANALYZE ENDPOINT: ✅ New session started - Response: {response_data}")
+            logger.info('session.reset', telegram_user_id=telegram_user_id)
             return jsonify(response_data), 200
 
         else:
@@ -461,7 +635,7 @@ def analyze():
                 "success": False,
                 "message": "نوع إجراء غير معروف"
             }
-            print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error - Unknown action type: {error_response}")
+            logger.warning('request.rejected', reason='unknown_action_type', action_type=action_type)
             return jsonify(error_response), 400
 
     except Exception as e:
@@ -469,19 +643,39 @@ def analyze():
             "success": False,
             "message": "حدث خطأ أثناء المعالجة. حاول مرة أخرى لاحقاً"
         }
-        print(f"🚨 ANALYZE ENDPOINT: ❌ Exception occurred: {str(e)}")
-        print(f"🚨 ANALYZE ENDPOINT: ❌ Returning error: {error_response}")
+        logger.exception('request.failed', endpoint='analyze', error=str(e))
         return jsonify(error_response), 500
 
 @api_bp.route('/status')
 def status_route():
-    openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
+    openai_status = get_openai_status()
     return jsonify({
         "server": "running",
-        "openai_available": openai_available,
-        "active_sessions": count_analysis_sessions()
+        "openai_available": openai_status['available'],
+        "openai_health": openai_status,
+        "active_sessions": count_analysis_sessions(),
+        "http_pool": get_http_client_stats(),
+        "openai_circuits": get_circuit_breaker_states(),
+        "openai_scheduler": get_openai_scheduler_snapshot(),
+        "openai_keys": get_client_pool_snapshot(),
+        "openai_dispatch": get_dispatcher_snapshot(),
+        "logging": get_logging_stats()
     })
 
+@api_bp.route('/jobs/<job_id>')
+def get_analysis_job_status(job_id):
+    """
+    Poll an async analysis job. `result` holds the endpoint's normal JSON response
+    once status is succeeded or failed. The job id itself is the access token.
+    """
+    if len(job_id) != 32 or any(char not in '0123456789abcdef' for char in job_id):
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    job = get_analysis_job(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify(build_job_status(job)), 200
+
 @api_bp.route('/session-info/<int:telegram_user_id>')
 @admin_session_required
 def session_info(telegram_user_id):
@@ -507,6 +701,9 @@ def clear_sessions():
 
 @api_bp.route('/analyze-single', methods=['POST'])
 @subscription_required
+@idempotent_request
+@async_job_request
+@single_flight_request
 def analyze_single_image():
     """
     Analyze a single image - automatically detect timeframe and provide enhanced analysis
@@ -516,13 +713,11 @@ def analyze_single_image():
     Expected JSON: { "telegram_user_id": 123456789, "image_url": "https://..." }
     """
     try:
-        print(f"🚨 ANALYZE-SINGLE: 📥 Received request at {datetime.now()}")
-
         data = request.get_json()
-        log_api_request_summary("ANALYZE-SINGLE", data)
+        log_api_request_summary('analyze_single', data)
 
         if not data:
-            print("🚨 ANALYZE-SINGLE: ❌ No JSON data provided")
+            logger.warning('request.rejected', endpoint='analyze_single', reason='no_data')
             return jsonify({
                 "success": False,
                 "error": "No JSON data provided"
@@ -538,19 +733,19 @@ def analyze_single_image():
         )
 
         if not image_url:
-            print("🚨 ANALYZE-SINGLE: ❌ Missing image_url")
+            logger.warning('request.rejected', reason='missing_image_url')
             return jsonify({
                 "success": False,
                 "error": "Missing image_url"
             }), 200
 
         # Check OpenAI availability
-        openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
-        print(f"🚨 ANALYZE-SINGLE: 🤖 OpenAI available: {openai_available}")
+        openai_status = get_openai_status()
+        openai_available = openai_status['available']
 
         if not openai_available:
-            openai_error = current_app.config.get('OPENAI_ERROR_MESSAGE', 'Unknown error')
-            print(f"🚨 ANALYZE-SINGLE: ❌ OpenAI unavailable: {openai_error}")
+            openai_error = openai_status['error'] or 'Unknown error'
+            logger.warning('request.rejected', reason='openai_unavailable', error=openai_error)
             return jsonify({
                 "success": False,
                 "error": "OpenAI service unavailable",
@@ -558,51 +753,27 @@ def analyze_single_image():
             }), 200
 
         # Load and encode image
-        print(f"🚨 ANALYZE-SINGLE: 📥 Loading image from URL...")
         image_str, image_format = load_image_from_url(image_url)
-        print(f"🚨 ANALYZE-SINGLE: 🖼️ Image loaded - String: {bool(image_str)}, Format: {image_format}")
+        logger.info('image.loaded', loaded=bool(image_str), format=image_format)
 
         if not image_str:
-            print("🚨 ANALYZE-SINGLE: ❌ Could not load image from URL")
             return jsonify({
                 "success": False,
                 "error": "Could not load image from URL"
             }), 200
 
-        # Detect investing.com frame first
-        print(f"🚨 ANALYZE-SINGLE: 🔍 Detecting frame type...")
-        frame_type, detected_timeframe = detect_investing_frame(image_str, image_format)
-        print(f"🚨 ANALYZE-SINGLE: 🔍 Frame type: {frame_type}, Timeframe: {detected_timeframe}")
-
-        # If investing.com detection returned an error message (starts with apology), treat as unknown
-        if frame_type and any(word in frame_type.lower() for word in ['sorry', 'apology', 'اسف', 'اعتذر']):
-            print(f"🚨 ANALYZE-SINGLE: ⚠️ Investing detection returned error, treating as unknown")
-            frame_type = "unknown"
-            detected_timeframe = "UNKNOWN"
-
-        # If not investing.com frame or detection failed, use standard detection
-        if frame_type == "unknown" or detected_timeframe == "UNKNOWN":
-            print(f"🚨 ANALYZE-SINGLE: 🔍 Detecting timeframe from image...")
-            detected_timeframe, detection_error = detect_timeframe_from_image(image_str, image_format)
-            print(f"🚨 ANALYZE-SINGLE: 🔍 Timeframe detection result: {detected_timeframe}, Error: {detection_error}")
-
-            if detection_error:
-                print(f"🚨 ANALYZE-SINGLE: ❌ Timeframe detection failed: {detection_error}")
-                return jsonify({
-                    "success": False,
-                    "error": detection_error
-                }), 200
-
-        # Detect currency from image
-        print(f"🪙 ANALYZE-SINGLE: Detecting currency from image...")
-        detected_currency, currency_error = detect_currency_from_image(image_str, image_format)
-        print(f"🪙 ANALYZE-SINGLE: Currency detected: {detected_currency}")
-
-        print(f"🚨 ANALYZE-SINGLE: ✅ Timeframe detected: {detected_timeframe}")
+        frame_type, detected_timeframe, detected_currency, detection_error = detect_chart_context(
+            image_str, image_format
+        )
+        if detection_error:
+            return jsonify({
+                "success": False,
+                "error": detection_error
+            }), 200
 
         # Analyze with OpenAI using detected timeframe with enhanced SMC analysis
-        print(f"🚨 ANALYZE-SINGLE: 🧠 Starting enhanced analysis with timeframe: {detected_timeframe}")
-        
+        logger.info('analysis.started', action_type='single_analysis', timeframe=detected_timeframe)
+
         # Pass currency pair to analysis for proper stop loss rules
         analysis = analyze_with_openai(
             image_str=image_str,
@@ -613,10 +784,8 @@ def analyze_single_image():
         )
 
         # Enhanced fallback for refusals or very short responses
-        if (analysis.startswith('❌') or 
-            any(word in analysis.lower() for word in ['sorry', 'apology', 'اسف', 'اعتذر', 'لا استطيع', 'عذرًا']) or
-            len(analysis) < 100):  # Very short response likely indicates refusal
-            print(f"🚨 ANALYZE-SINGLE: ⚠️ Analysis refused or too short, using fallback")
+        if is_refused_analysis(analysis):
+            logger.warning('analysis.refused', chars=len(analysis), fallback=True)
             analysis = analyze_simple_chart_fallback(
                 image_str=image_str,
                 image_format=image_format,
@@ -626,11 +795,9 @@ def analyze_single_image():
 
         # ✅ Check length and shorten if needed - UPDATED WITH TIMEFRAME AND CURRENCY
         if len(analysis) > 1024:
-            print(f"📏 LENGTH CHECK: Single analysis too long ({len(analysis)} chars), shortening...")
+            original_length = len(analysis)
             analysis = shorten_analysis_text(analysis, timeframe=detected_timeframe, currency=detected_currency)
-            print(f"📏 LENGTH CHECK: After shortening: {len(analysis)} chars")
-
-        print(f"🚨 ANALYZE-SINGLE: ✅ Enhanced analysis completed, length: {len(analysis)} chars")
+            log_shortened('single_analysis', original_length, analysis)
 
         response_data = {
             "success": True,
@@ -641,22 +808,12 @@ def analyze_single_image():
             "features": ["SMC_Analysis", "Immediate_Recommendations", "Liquidity_Analysis"]
         }
 
-        # Final logging before sending to SendPulse
-        print(f"🔍 FINAL RESPONSE TO SENDPULSE - SINGLE_ANALYSIS")
-        print(f"📊 Analysis length: {len(analysis)} characters")
-        print(f"📋 Final analysis preview: {analysis[:100]}...")
-        print(f"🔚 Final analysis ending: ...{analysis[-100:] if len(analysis) > 100 else analysis}")
-        print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-        print(f"📊 Response data size: {len(str(response_data))} characters")
-        print(f"📊 Analysis field size: {len(analysis)} characters")
-        print(f"🚀 Sending to SendPulse...")
+        log_final_response('single_analysis', response_data, analysis)
 
         return jsonify(response_data), 200
 
     except Exception as e:
-        print(f"🚨 ANALYZE-SINGLE: ❌ Exception occurred: {str(e)}")
-        import traceback
-        print(f"🚨 ANALYZE-SINGLE: ❌ Stack trace: {traceback.format_exc()}")
+        logger.exception('request.failed', error=str(e))
 
         return jsonify({
             "success": False,
@@ -665,6 +822,9 @@ def analyze_single_image():
 
 @api_bp.route('/analyze-technical', methods=['POST'])
 @subscription_required
+@idempotent_request
+@async_job_request
+@single_flight_request
 def analyze_technical():
     """
     Analyze the chart for technical analysis only
@@ -673,10 +833,8 @@ def analyze_technical():
     Expected JSON: { "telegram_user_id": 123456789, "image_url": "https://..." }
     """
     try:
-        print(f"🚨 ANALYZE-TECHNICAL: 📥 Received request at {datetime.now()}")
-
         data = request.get_json()
-        log_api_request_summary("ANALYZE-TECHNICAL", data)
+        log_api_request_summary('analyze_technical', data)
 
         if not data:
             return jsonify({
@@ -700,11 +858,11 @@ def analyze_technical():
             }), 200
 
         # Check OpenAI availability
-        openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
-        print(f"🚨 ANALYZE-TECHNICAL: 🤖 OpenAI available: {openai_available}")
+        openai_status = get_openai_status()
+        openai_available = openai_status['available']
 
         if not openai_available:
-            openai_error = current_app.config.get('OPENAI_ERROR_MESSAGE', 'Unknown error')
+            openai_error = openai_status['error'] or 'Unknown error'
             return jsonify({
                 "success": False,
                 "error": "OpenAI service unavailable",
@@ -712,9 +870,8 @@ def analyze_technical():
             }), 200
 
         # Load and encode image
-        print(f"🚨 ANALYZE-TECHNICAL: 📥 Loading image from URL...")
         image_str, image_format = load_image_from_url(image_url)
-        print(f"🚨 ANALYZE-TECHNICAL: 🖼️ Image loaded - String: {bool(image_str)}, Format: {image_format}")
+        logger.info('image.loaded', loaded=bool(image_str), format=image_format)
 
         if not image_str:
             return jsonify({
@@ -722,32 +879,17 @@ def analyze_technical():
                 "error": "Could not load image from URL"
             }), 200
 
-        # Detect investing.com frame first
-        print(f"🚨 ANALYZE-TECHNICAL: 🔍 Detecting frame type...")
-        frame_type, detected_timeframe = detect_investing_frame(image_str, image_format)
-        print(f"🚨 ANALYZE-TECHNICAL: 🔍 Frame type: {frame_type}, Timeframe: {detected_timeframe}")
-
-        # If not investing.com frame, use standard detection
-        if frame_type == "unknown":
-            print(f"🚨 ANALYZE-TECHNICAL: 🔍 Detecting timeframe from image...")
-            detected_timeframe, detection_error = detect_timeframe_from_image(image_str, image_format)
-            print(f"🚨 ANALYZE-TECHNICAL: 🔍 Timeframe detection result: {detected_timeframe}, Error: {detection_error}")
-
-            if detection_error:
-                return jsonify({
-                    "success": False,
-                    "error": detection_error
-                }), 200
-
-        # Detect currency from image
-        print(f"🪙 ANALYZE-TECHNICAL: Detecting currency from image...")
-        detected_currency, currency_error = detect_currency_from_image(image_str, image_format)
-        print(f"🪙 ANALYZE-TECHNICAL: Currency detected: {detected_currency}")
-
-        print(f"🚨 ANALYZE-TECHNICAL: ✅ Timeframe detected: {detected_timeframe}")
+        frame_type, detected_timeframe, detected_currency, detection_error = detect_chart_context(
+            image_str, image_format, strict_frame_check=False
+        )
+        if detection_error:
+            return jsonify({
+                "success": False,
+                "error": detection_error
+            }), 200
 
         # Analyze technical chart only with currency info
-        print(f"🚨 ANALYZE-TECHNICAL: 🧠 Starting technical analysis with timeframe: {detected_timeframe}")
+        logger.info('analysis.started', action_type='technical_analysis', timeframe=detected_timeframe)
 
         analysis = analyze_technical_chart(
             image_str=image_str,
@@ -758,11 +900,9 @@ def analyze_technical():
 
         # ✅ Check length and shorten if needed - UPDATED WITH TIMEFRAME AND CURRENCY
         if len(analysis) > 1024:
-            print(f"📏 LENGTH CHECK: Technical analysis too long ({len(analysis)} chars), shortening...")
+            original_length = len(analysis)
             analysis = shorten_analysis_text(analysis, timeframe=detected_timeframe, currency=detected_currency)
-            print(f"📏 LENGTH CHECK: After shortening: {len(analysis)} chars")
-
-        print(f"🚨 ANALYZE-TECHNICAL: ✅ Technical analysis completed, length: {len(analysis)} chars")
+            log_shortened('technical_analysis', original_length, analysis)
 
         response_data = {
             "success": True,
@@ -773,30 +913,77 @@ def analyze_technical():
             "type": "technical_analysis"
         }
 
-        # Final logging before sending to SendPulse
-        print(f"🔍 FINAL RESPONSE TO SENDPULSE - TECHNICAL_ANALYSIS")
-        print(f"📊 Analysis length: {len(analysis)} characters")
-        print(f"📋 Final analysis preview: {analysis[:100]}...")
-        print(f"🔚 Final analysis ending: ...{analysis[-100:] if len(analysis) > 100 else analysis}")
-        print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-        print(f"📊 Response data size: {len(str(response_data))} characters")
-        print(f"📊 Analysis field size: {len(analysis)} characters")
-        print(f"🚀 Sending to SendPulse...")
+        log_final_response('technical_analysis', response_data, analysis)
 
         return jsonify(response_data), 200
 
     except Exception as e:
-        print(f"🚨 ANALYZE-TECHNICAL: ❌ Exception occurred: {str(e)}")
-        import traceback
-        print(f"🚨 ANALYZE-TECHNICAL: ❌ Stack trace: {traceback.format_exc()}")
+        logger.exception('request.failed', error=str(e))
 
         return jsonify({
             "success": False,
             "error": f"Technical analysis failed: {str(e)}"
         }), 200
 
+@api_bp.route('/analyze-single/stream', methods=['POST'])
+@subscription_required
+def analyze_single_image_stream():
+    """
+    Server-sent-events variant of /analyze-single: detection results are pushed
+    first, then the analysis text as tokens arrive.
+
+    Expected JSON: { "telegram_user_id": 123456789, "image_url": "https://..." }
+    """
+    image_url, error_response = start_streaming_request('analyze_single_stream', 'single_image_analysis')
+    if error_response:
+        return error_response
+
+    def open_stream(image_str, image_format, timeframe, currency):
+        return stream_analysis_with_openai(
+            image_str=image_str,
+            image_format=image_format,
+            timeframe=timeframe,
+            action_type="single_analysis",
+            currency_pair=currency
+        )
+
+    def refusal_fallback(image_str, image_format, timeframe, currency):
+        return analyze_simple_chart_fallback(
+            image_str=image_str,
+            image_format=image_format,
+            timeframe=timeframe,
+            currency_pair=currency
+        )
+
+    return sse_response(stream_chart_analysis_events(image_url, True, open_stream, refusal_fallback))
+
+@api_bp.route('/analyze-technical/stream', methods=['POST'])
+@subscription_required
+def analyze_technical_stream():
+    """
+    Server-sent-events variant of /analyze-technical.
+
+    Expected JSON: { "telegram_user_id": 123456789, "image_url": "https://..." }
+    """
+    image_url, error_response = start_streaming_request('analyze_technical_stream', 'technical_analysis')
+    if error_response:
+        return error_response
+
+    def open_stream(image_str, image_format, timeframe, currency):
+        return stream_technical_chart(
+            image_str=image_str,
+            image_format=image_format,
+            timeframe=timeframe,
+            currency_pair=currency
+        )
+
+    return sse_response(stream_chart_analysis_events(image_url, False, open_stream))
+
 @api_bp.route('/analyze-user-feedback', methods=['POST'])
 @subscription_required
+@idempotent_request
+@async_job_request
+@single_flight_request
 def analyze_user_feedback():
     """
     Analyze user's drawn analysis and provide feedback
@@ -805,10 +992,8 @@ def analyze_user_feedback():
     Expected JSON: { "telegram_user_id": 123456789, "image_url": "https://..." }
     """
     try:
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 📥 Received request at {datetime.now()}")
-
         data = request.get_json()
-        log_api_request_summary("ANALYZE-USER-FEEDBACK", data)
+        log_api_request_summary('analyze_user_feedback', data)
 
         if not data:
             return jsonify({
@@ -832,11 +1017,11 @@ def analyze_user_feedback():
             }), 200
 
         # Check OpenAI availability
-        openai_available = current_app.config.get('OPENAI_AVAILABLE', False)
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 🤖 OpenAI available: {openai_available}")
+        openai_status = get_openai_status()
+        openai_available = openai_status['available']
 
         if not openai_available:
-            openai_error = current_app.config.get('OPENAI_ERROR_MESSAGE', 'Unknown error')
+            openai_error = openai_status['error'] or 'Unknown error'
             return jsonify({
                 "success": False,
                 "error": "OpenAI service unavailable",
@@ -844,9 +1029,8 @@ def analyze_user_feedback():
             }), 200
 
         # Load and encode image
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 📥 Loading image from URL...")
         image_str, image_format = load_image_from_url(image_url)
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 🖼️ Image loaded - String: {bool(image_str)}, Format: {image_format}")
+        logger.info('image.loaded', loaded=bool(image_str), format=image_format)
 
         if not image_str:
             return jsonify({
@@ -855,9 +1039,9 @@ def analyze_user_feedback():
             }), 200
 
         # Detect timeframe from image
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 🔍 Detecting timeframe from image...")
+        started_at = time.monotonic()
         timeframe, detection_error = detect_timeframe_from_image(image_str, image_format)
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 🔍 Timeframe detection result: {timeframe}, Error: {detection_error}")
+        logger.info('detect.timeframe', timeframe=timeframe, ms=elapsed_ms(started_at))
 
         if detection_error:
             return jsonify({
@@ -865,10 +1049,8 @@ def analyze_user_feedback():
                 "error": detection_error
             }), 200
 
-        print(f"🚨 ANALYZE-USER-FEEDBACK: ✅ Timeframe detected: {timeframe}")
-
         # For user feedback, we don't need technical analysis context
-        print(f"🚨 ANALYZE-USER-FEEDBACK: 🧠 Starting user feedback analysis with timeframe: {timeframe}")
+        logger.info('analysis.started', action_type='user_feedback', timeframe=timeframe)
 
         feedback = analyze_user_drawn_feedback_simple(
             image_str=image_str,
@@ -878,11 +1060,9 @@ def analyze_user_feedback():
 
         # ✅ Check length and shorten if needed - UPDATED WITH TIMEFRAME
         if len(feedback) > 1024:
-            print(f"📏 LENGTH CHECK: User feedback too long ({len(feedback)} chars), shortening...")
+            original_length = len(feedback)
             feedback = shorten_analysis_text(feedback, timeframe=timeframe)
-            print(f"📏 LENGTH CHECK: After shortening: {len(feedback)} chars")
-
-        print(f"🚨 ANALYZE-USER-FEEDBACK: ✅ User feedback analysis completed, length: {len(feedback)} chars")
+            log_shortened('user_feedback', original_length, feedback)
 
         response_data = {
             "success": True,
@@ -891,22 +1071,12 @@ def analyze_user_feedback():
             "type": "user_feedback"
         }
 
-        # Final logging before sending to SendPulse
-        print(f"🔍 FINAL RESPONSE TO SENDPULSE - USER_FEEDBACK")
-        print(f"📊 Analysis length: {len(feedback)} characters")
-        print(f"📋 Final analysis preview: {feedback[:100]}...")
-        print(f"🔚 Final analysis ending: ...{feedback[-100:] if len(feedback) > 100 else feedback}")
-        print(f"🔍 FINAL CHECK BEFORE SENDPULSE:")
-        print(f"📊 Response data size: {len(str(response_data))} characters")
-        print(f"📊 Analysis field size: {len(feedback)} characters")
-        print(f"🚀 Sending to SendPulse...")
+        log_final_response('user_feedback', response_data, feedback)
 
         return jsonify(response_data), 200
 
     except Exception as e:
-        print(f"🚨 ANALYZE-USER-FEEDBACK: ❌ Exception occurred: {str(e)}")
-        import traceback
-        print(f"🚨 ANALYZE-USER-FEEDBACK: ❌ Stack trace: {traceback.format_exc()}")
+        logger.exception('request.failed', error=str(e))
 
         return jsonify({
             "success": False,
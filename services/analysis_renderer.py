@@ -0,0 +1,164 @@
+# services/analysis_renderer.py
+import json
+import re
+from services.length_fitter import cut_at_line_boundary
+
+# Structured mode (STRUCTURED_ANALYSIS_ENABLED): the model answers with a JSON object
+# and the Arabic text is rendered here, so the 1024-char limit is enforced locally.
+JSON_FENCE_PATTERN = re.compile(r'\A\s*```(?:json)?\s*|\s*```\s*\Z', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+TREND_LABELS = {
+    'bullish': 'صاعد', 'up': 'صاعد', 'uptrend': 'صاعد',
+    'bearish': 'هابط', 'down': 'هابط', 'downtrend': 'هابط',
+    'sideways': 'جانبي', 'range': 'جانبي', 'neutral': 'جانبي',
+}
+SIDE_LABELS = {'buy': 'شراء', 'long': 'شراء', 'sell': 'بيع', 'short': 'بيع'}
+
+# Cumulative render options, loosest first; the first stage whose text fits is used.
+# Entries, stop loss, the first target and R:R survive every stage.
+FULL_RENDER = {
+    'max_notes': None, 'max_levels': 3, 'trend_summary': True,
+    'entry_conditions': True, 'max_entries': None, 'max_targets': None,
+}
+RENDER_STAGES = (
+    ('trim_notes', {'max_notes': 2}),
+    ('drop_notes', {'max_notes': 0}),
+    ('trim_levels', {'max_levels': 2}),
+    ('drop_trend_summary', {'trend_summary': False}),
+    ('drop_entry_conditions', {'entry_conditions': False}),
+    ('trim_targets', {'max_targets': 2, 'max_levels': 1}),
+    ('essentials', {'max_entries': 1, 'max_targets': 1, 'max_levels': 0}),
+)
+
+
+def as_text(value):
+    if value is None or isinstance(value, bool):
+        return ''
+    if isinstance(value, float):
+        value = f"{value:f}".rstrip('0').rstrip('.')
+    return WHITESPACE_PATTERN.sub(' ', str(value)).strip()
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [item for item in value if (as_text(item) if not isinstance(item, dict) else item)]
+
+
+def normalize_entry(entry):
+    if not isinstance(entry, dict):
+        return {'side': '', 'price': as_text(entry), 'condition': ''}
+    side = as_text(entry.get('side'))
+    return {
+        'side': SIDE_LABELS.get(side.lower(), side),
+        'price': as_text(entry.get('price')),
+        'condition': as_text(entry.get('condition')),
+    }
+
+
+def parse_structured_analysis(raw):
+    """
+    The model's JSON answer as a normalized dict, or None when it is not a usable
+    analysis (invalid JSON, e.g. cut off by max_tokens, or no entry/stop loss).
+    """
+    try:
+        payload = json.loads(JSON_FENCE_PATTERN.sub('', raw or ''))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+
+    trend = payload.get('trend')
+    if not isinstance(trend, dict):
+        trend = {'direction': trend}
+    levels = payload.get('levels') if isinstance(payload.get('levels'), dict) else {}
+    stop_loss = payload.get('stop_loss')
+    if not isinstance(stop_loss, dict):
+        stop_loss = {'price': stop_loss}
+    direction = as_text(trend.get('direction'))
+
+    data = {
+        'chart_timeframe': as_text(payload.get('chart_timeframe')),
+        'chart_symbol': as_text(payload.get('chart_symbol')),
+        'trend': {
+            'direction': TREND_LABELS.get(direction.lower(), direction),
+            'summary': as_text(trend.get('summary')),
+        },
+        'levels': {
+            'support': [as_text(level) for level in as_list(levels.get('support'))],
+            'resistance': [as_text(level) for level in as_list(levels.get('resistance'))],
+        },
+        'entries': [entry for entry in map(normalize_entry, as_list(payload.get('entries'))) if entry['price']],
+        'stop_loss': {'price': as_text(stop_loss.get('price')), 'pips': as_text(stop_loss.get('pips'))},
+        'targets': [as_text(target) for target in as_list(payload.get('targets'))],
+        'risk_reward': as_text(payload.get('risk_reward')),
+        'notes': [as_text(note) for note in as_list(payload.get('notes'))],
+    }
+    if not data['entries'] or not data['stop_loss']['price']:
+        return None
+    return data
+
+
+def limit(items, max_items):
+    return items if max_items is None else items[:max_items]
+
+
+def render_sections(data, options):
+    lines = []
+    trend = data['trend']
+    if trend['direction'] or trend['summary']:
+        trend_line = f"🎯 الاتجاه: {trend['direction']}" if trend['direction'] else "🎯 الاتجاه:"
+        if options['trend_summary'] and trend['summary']:
+            trend_line += f" - {trend['summary']}" if trend['direction'] else f" {trend['summary']}"
+        lines.append(trend_line)
+
+    for label, key in (('🛡️ الدعم', 'support'), ('🚧 المقاومة', 'resistance')):
+        levels = limit(data['levels'][key], options['max_levels'])
+        if levels:
+            lines.append(f"{label}: {' / '.join(levels)}")
+
+    lines.append("💼 الدخول:")
+    for entry in limit(data['entries'], options['max_entries']):
+        entry_line = f"- {entry['side']} عند {entry['price']}" if entry['side'] else f"- {entry['price']}"
+        if options['entry_conditions'] and entry['condition']:
+            entry_line += f" ({entry['condition']})"
+        lines.append(entry_line)
+
+    stop_loss = data['stop_loss']
+    stop_line = f"⛔ وقف الخسارة: {stop_loss['price']}"
+    if stop_loss['pips']:
+        stop_line += f" ({stop_loss['pips']} نقطة)"
+    lines.append(stop_line)
+
+    targets = limit(data['targets'], options['max_targets'])
+    if targets:
+        lines.append(f"✅ الأهداف: {' / '.join(targets)}")
+    if data['risk_reward']:
+        lines.append(f"⚖️ نسبة المخاطرة إلى العائد: {data['risk_reward']}")
+
+    notes = limit(data['notes'], options['max_notes'])
+    if notes:
+        lines.append("📝 ملاحظات:")
+        lines.extend(f"- {note}" for note in notes)
+    return '\n'.join(lines)
+
+
+def render_analysis(data, char_limit=1024):
+    """
+    Render a parsed structured analysis as Arabic text of at most char_limit
+    characters, applying RENDER_STAGES until it fits. Returns {'text', 'stage'}.
+    """
+    options = dict(FULL_RENDER)
+    text = render_sections(data, options)
+    if len(text) <= char_limit:
+        return {'text': text, 'stage': None}
+
+    for stage_name, changes in RENDER_STAGES:
+        options.update(changes)
+        text = render_sections(data, options)
+        if len(text) <= char_limit:
+            return {'text': text, 'stage': stage_name}
+    return {'text': cut_at_line_boundary(text, char_limit), 'stage': 'cut_at_line_boundary'}
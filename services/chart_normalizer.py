@@ -0,0 +1,149 @@
+# services/chart_normalizer.py
+import re
+from types import MappingProxyType
+
+TIMEFRAME_VOCABULARY = frozenset({'M1', 'M5', 'M15', 'M30', 'H1', 'H4', 'D1', 'W1', 'MN'})
+FRAME_TIMEFRAME_VOCABULARY = TIMEFRAME_VOCABULARY | {'D5', '6MN', 'YTD'}
+INSTRUMENT_QUOTE_CURRENCIES = frozenset({'USD', 'EUR', 'JPY', 'GBP', 'CHF', 'AUD', 'CAD', 'NZD', 'USDT'})
+TICKER_SYMBOL_PATTERN = re.compile(r'^[A-Z][A-Z0-9.]{1,5}$')
+
+# Labels the model wraps around its answer ("TF: M15", "Timeframe H4"); spaces are removed first
+TIMEFRAME_NOISE_PATTERN = re.compile(r'TIMEFRAME:?|PERIOD:?|TF:')
+SYMBOL_NOISE_PATTERN = re.compile(r'[ "\']')
+
+# An explicit "not found" must stay UNKNOWN; the word rules below would read its W/N as W1/MN
+NO_TIMEFRAME_ANSWERS = frozenset({'', 'UNKNOWN', 'NOTFOUND', 'NONE', 'N/A'})
+NO_SYMBOL_ANSWERS = frozenset({'', 'UNKNOWN', 'NOTFOUND'})
+
+TIMEFRAME_ALIASES = MappingProxyType({
+    '15MINUTES': 'M15', '15MINUTE': 'M15', '15MIN': 'M15', '15M': 'M15', 'M15M': 'M15', '15': 'M15',
+    '30MINUTES': 'M30', '30MINUTE': 'M30', '30MIN': 'M30', '30M': 'M30', 'M30M': 'M30',
+    '4HOURS': 'H4', '4HOUR': 'H4', '4H': 'H4', 'H4H': 'H4', '240M': 'H4',
+    '1HOUR': 'H1', '1H': 'H1', 'H1H': 'H1', '60M': 'H1', '60MIN': 'H1',
+    'DAILY': 'D1', '1DAY': 'D1', '1D': 'D1', 'D1D': 'D1',
+    'WEEKLY': 'W1', '1WEEK': 'W1', '1W': 'W1',
+    'MONTHLY': 'MN', '1MONTH': 'MN', 'MN': 'MN',
+    '5MINUTES': 'M5', '5MINUTE': 'M5', '5MIN': 'M5', '5M': 'M5', 'M5M': 'M5',
+    '1MINUTE': 'M1', '1MIN': 'M1', '1M': 'M1', 'M1M': 'M1',
+})
+
+# Stock-chart range buttons; '1M' is one month here, not one minute
+FRAME_TIMEFRAME_ALIASES = MappingProxyType({
+    '15': 'M15', '30': 'M30', '1H': 'H1', '4H': 'H4',
+    '1D': 'D1', '1DAY': 'D1', 'DAILY': 'D1',
+    '5D': 'D5', '5DAY': 'D5',
+    '1W': 'W1', '1WEEK': 'W1', 'WEEKLY': 'W1',
+    '1M': 'MN', '1MONTH': 'MN', 'MONTHLY': 'MN',
+    '6M': '6MN', '6MONTH': '6MN',
+    'YTD': 'YTD', 'YEAR': 'YTD',
+})
+
+# Codes found inside a longer answer, M15 ahead of M1 so "M15" is never read as one minute
+TIMEFRAME_PRIORITY = ('M15', 'M30', 'H4', 'H1', 'D1', 'W1', 'MN', 'M5', 'M1')
+
+# (unit marker, ((code, value markers), ...)); MIN/MINUTE contain M and HOUR contains H.
+# An empty value tuple means the unit alone decides.
+TIMEFRAME_WORD_RULES = (
+    (('M',), (('M15', ('15', 'FIFTEEN')), ('M30', ('30', 'THIRTY')), ('M5', ('5', 'FIVE')), ('M1', ('1',)))),
+    (('H',), (('H4', ('4', 'FOUR')), ('H1', ('1',)))),
+    (('D',), (('D1', ()),)),
+    (('W',), (('W1', ()),)),
+    (('MONTH', 'MN'), (('MN', ()),)),
+)
+
+FRAME_TYPES = frozenset({'investing', 'trading_app', 'metatrader', 'stock_chart', 'unknown'})
+STOCK_CHART_MARKERS = ('1 day', '5 days', '1 month', '6 months', 'Prev close')
+
+SYMBOL_ALIASES = MappingProxyType({
+    'S&P500': 'SPX', 'S&P': 'SPX', 'SP500': 'SPX',
+    'DOW': 'DOW', 'DJI': 'DOW',
+    'NASDAQ': 'NQ', 'NQ100': 'NQ',
+    'GOLD': 'XAU/USD', 'XAU': 'XAU/USD',
+    'SILVER': 'XAG/USD', 'XAG': 'XAG/USD',
+    'OIL': 'WTI', 'CRUDE': 'WTI',
+})
+
+
+def clean_timeframe(raw):
+    return TIMEFRAME_NOISE_PATTERN.sub('', str(raw).upper().replace(' ', ''))
+
+
+def match_timeframe(raw):
+    """
+    Map a raw timeframe answer onto TIMEFRAME_VOCABULARY.
+    Returns (timeframe or 'UNKNOWN', cleaned answer, stage that decided it).
+    """
+    cleaned = clean_timeframe(raw)
+    if cleaned in NO_TIMEFRAME_ANSWERS:
+        return 'UNKNOWN', cleaned, 'not reported'
+
+    timeframe = TIMEFRAME_ALIASES.get(cleaned)
+    if timeframe:
+        return timeframe, cleaned, 'exact'
+
+    for timeframe in TIMEFRAME_PRIORITY:
+        if timeframe in cleaned:
+            return timeframe, cleaned, 'partial'
+
+    for units, rules in TIMEFRAME_WORD_RULES:
+        if not any(unit in cleaned for unit in units):
+            continue
+        for timeframe, markers in rules:
+            if not markers or any(marker in cleaned for marker in markers):
+                return timeframe, cleaned, 'word'
+
+    return 'UNKNOWN', cleaned, 'no match'
+
+
+def normalize_frame_timeframe(raw):
+    """
+    Timeframe half of a frame detection. Range-button aliases first, then exact
+    timeframe aliases; anything else is returned as given so the caller escalates.
+    """
+    timeframe = str(raw).strip().upper()
+    if timeframe in FRAME_TIMEFRAME_ALIASES:
+        return FRAME_TIMEFRAME_ALIASES[timeframe]
+    if timeframe in FRAME_TIMEFRAME_VOCABULARY:
+        return timeframe
+    return TIMEFRAME_ALIASES.get(clean_timeframe(timeframe), timeframe)
+
+
+def normalize_frame_type(frame_type, raw_answer):
+    frame_type = frame_type.strip().lower()
+    if frame_type in FRAME_TYPES:
+        return frame_type
+    if any(marker in raw_answer for marker in STOCK_CHART_MARKERS):
+        return 'stock_chart'
+    return 'unknown'
+
+
+def canonicalize_symbol(symbol):
+    """EURUSD, eur/usd and 'EUR USD' all become EUR/USD; tickers are only upper-cased."""
+    if not symbol:
+        return 'UNKNOWN'
+    cleaned = str(symbol).replace(' ', '').replace('/', '').upper()
+    if cleaned in NO_SYMBOL_ANSWERS:
+        return 'UNKNOWN'
+    if len(cleaned) == 6 and cleaned.isalpha() and cleaned[3:] in INSTRUMENT_QUOTE_CURRENCIES:
+        return f"{cleaned[:3]}/{cleaned[3:]}"
+    return cleaned
+
+
+def normalize_symbol(raw):
+    """Raw symbol answer to its canonical form, or 'UNKNOWN' when it is not symbol-shaped."""
+    cleaned = SYMBOL_NOISE_PATTERN.sub('', str(raw).upper())
+    symbol = canonicalize_symbol(SYMBOL_ALIASES.get(cleaned, cleaned))
+    return symbol if 2 <= len(symbol) <= 10 else 'UNKNOWN'
+
+
+def instrument_key(symbol):
+    """Comparison key: XAUUSD, XAU/USD and xau/usd share one."""
+    return canonicalize_symbol(symbol).replace('/', '')
+
+
+def is_recognized_instrument(symbol):
+    """True for a pair quoted in a known currency or a plain ticker-shaped symbol."""
+    if '/' in symbol:
+        base, quote = symbol.split('/', 1)
+        return base.isalpha() and 2 <= len(base) <= 5 and quote in INSTRUMENT_QUOTE_CURRENCIES
+    return bool(TICKER_SYMBOL_PATTERN.match(symbol))
@@ -0,0 +1,115 @@
+# services/http_client.py
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_counter_lock = threading.Lock()
+_request_count = 0
+_error_count = 0
+
+
+def build_http_session():
+    """
+    Create a keep-alive session with per-host pools. pool_block=False: when every pooled
+    connection is busy a caller gets an extra, unpooled connection instead of waiting
+    (requests passes no pool timeout, so a blocking pool would wait forever).
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=Config.HTTP_POOL_HOSTS,
+        pool_maxsize=Config.HTTP_POOL_MAXSIZE_PER_HOST,
+        pool_block=False,
+        max_retries=Retry(total=1, connect=1, read=0, status=0, redirect=3, raise_on_status=False)
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent': 'XFLEXAI-Server/1.0'})
+    return session
+
+
+def get_http_session():
+    """
+    Return this worker's shared session. A forked worker never reuses the
+    parent's sockets because the session is rebuilt when the PID changes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = build_http_session()
+                _session_pid = pid
+    return _session
+
+
+def default_timeout():
+    return (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+
+
+def http_request(method, url, **kwargs):
+    global _request_count, _error_count
+    kwargs.setdefault('timeout', default_timeout())
+    with _counter_lock:
+        _request_count += 1
+    try:
+        return get_http_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        with _counter_lock:
+            _error_count += 1
+        raise
+
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    return http_request('POST', url, **kwargs)
+
+
+def get_http_client_stats(include_pools=False):
+    """
+    Connection-reuse metrics for this worker's pools. The per-host breakdown names
+    the hosts this server talks to, so it is left out unless include_pools is set.
+    """
+    session = _session if _session_pid == os.getpid() else None
+    pools = []
+    opened_connections = 0
+    pooled_requests = 0
+    if session:
+        adapter = session.get_adapter('https://')
+        pool_container = adapter.poolmanager.pools
+        for pool_key in list(pool_container.keys()):
+            pool = pool_container.get(pool_key)
+            if pool is None:
+                continue
+            opened_connections += pool.num_connections
+            pooled_requests += pool.num_requests
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            })
+
+    reused = max(0, pooled_requests - opened_connections)
+    with _counter_lock:
+        request_count, error_count = _request_count, _error_count
+    stats = {
+        'pid': os.getpid(),
+        'requests': request_count,
+        'errors': error_count,
+        'pool_count': len(pools),
+        'connections_opened': opened_connections,
+        'connections_reused': reused,
+        'reuse_ratio': round(reused / pooled_requests, 3) if pooled_requests else 0.0
+    }
+    if include_pools:
+        stats['pools'] = pools
+    return stats
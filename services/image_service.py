@@ -0,0 +1,187 @@
+# services/image_service.py
+import base64
+import struct
+from io import BytesIO
+from flask import g, has_request_context
+from config import Config
+from services.http_client import http_get
+from utils.structured_log import get_logger
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Base64 characters decoded to find the image header (a multiple of 4, about 6 KB of image)
+BASE64_HEADER_CHARS = 8 * 1024
+logger = get_logger('image')
+
+# JPEG start-of-frame markers that carry the image dimensions (SOF0-SOF15 minus DHT/JPG/DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageLoadError(Exception):
+    pass
+
+
+def sniff_image_format(header_bytes):
+    """Return 'PNG' or 'JPEG' from the leading bytes, or None for anything else."""
+    if header_bytes.startswith(PNG_SIGNATURE):
+        return 'PNG'
+    if header_bytes.startswith(JPEG_SIGNATURE):
+        return 'JPEG'
+    return None
+
+
+def read_image_dimensions(data, image_format):
+    """
+    Read (width, height) from the PNG IHDR chunk or the first JPEG SOF segment
+    without decoding any pixel data. Returns (None, None) if the header is unreadable.
+    """
+    try:
+        if image_format == 'PNG':
+            if len(data) < 24 or data[12:16] != b'IHDR':
+                return None, None
+            width, height = struct.unpack('>II', data[16:24])
+            return width, height
+
+        if image_format == 'JPEG':
+            offset = 2
+            data_length = len(data)
+            while offset + 4 <= data_length:
+                if data[offset] != 0xFF:
+                    offset += 1
+                    continue
+                marker = data[offset + 1]
+                if marker == 0xFF:
+                    offset += 1
+                    continue
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    offset += 2
+                    continue
+                segment_length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+                if marker in JPEG_SOF_MARKERS:
+                    if offset + 9 > data_length:
+                        return None, None
+                    height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+                    return width, height
+                offset += 2 + segment_length
+    except struct.error:
+        pass
+    return None, None
+
+
+def read_base64_image_info(b64_data):
+    """
+    (byte size, width, height) of a base64-encoded image without decoding all of it:
+    the dimensions come from the header, which sits in the first few KB (JPEG EXIF
+    blocks can push the SOF segment further, so fall back to the whole image).
+    """
+    padding = len(b64_data[-2:]) - len(b64_data[-2:].rstrip('='))
+    image_bytes = len(b64_data) * 3 // 4 - padding
+    try:
+        head = base64.b64decode(b64_data[:BASE64_HEADER_CHARS])
+        image_format = sniff_image_format(head[:16])
+        width, height = read_image_dimensions(head, image_format)
+        if width is None and image_format and len(b64_data) > BASE64_HEADER_CHARS:
+            width, height = read_image_dimensions(base64.b64decode(b64_data), image_format)
+    except (ValueError, TypeError):
+        return image_bytes, None, None
+    return image_bytes, width, height
+
+
+def download_image_bytes(image_url, max_bytes=None):
+    """Stream the image body, aborting as soon as it exceeds max_bytes."""
+    max_bytes = max_bytes or Config.IMAGE_MAX_BYTES
+    response = http_get(image_url, timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.IMAGE_DOWNLOAD_TIMEOUT), stream=True)
+    try:
+        if response.status_code != 200:
+            raise ImageLoadError(f"status {response.status_code}")
+
+        declared_length = response.headers.get('Content-Length')
+        if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+            raise ImageLoadError(f"declared size {declared_length} bytes exceeds limit {max_bytes}")
+
+        buffer = bytearray()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if not chunk:
+                continue
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ImageLoadError(f"body exceeds limit {max_bytes} bytes")
+        return bytes(buffer)
+    finally:
+        response.close()
+
+
+def resize_image_bytes(data, image_format, max_dimension):
+    """Decode and downscale an oversized image, re-encoding it in its original format."""
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    if image_format == 'JPEG':
+        # Let libjpeg downscale by a power of two while decoding instead of after
+        img.draft('RGB', (max_dimension, max_dimension))
+    img.thumbnail((max_dimension, max_dimension))
+
+    buffered = BytesIO()
+    if image_format == 'JPEG':
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(buffered, format='JPEG', quality=90)
+    else:
+        img.save(buffered, format='PNG')
+    return buffered.getvalue()
+
+
+def load_image_from_url(image_url):
+    """
+    Load and encode image from URL and return (b64string, format) or (None, None).
+    Within a request the result is cached per URL, so a decorator that already
+    loaded the image (e.g. to hash it) does not download it twice.
+    """
+    if not has_request_context():
+        return fetch_image_from_url(image_url)
+
+    loaded_images = g.setdefault('loaded_images', {})
+    if image_url in loaded_images:
+        return loaded_images[image_url]
+    loaded = fetch_image_from_url(image_url)
+    # A failed download is not cached, so a later caller retries and reports its own error
+    if loaded[0]:
+        loaded_images[image_url] = loaded
+    return loaded
+
+
+def fetch_image_from_url(image_url):
+    try:
+        data = download_image_bytes(image_url)
+
+        img_format = sniff_image_format(data[:16])
+        if not img_format:
+            logger.warning('image.rejected', reason='unsupported_format', header=repr(data[:8]))
+            return None, None
+
+        width, height = read_image_dimensions(data, img_format)
+        if not width or not height:
+            logger.warning('image.rejected', reason='unreadable_dimensions', format=img_format)
+            return None, None
+
+        if width * height > Config.IMAGE_MAX_PIXELS:
+            logger.warning('image.rejected', reason='too_many_pixels', width=width, height=height,
+                           max_pixels=Config.IMAGE_MAX_PIXELS)
+            return None, None
+
+        if max(width, height) > Config.IMAGE_MAX_DIMENSION:
+            original_size = len(data)
+            data = resize_image_bytes(data, img_format, Config.IMAGE_MAX_DIMENSION)
+            logger.info('image.resized', width=width, height=height, format=img_format,
+                        bytes_before=original_size, bytes_after=len(data))
+
+        b64_data = base64.b64encode(data).decode("utf-8")
+        logger.info('image.loaded', format=img_format, width=width, height=height, b64_chars=len(b64_data))
+        return b64_data, img_format
+    except ImageLoadError as e:
+        logger.warning('image.load_failed', url=image_url, error=str(e))
+        return None, None
+    except Exception as e:
+        logger.warning('image.load_failed', url=image_url, error_type=type(e).__name__, error=str(e))
+        return None, None
@@ -0,0 +1,119 @@
+# services/job_queue.py
+import ipaddress
+import json
+import socket
+import time
+from urllib.parse import urlparse
+from uuid import uuid4
+from config import Config
+from database.operations import create_analysis_job, update_analysis_job_callback
+from services.http_client import http_post
+from utils.structured_log import get_logger
+
+# Request fields consumed at enqueue time; the worker replays the rest of the body
+JOB_CONTROL_FIELDS = ('async', 'callback_url', 'request_id')
+FINISHED_JOB_STATUSES = ('succeeded', 'failed')
+logger = get_logger('jobs')
+
+
+def is_allowed_callback_url(callback_url):
+    """Only hosts listed in JOB_CALLBACK_ALLOWED_HOSTS; with an empty list callbacks are off."""
+    parsed = urlparse(str(callback_url))
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    return parsed.hostname.lower() in Config.JOB_CALLBACK_ALLOWED_HOSTS
+
+
+def is_public_address(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if getattr(ip, 'ipv4_mapped', None):
+        ip = ip.ipv4_mapped
+    return not (ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+def get_callback_target_error(callback_url):
+    """
+    Why the callback must not be sent, or None. Checked before every delivery, since
+    an allowed host name can still resolve to a loopback/internal address.
+    """
+    if not is_allowed_callback_url(callback_url):
+        return "callback host not allowed"
+    parsed = urlparse(str(callback_url))
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        return f"callback host did not resolve: {e}"
+    blocked = sorted(address for address in addresses if not is_public_address(address))
+    if blocked:
+        return f"callback host resolves to non-public address {', '.join(blocked)}"
+    return None
+
+
+def enqueue_analysis_job(telegram_user_id, endpoint_name, request_path, data, callback_url=None):
+    payload = {key: value for key, value in data.items() if key not in JOB_CONTROL_FIELDS}
+    job = create_analysis_job(
+        uuid4().hex, telegram_user_id, endpoint_name, request_path, payload,
+        callback_url=callback_url, max_attempts=Config.JOB_MAX_ATTEMPTS
+    )
+    logger.info('job.enqueued', endpoint=endpoint_name, job_id=job['job_id'], telegram_user_id=telegram_user_id)
+    return job
+
+
+def format_job_time(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def build_job_status(job):
+    """Polling and callback payload; `result` is the endpoint's own JSON once the job finished."""
+    status = {
+        "success": True,
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "endpoint": job['endpoint_name'],
+        "attempts": job['attempts'],
+        "max_attempts": job['max_attempts'],
+        "created_at": format_job_time(job.get('created_at')),
+        "started_at": format_job_time(job.get('started_at')),
+        "finished_at": format_job_time(job.get('finished_at'))
+    }
+    if job['status'] in FINISHED_JOB_STATUSES:
+        try:
+            status["result"] = json.loads(job['response_body']) if job.get('response_body') else None
+        except ValueError:
+            status["result"] = job['response_body']
+        if job.get('last_error'):
+            status["error"] = job['last_error']
+    return status
+
+
+def deliver_job_callback(job):
+    """POST the finished job to its callback_url, retrying with backoff; the outcome is stored on the job."""
+    payload = build_job_status(job)
+    last_error = None
+    for attempt in range(1, Config.JOB_CALLBACK_MAX_ATTEMPTS + 1):
+        target_error = get_callback_target_error(job['callback_url'])
+        if target_error:
+            logger.warning('job.callback_refused', job_id=job['job_id'], reason=target_error)
+            update_analysis_job_callback(job['job_id'], 'failed', attempt - 1, target_error)
+            return False
+        try:
+            # A redirect could point anywhere, internal hosts included; a 3xx counts as a failed attempt
+            response = http_post(
+                job['callback_url'], json=payload, allow_redirects=False,
+                timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.JOB_CALLBACK_TIMEOUT)
+            )
+            if 200 <= response.status_code < 300:
+                update_analysis_job_callback(job['job_id'], 'delivered', attempt)
+                logger.info('job.callback_delivered', job_id=job['job_id'], attempt=attempt)
+                return True
+            last_error = f"status {response.status_code}"
+        except Exception as e:
+            last_error = str(e)
+        logger.warning('job.callback_failed', job_id=job['job_id'], attempt=attempt, error=last_error)
+        if attempt < Config.JOB_CALLBACK_MAX_ATTEMPTS:
+            time.sleep(2 ** (attempt - 1))
+
+    update_analysis_job_callback(job['job_id'], 'failed', Config.JOB_CALLBACK_MAX_ATTEMPTS, last_error)
+    return False
@@ -0,0 +1,146 @@
+# services/job_worker.py
+import argparse
+import json
+import os
+import signal
+import socket
+import threading
+from config import Config
+from database.operations import (
+    claim_analysis_job,
+    complete_analysis_job,
+    get_analysis_job,
+    requeue_stale_analysis_jobs,
+    retry_analysis_job,
+)
+from services.job_queue import deliver_job_callback
+from services.openai_dispatcher import ASYNC_JOB_ENVIRON_KEY
+from utils.structured_log import get_logger
+
+# The endpoints turn OpenAI failures into 200 {"success": false, "error": ...}; these are worth another attempt
+RETRYABLE_ERROR_PREFIXES = (
+    'OpenAI service unavailable',
+    'Analysis failed',
+    'Technical analysis failed',
+    'User feedback analysis failed',
+)
+logger = get_logger('job_worker')
+
+
+def run_job_request(app, job):
+    """Replay the stored request through the endpoint's own view, as the web worker would have."""
+    from flask import request
+    from utils.decorators import response_to_result
+
+    payload = json.loads(job['request_payload'])
+    environ = {ASYNC_JOB_ENVIRON_KEY: job['job_id']}
+    with app.test_request_context(job['request_path'], method='POST', json=payload, environ_base=environ):
+        view = app.view_functions[request.endpoint]
+        return response_to_result(view())
+
+
+def parse_result_body(result):
+    try:
+        body = json.loads(result['response_body'])
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+def get_retry_reason(result):
+    if result['status_code'] >= 500:
+        return f"status {result['status_code']}"
+    error = parse_result_body(result).get('error')
+    if error and str(error).startswith(RETRYABLE_ERROR_PREFIXES):
+        return str(error)
+    return None
+
+
+def process_job(app, job):
+    job_id = job['job_id']
+    logger.info('job.started', endpoint=job['endpoint_name'], job_id=job_id,
+                attempt=job['attempts'], max_attempts=job['max_attempts'])
+    result = None
+    try:
+        result = run_job_request(app, job)
+        retry_reason = get_retry_reason(result)
+    except Exception as e:
+        retry_reason = str(e)
+
+    if retry_reason and job['attempts'] < job['max_attempts']:
+        delay = Config.JOB_RETRY_BASE_SECONDS * (2 ** (job['attempts'] - 1))
+        logger.warning('job.retry_scheduled', job_id=job_id, delay_seconds=delay, reason=retry_reason)
+        retry_analysis_job(job_id, retry_reason, delay)
+        return
+
+    if result is None:
+        status = 'failed'
+        complete_analysis_job(job_id, status, last_error=retry_reason)
+    else:
+        status = 'succeeded' if parse_result_body(result).get('success') else 'failed'
+        complete_analysis_job(job_id, status, result['status_code'], result['response_body'], retry_reason)
+    logger.info('job.finished', job_id=job_id, status=status)
+
+    if job.get('callback_url'):
+        deliver_job_callback(get_analysis_job(job_id))
+
+
+def worker_loop(app, worker_id, stop_event):
+    while not stop_event.is_set():
+        try:
+            job = claim_analysis_job(worker_id)
+        except Exception as e:
+            logger.exception('job.claim_failed', worker_id=worker_id, error=str(e))
+            job = None
+        if not job:
+            stop_event.wait(Config.JOB_POLL_SECONDS)
+            continue
+        try:
+            process_job(app, job)
+        except Exception as e:
+            logger.exception('job.crashed', job_id=job['job_id'], error=str(e))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run async analysis jobs from the analysis_jobs queue.")
+    parser.add_argument('--concurrency', type=int, default=Config.JOB_WORKER_CONCURRENCY,
+                        help="Jobs run in parallel by this process (OpenAI calls are I/O bound).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Importing the app runs init_database/init_openai, exactly like a web worker
+    from app import app
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = []
+    for index in range(max(1, args.concurrency)):
+        thread = threading.Thread(
+            target=worker_loop, args=(app, f"{worker_prefix}:{index}", stop_event),
+            name=f'job-worker-{index}', daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    logger.info('worker.started', threads=len(threads), worker=worker_prefix)
+
+    # Reap jobs left 'running' by a worker that died
+    while not stop_event.wait(max(1, Config.JOB_LOCK_TIMEOUT_SECONDS // 2)):
+        try:
+            requeued = requeue_stale_analysis_jobs(Config.JOB_LOCK_TIMEOUT_SECONDS)
+            if requeued:
+                logger.warning('worker.stale_jobs_requeued', count=requeued)
+        except Exception as e:
+            logger.exception('worker.stale_sweep_failed', error=str(e))
+
+    logger.info('worker.stopping', threads=len(threads))
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
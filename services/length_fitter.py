@@ -0,0 +1,256 @@
+# services/length_fitter.py
+import re
+from utils.keyword_scanner import KeywordScanner
+
+# Trading numbers: prices, pips, percentages, ratios (1:2). Timeframe codes like M15/H4 are not levels.
+NUMBER_PATTERN = re.compile(r'(?<![A-Za-z])[0-9٠-٩]+(?:[.,٫:][0-9٠-٩]+)*')
+LIST_MARKER_PATTERN = re.compile(r'^\s*(?:[-•*▪]|[0-9٠-٩]+[.)\-])\s+')
+SEPARATOR_PATTERN = re.compile(r'^\s*[=\-_*~─]{3,}\s*$')
+HEADING_PREFIX_PATTERN = re.compile(r'^\s*#{1,6}\s*')
+BOLD_LINE_PATTERN = re.compile(r'^\s*\*\*[^*]+\*\*\s*:?\s*$')
+EMOJI_PATTERN = re.compile('[\U0001F300-\U0001FAFF☀-➿⬀-⯿️]')
+CLAUSE_SPLIT_PATTERN = re.compile(r'(?<=[،,؛;.])\s+')
+SPACES_PATTERN = re.compile(r'[ \t]{2,}')
+
+CRITICAL_KEYWORDS = (
+    'دخول', 'وقف', 'هدف', 'أهداف', 'الهدف', 'جني', 'نسبة', 'مخاطرة', 'عائد', 'شراء', 'بيع',
+    'توصية', 'توصيات', 'entry', 'stop', 'target', 'take profit', 'r:r'
+)
+SUPPORTING_KEYWORDS = (
+    'دعم', 'مقاومة', 'سيولة', 'اتجاه', 'فيبوناتشي', 'أوامر', 'اختراق', 'كسر', 'order block', 'smc', 'ict'
+)
+FILLER_PHRASES = (
+    'من الجدير بالذكر أن', 'تجدر الإشارة إلى أن', 'من المهم أن نلاحظ أن', 'من المهم ملاحظة أن',
+    'كما نلاحظ أن', 'كما يلاحظ أن', 'بناءً على ما سبق،', 'بناءً على ما سبق', 'بالإضافة إلى ذلك،',
+    'بالإضافة إلى ذلك', 'في الوقت الحالي', 'بشكل عام', 'بشكل واضح', 'بشكل ملحوظ', 'إلى حد ما'
+)
+LINE_KEYWORD_SCANNER = KeywordScanner(critical=CRITICAL_KEYWORDS, supporting=SUPPORTING_KEYWORDS)
+# A filler phrase may carry an attached conjunction ("وفي الوقت الحالي"), which goes with it
+FILLER_PATTERN = re.compile(
+    r'(?:(?<=\s)|^)و?(?:' + '|'.join(re.escape(phrase) for phrase in FILLER_PHRASES) + r')\s*'
+)
+
+
+def extract_numbers(text):
+    """Distinct numeric values in the text, ignoring list enumerators at line start."""
+    numbers = set()
+    for line in (text or '').split('\n'):
+        numbers.update(NUMBER_PATTERN.findall(LIST_MARKER_PATTERN.sub('', line, count=1)))
+    return numbers
+
+
+def classify_line(raw_line):
+    stripped = raw_line.strip()
+    if not stripped:
+        return 'blank'
+    if SEPARATOR_PATTERN.match(stripped):
+        return 'separator'
+    if HEADING_PREFIX_PATTERN.match(stripped) or BOLD_LINE_PATTERN.match(stripped):
+        return 'heading'
+    if LIST_MARKER_PATTERN.match(stripped):
+        return 'bullet'
+    return 'text'
+
+
+def score_line(text, kind, keyword_groups, section_is_critical):
+    number_count = len(NUMBER_PATTERN.findall(LIST_MARKER_PATTERN.sub('', text, count=1)))
+    has_critical_keyword = 'critical' in keyword_groups
+    score = 0
+    if has_critical_keyword:
+        score += 10
+    if 'supporting' in keyword_groups:
+        score += 3
+    score += min(number_count, 3) * 2
+    if kind == 'heading':
+        score += 1
+    critical = has_critical_keyword or (section_is_critical and number_count > 0)
+    return score, critical, number_count
+
+
+def parse_analysis_lines(analysis_text):
+    """Split the analysis into scored lines, tracking which heading each line belongs to."""
+    lines = []
+    section_index = -1
+    section_is_critical = False
+    for raw_line in analysis_text.split('\n'):
+        kind = classify_line(raw_line)
+        if kind in ('blank', 'separator'):
+            lines.append({'kind': kind, 'text': raw_line, 'section': section_index,
+                          'score': 0, 'critical': False, 'numbers': 0})
+            continue
+        keyword_groups = LINE_KEYWORD_SCANNER.matched_groups(raw_line)
+        if kind == 'heading':
+            section_index += 1
+            section_is_critical = 'critical' in keyword_groups
+        score, critical, number_count = score_line(raw_line, kind, keyword_groups, section_is_critical)
+        lines.append({'kind': kind, 'text': raw_line.rstrip(), 'section': section_index,
+                      'score': score, 'critical': critical, 'numbers': number_count})
+    return lines
+
+
+def render_lines(lines):
+    return '\n'.join(line['text'] for line in lines).strip()
+
+
+def collapse_layout(lines, excess):
+    kept = []
+    for line in lines:
+        if line['kind'] == 'separator':
+            continue
+        if line['kind'] == 'blank' and (not kept or kept[-1]['kind'] == 'blank'):
+            continue
+        line['text'] = SPACES_PATTERN.sub(' ', line['text'])
+        kept.append(line)
+    return kept
+
+
+def drop_blank_lines(lines, excess):
+    return [line for line in lines if line['kind'] != 'blank']
+
+
+def strip_markup(lines, excess):
+    for line in lines:
+        text = line['text'].replace('**', '').replace('__', '')
+        text = HEADING_PREFIX_PATTERN.sub('', text)
+        if line['kind'] == 'bullet':
+            text = re.sub(r'^\s*[•*▪]\s+', '- ', text)
+        line['text'] = text.strip()
+    return lines
+
+
+def remove_filler(lines, excess):
+    for line in lines:
+        line['text'] = SPACES_PATTERN.sub(' ', FILLER_PATTERN.sub('', line['text'])).strip()
+    return lines
+
+
+def strip_emoji(lines, excess):
+    for line in lines:
+        line['text'] = SPACES_PATTERN.sub(' ', EMOJI_PATTERN.sub('', line['text'])).strip()
+    return lines
+
+
+def condense_clauses(lines, excess):
+    """Cut non-critical prose down to its clauses that carry numbers (or its first clause)."""
+    candidates = sorted(
+        (line for line in lines if not line['critical'] and line['kind'] in ('text', 'bullet')),
+        key=lambda line: (line['score'], -len(line['text']))
+    )
+    for line in candidates:
+        if excess <= 0:
+            break
+        marker_match = LIST_MARKER_PATTERN.match(line['text'])
+        marker = marker_match.group(0) if marker_match else ''
+        clauses = CLAUSE_SPLIT_PATTERN.split(line['text'][len(marker):])
+        if len(clauses) < 2:
+            continue
+        kept = [clause for clause in clauses if NUMBER_PATTERN.search(clause)] or clauses[:1]
+        condensed = marker + ' '.join(kept).rstrip('،,؛; ')
+        excess -= len(line['text']) - len(condensed)
+        line['text'] = condensed
+    return lines
+
+
+def drop_lines(lines, excess, allow_numbers):
+    candidates = sorted(
+        (index for index, line in enumerate(lines)
+         if line['kind'] in ('text', 'bullet') and not line['critical']
+         and (allow_numbers or line['numbers'] == 0)),
+        key=lambda index: (lines[index]['score'], -len(lines[index]['text']))
+    )
+    dropped = set()
+    for index in candidates:
+        if excess <= 0:
+            break
+        dropped.add(index)
+        excess -= len(lines[index]['text']) + 1
+    return [line for index, line in enumerate(lines) if index not in dropped]
+
+
+def drop_unnumbered_lines(lines, excess):
+    return drop_lines(lines, excess, allow_numbers=False)
+
+
+def drop_empty_headings(lines, excess):
+    kept = []
+    for index, line in enumerate(lines):
+        # The opening line is the title (it usually names the pair/timeframe), keep it
+        if line['kind'] == 'heading' and index > 0:
+            following = next((item for item in lines[index + 1:] if item['kind'] != 'blank'), None)
+            if following is None or following['kind'] == 'heading':
+                continue
+        kept.append(line)
+    return kept
+
+
+def drop_plain_headings(lines, excess):
+    candidates = sorted(
+        (index for index, line in enumerate(lines)
+         if index > 0 and line['kind'] == 'heading' and line['numbers'] == 0),
+        key=lambda index: (lines[index]['score'], -index)
+    )
+    dropped = set()
+    for index in candidates:
+        if excess <= 0:
+            break
+        dropped.add(index)
+        excess -= len(lines[index]['text']) + 1
+    return [line for index, line in enumerate(lines) if index not in dropped]
+
+
+def drop_numbered_lines(lines, excess):
+    return drop_lines(lines, excess, allow_numbers=True)
+
+
+# Lossless stages first; drop_numbered_lines is the only one allowed to lose a number
+FIT_STAGES = (
+    ('collapse_layout', collapse_layout),
+    ('strip_markup', strip_markup),
+    ('remove_filler', remove_filler),
+    ('drop_blank_lines', drop_blank_lines),
+    ('condense_clauses', condense_clauses),
+    ('strip_emoji', strip_emoji),
+    ('drop_unnumbered_lines', drop_unnumbered_lines),
+    ('drop_empty_headings', drop_empty_headings),
+    ('drop_plain_headings', drop_plain_headings),
+    ('drop_numbered_lines', drop_numbered_lines),
+)
+
+
+def cut_at_line_boundary(text, char_limit):
+    if len(text) <= char_limit:
+        return text
+    cut = text.rfind('\n', 0, char_limit)
+    if cut < char_limit * 0.7:
+        return text[:char_limit - 1].rstrip() + '…'
+    return text[:cut].rstrip()
+
+
+def fit_analysis(analysis_text, char_limit=1024):
+    """
+    Shrink an analysis to char_limit by applying FIT_STAGES in order until it
+    fits. Entries, stop loss, targets and R:R lines are never dropped.
+    Returns {'text', 'stage', 'dropped_numbers'}.
+    """
+    text = (analysis_text or '').strip()
+    if len(text) <= char_limit:
+        return {'text': text, 'stage': None, 'dropped_numbers': []}
+
+    lines = parse_analysis_lines(text)
+    stage_name = None
+    fitted = text
+    for stage_name, stage in FIT_STAGES:
+        lines = stage(lines, len(render_lines(lines)) - char_limit)
+        fitted = render_lines(lines)
+        if len(fitted) <= char_limit:
+            break
+    else:
+        stage_name = 'cut_at_line_boundary'
+        fitted = cut_at_line_boundary(fitted, char_limit)
+
+    dropped_numbers = sorted(extract_numbers(text) - extract_numbers(fitted))
+    return {'text': fitted, 'stage': stage_name, 'dropped_numbers': dropped_numbers}
+
+
+def fit_analysis_text(analysis_text, char_limit=1024):
+    return fit_analysis(analysis_text, char_limit)['text']
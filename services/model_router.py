@@ -0,0 +1,77 @@
+# services/model_router.py
+import json
+from config import Config
+from utils.structured_log import get_logger
+
+DEFAULT_MODEL = "gpt-4o"
+
+# action_type -> models tried in order. Classification tasks start on the cheap
+# tier and escalate only when the answer fails its check; anything not listed
+# runs on DEFAULT_MODEL. Override per action with OPENAI_MODEL_ROUTES (JSON).
+DEFAULT_MODEL_ROUTES = {
+    "detect_investing_frame": ["gpt-4o-mini", "gpt-4o"],
+    "detect_timeframe": ["gpt-4o-mini", "gpt-4o"],
+    "detect_currency": ["gpt-4o-mini", "gpt-4o"],
+}
+
+_model_routes = None
+logger = get_logger('model_router')
+
+
+def load_model_routes():
+    routes = dict(DEFAULT_MODEL_ROUTES)
+    raw_routes = Config.OPENAI_MODEL_ROUTES
+    if not raw_routes:
+        return routes
+    try:
+        overrides = json.loads(raw_routes)
+    except ValueError as e:
+        logger.warning('model_router.invalid_routes', error=str(e))
+        return routes
+
+    for action_type, models in (overrides or {}).items():
+        if isinstance(models, str):
+            models = [models]
+        if not isinstance(models, list) or not all(isinstance(model, str) and model for model in models):
+            logger.warning('model_router.invalid_route', action_type=action_type, expected='list of model names')
+            continue
+        routes[action_type] = models
+    return routes
+
+
+def get_model_route(action_type):
+    global _model_routes
+    if _model_routes is None:
+        _model_routes = load_model_routes()
+    return _model_routes.get(action_type) or [DEFAULT_MODEL]
+
+
+def get_primary_model(action_type):
+    return get_model_route(action_type)[0]
+
+
+def run_model_route(action_type, classify, check):
+    """
+    Run `classify(model)` on each tier of the action's route until `check(result)`
+    returns None (accepted). A non-None check result is the escalation reason.
+    Errors on a cheaper tier also escalate; the last tier's result or error is final.
+    """
+    models = get_model_route(action_type)
+    result = None
+    for index, model in enumerate(models):
+        is_last_tier = index == len(models) - 1
+        try:
+            result = classify(model)
+        except Exception as e:
+            if is_last_tier:
+                raise
+            logger.warning('model_router.escalated', action_type=action_type, from_model=model,
+                           reason='error', error=str(e))
+            continue
+
+        reason = check(result)
+        if reason is None:
+            return result
+        if not is_last_tier:
+            logger.info('model_router.escalated', action_type=action_type, from_model=model, reason=reason)
+    return result
@@ -0,0 +1,168 @@
+# services/openai_clients.py
+import threading
+import time
+from config import Config
+from services.openai_health import is_account_error
+from services.openai_resilience import get_error_status_code
+from utils.structured_log import get_logger
+
+# x-ratelimit-remaining-* older than this says nothing about the current minute
+HEADER_STALE_SECONDS = 60
+# Headroom multiplier for a key that was answered with 429 recently
+RATE_LIMITED_PENALTY = 0.1
+IN_FLIGHT_PENALTY = 0.01
+
+_pool = []
+_pool_lock = threading.Lock()
+logger = get_logger('openai_keys')
+
+
+class PooledClient:
+    """One API key (optionally bound to an organization) and what its responses told us about it."""
+
+    def __init__(self, label, client):
+        self.label = label
+        self.client = client
+        self.limit_requests = None
+        self.remaining_requests = None
+        self.limit_tokens = None
+        self.remaining_tokens = None
+        self.headers_at = 0.0
+        self.rate_limited_at = 0.0
+        self.quarantined_until = 0.0
+        self.quarantine_reason = ''
+        self.in_flight = 0
+        self.request_count = 0
+        self.error_count = 0
+
+    def is_quarantined(self, now):
+        return self.quarantined_until > now
+
+    def headroom(self, now):
+        """Share of the key's request/token limits still left (1.0 when unknown), minus penalties."""
+        ratios = []
+        if now - self.headers_at < HEADER_STALE_SECONDS:
+            if self.limit_requests and self.remaining_requests is not None:
+                ratios.append(self.remaining_requests / self.limit_requests)
+            if self.limit_tokens and self.remaining_tokens is not None:
+                ratios.append(self.remaining_tokens / self.limit_tokens)
+        score = min(ratios) if ratios else 1.0
+        if now - self.rate_limited_at < Config.OPENAI_KEY_RATE_LIMIT_PENALTY_SECONDS:
+            score *= RATE_LIMITED_PENALTY
+        return score - IN_FLIGHT_PENALTY * self.in_flight
+
+
+def parse_api_key_entries():
+    """
+    OPENAI_API_KEYS is a comma-separated list of `label=key`, `label=key|org-id`
+    or bare keys (labelled key1, key2, ...). Without it OPENAI_API_KEY is a pool of one.
+    Returns [(label, api_key, organization)].
+    """
+    raw_entries = [entry.strip() for entry in Config.OPENAI_API_KEYS.split(',') if entry.strip()]
+    if not raw_entries:
+        return [('primary', Config.OPENAI_API_KEY, None)] if Config.OPENAI_API_KEY else []
+
+    entries = []
+    for index, entry in enumerate(raw_entries, 1):
+        label, separator, credentials = entry.partition('=')
+        if not separator:
+            label, credentials = f"key{index}", entry
+        api_key, _, organization = credentials.partition('|')
+        entries.append((label.strip(), api_key.strip(), organization.strip() or None))
+    return entries
+
+
+def init_client_pool(build_client):
+    """build_client(api_key, organization) -> SDK client. Returns the pool size."""
+    pool = [PooledClient(label, build_client(api_key, organization))
+            for label, api_key, organization in parse_api_key_entries()]
+    with _pool_lock:
+        _pool[:] = pool
+    return len(pool)
+
+
+def get_primary_client():
+    return _pool[0].client if _pool else None
+
+
+def select_pooled_client(exclude=()):
+    """
+    The key with the most headroom. When every key is quarantined, the one whose
+    quarantine ends first is used rather than failing outright.
+    """
+    now = time.time()
+    with _pool_lock:
+        candidates = [pooled for pooled in _pool if pooled.label not in exclude]
+        if not candidates:
+            return None
+        available = [pooled for pooled in candidates if not pooled.is_quarantined(now)]
+        if not available:
+            return min(candidates, key=lambda pooled: pooled.quarantined_until)
+        return max(available, key=lambda pooled: pooled.headroom(now))
+
+
+def has_available_client(exclude=()):
+    now = time.time()
+    with _pool_lock:
+        return any(not pooled.is_quarantined(now) for pooled in _pool if pooled.label not in exclude)
+
+
+def mark_call_started(pooled):
+    with _pool_lock:
+        pooled.in_flight += 1
+        pooled.request_count += 1
+
+
+def mark_call_finished(pooled):
+    with _pool_lock:
+        pooled.in_flight = max(0, pooled.in_flight - 1)
+
+
+def parse_header_int(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+def record_client_headers(pooled, headers):
+    if headers is None:
+        return
+    with _pool_lock:
+        pooled.limit_requests = parse_header_int(headers, 'x-ratelimit-limit-requests') or pooled.limit_requests
+        pooled.limit_tokens = parse_header_int(headers, 'x-ratelimit-limit-tokens') or pooled.limit_tokens
+        pooled.remaining_requests = parse_header_int(headers, 'x-ratelimit-remaining-requests')
+        pooled.remaining_tokens = parse_header_int(headers, 'x-ratelimit-remaining-tokens')
+        pooled.headers_at = time.time()
+
+
+def record_client_error(pooled, exc):
+    """Quota/auth errors quarantine the key; a 429 only lowers its headroom for a while."""
+    now = time.time()
+    with _pool_lock:
+        pooled.error_count += 1
+        if is_account_error(exc):
+            pooled.quarantined_until = now + Config.OPENAI_KEY_QUARANTINE_SECONDS
+            pooled.quarantine_reason = str(exc)[:200]
+            logger.error('openai_keys.quarantined', key=pooled.label,
+                         seconds=Config.OPENAI_KEY_QUARANTINE_SECONDS, reason=pooled.quarantine_reason)
+        elif get_error_status_code(exc) == 429:
+            pooled.rate_limited_at = now
+
+
+def get_client_pool_snapshot():
+    """Per-key state for /status; never includes the keys themselves."""
+    now = time.time()
+    with _pool_lock:
+        return [{
+            'label': pooled.label,
+            'quarantined': pooled.is_quarantined(now),
+            'quarantine_seconds_left': max(0, round(pooled.quarantined_until - now)),
+            'quarantine_reason': pooled.quarantine_reason if pooled.is_quarantined(now) else '',
+            'remaining_requests': pooled.remaining_requests,
+            'remaining_tokens': pooled.remaining_tokens,
+            'headroom': round(pooled.headroom(now), 3),
+            'in_flight': pooled.in_flight,
+            'requests': pooled.request_count,
+            'errors': pooled.error_count
+        } for pooled in _pool]
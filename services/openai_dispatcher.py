@@ -0,0 +1,311 @@
+# services/openai_dispatcher.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from uuid import uuid4
+from flask import has_request_context, request
+from config import Config
+from utils.structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows dev machines; the queue is then per process
+    fcntl = None
+
+# Served strictly in this order; deficit round-robin across users inside each class
+PRIORITY_CLASSES = ('interactive', 'standard', 'background')
+DEFAULT_ENDPOINT_PRIORITIES = {
+    'analyze': 'interactive',
+    'analyze_single_stream': 'interactive',
+    'analyze_technical_stream': 'interactive',
+    'analyze_single': 'standard',
+    'analyze_technical': 'standard',
+    'analyze_user_feedback': 'standard',
+}
+ASYNC_JOB_ENVIRON_KEY = 'xflexai.job_id'
+WAIT_SAMPLE_SIZE = 200
+# Waiting tickets re-check the shared queue this often
+POLL_SECONDS = 0.05
+# Tickets of a process that died without releasing them are dropped after this long
+STALE_TICKET_SECONDS = 600
+logger = get_logger('dispatch')
+
+_local_state = {}
+_local_lock = threading.Lock()
+# Per-process wait samples and counters, for /status
+_class_stats = {name: {'waits': deque(maxlen=WAIT_SAMPLE_SIZE), 'granted': 0, 'overflow': 0} for name in PRIORITY_CLASSES}
+_stats_lock = threading.Lock()
+
+
+def empty_dispatch_state():
+    return {
+        'in_flight': {},
+        'waiting': {},
+        'rotation': {name: [] for name in PRIORITY_CLASSES},
+        'deficits': {name: {} for name in PRIORITY_CLASSES},
+    }
+
+
+def with_dispatch_state(update):
+    """
+    Run update(state) under an exclusive flock on the shared dispatch file, so every
+    gunicorn worker and job worker on the host queues against the same slots.
+    """
+    if fcntl is None:
+        with _local_lock:
+            if not _local_state:
+                _local_state.update(empty_dispatch_state())
+            return update(_local_state)
+
+    with open(Config.OPENAI_DISPATCH_FILE, 'a+') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            handle.seek(0)
+            raw = handle.read()
+            try:
+                state = json.loads(raw) if raw else empty_dispatch_state()
+            except ValueError:
+                state = empty_dispatch_state()
+            result = update(state)
+            handle.seek(0)
+            handle.truncate()
+            json.dump(state, handle)
+            handle.flush()
+            return result
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def drop_stale_tickets(state, now):
+    for section in ('in_flight', 'waiting'):
+        for ticket_id, ticket in list(state[section].items()):
+            if now - ticket['since'] > STALE_TICKET_SECONDS or not is_process_alive(ticket['pid']):
+                del state[section][ticket_id]
+
+
+def pop_next(state, priority_class, user_in_flight):
+    """
+    Deficit round-robin: the user at the head is served while their deficit covers
+    the cost of their oldest ticket, otherwise earns a quantum and moves to the back.
+    Users at their in-flight cap are skipped; None when nobody can be served.
+    """
+    queues = {}
+    for ticket_id, ticket in state['waiting'].items():
+        if ticket['class'] == priority_class:
+            queues.setdefault(ticket['user'], []).append((ticket['since'], ticket_id))
+    rotation = [user for user in state['rotation'][priority_class] if user in queues]
+    rotation += sorted(user for user in queues if user not in rotation)
+    deficits = state['deficits'][priority_class]
+    # An idle user does not bank credit
+    for user in list(deficits):
+        if user not in queues:
+            del deficits[user]
+    state['rotation'][priority_class] = rotation
+
+    capped_in_a_row = 0
+    while rotation and capped_in_a_row < len(rotation):
+        user = rotation[0]
+        if user_in_flight.get(user, 0) >= max(1, Config.OPENAI_DISPATCH_PER_USER_LIMIT):
+            capped_in_a_row += 1
+            rotation.append(rotation.pop(0))
+            continue
+        capped_in_a_row = 0
+
+        _, ticket_id = min(queues[user])
+        cost = state['waiting'][ticket_id]['cost']
+        if deficits.get(user, 0) >= cost:
+            deficits[user] = deficits.get(user, 0) - cost
+            queues[user].remove(min(queues[user]))
+            if not queues[user]:
+                rotation.remove(user)
+                deficits.pop(user, None)
+            return ticket_id
+
+        deficits[user] = deficits.get(user, 0) + max(1, Config.OPENAI_DISPATCH_QUANTUM_TOKENS)
+        rotation.append(rotation.pop(0))
+    return None
+
+
+def grant_waiting(state, now):
+    """Move waiting tickets into in_flight while there are free slots; their owners notice on the next poll."""
+    user_in_flight = {}
+    for ticket in state['in_flight'].values():
+        user_in_flight[ticket['user']] = user_in_flight.get(ticket['user'], 0) + 1
+    while len(state['in_flight']) < max(1, Config.OPENAI_DISPATCH_MAX_CONCURRENCY):
+        ticket_id = None
+        for name in PRIORITY_CLASSES:
+            ticket_id = pop_next(state, name, user_in_flight)
+            if ticket_id:
+                break
+        if ticket_id is None:
+            return
+        ticket = state['waiting'].pop(ticket_id)
+        ticket['waited'] = now - ticket['since']
+        ticket['since'] = now
+        state['in_flight'][ticket_id] = ticket
+        user_in_flight[ticket['user']] = user_in_flight.get(ticket['user'], 0) + 1
+
+
+def acquire_dispatch_slot(user_key, priority_class, cost, max_wait):
+    """Queue a ticket and poll until it is granted (or max_wait passes). Returns (ticket_id, waited, overflow)."""
+    ticket_id = uuid4().hex
+    started_at = time.monotonic()
+
+    def enqueue(state):
+        now = time.time()
+        drop_stale_tickets(state, now)
+        state['waiting'][ticket_id] = {
+            'user': user_key, 'class': priority_class, 'cost': cost, 'pid': os.getpid(), 'since': now
+        }
+        grant_waiting(state, now)
+        granted = state['in_flight'].get(ticket_id)
+        return (granted['waited'], False) if granted else None
+
+    def poll(state):
+        granted = state['in_flight'].get(ticket_id)
+        if granted:
+            return granted['waited'], False
+        if time.monotonic() - started_at < max_wait:
+            return None
+        # Waited long enough; run over the limits rather than fail the request
+        ticket = state['waiting'].pop(ticket_id, None) or {
+            'user': user_key, 'class': priority_class, 'cost': cost, 'pid': os.getpid()
+        }
+        ticket['since'] = time.time()
+        state['in_flight'][ticket_id] = ticket
+        return time.monotonic() - started_at, True
+
+    outcome = with_dispatch_state(enqueue)
+    try:
+        while outcome is None:
+            time.sleep(POLL_SECONDS)
+            outcome = with_dispatch_state(poll)
+    except BaseException:
+        # Do not leave a ticket behind that would later take a slot nobody releases
+        release_dispatch_slot(ticket_id)
+        raise
+    waited, overflow = outcome
+    with _stats_lock:
+        stats = _class_stats[priority_class]
+        stats['waits'].append(waited)
+        stats['overflow' if overflow else 'granted'] += 1
+    return ticket_id, waited, overflow
+
+
+def release_dispatch_slot(ticket_id):
+    def update(state):
+        state['in_flight'].pop(ticket_id, None)
+        state['waiting'].pop(ticket_id, None)
+        grant_waiting(state, time.time())
+
+    with_dispatch_state(update)
+
+
+def load_endpoint_priorities():
+    priorities = dict(DEFAULT_ENDPOINT_PRIORITIES)
+    try:
+        overrides = json.loads(Config.OPENAI_ENDPOINT_PRIORITIES) if Config.OPENAI_ENDPOINT_PRIORITIES else {}
+    except ValueError as e:
+        logger.warning('dispatch.invalid_priorities', error=str(e))
+        overrides = {}
+    for endpoint_name, priority_class in overrides.items():
+        if priority_class in PRIORITY_CLASSES:
+            priorities[endpoint_name] = priority_class
+    return priorities
+
+
+def get_priority_class(endpoint_name):
+    if has_request_context() and request.environ.get(ASYNC_JOB_ENVIRON_KEY):
+        return 'background'
+    return load_endpoint_priorities().get(endpoint_name, 'standard')
+
+
+@contextmanager
+def openai_dispatch_slot(usage_context, cost):
+    """
+    Hold one OpenAI slot, shared by all workers on the host, for the duration of the
+    block. usage_context is g.openai_usage_context (telegram_user_id, endpoint_name);
+    cost is the call's estimated tokens, so DRR shares tokens rather than call counts.
+    """
+    if not Config.OPENAI_DISPATCH_ENABLED:
+        yield
+        return
+
+    telegram_user_id = usage_context.get('telegram_user_id')
+    user_key = f"user:{telegram_user_id}" if telegram_user_id else 'anonymous'
+    priority_class = get_priority_class(usage_context.get('endpoint_name'))
+
+    try:
+        ticket_id, waited, overflow = acquire_dispatch_slot(
+            user_key, priority_class, max(1, int(cost)), Config.OPENAI_DISPATCH_MAX_WAIT_SECONDS
+        )
+    except OSError as e:
+        logger.warning('dispatch.unavailable', error=str(e))
+        yield
+        return
+    if overflow:
+        logger.warning('dispatch.overflow', user=user_key, priority_class=priority_class, waited_s=waited)
+    elif waited >= 0.5:
+        logger.info('dispatch.waited', user=user_key, priority_class=priority_class, waited_s=waited)
+    try:
+        yield
+    finally:
+        try:
+            release_dispatch_slot(ticket_id)
+        except OSError as e:
+            logger.warning('dispatch.release_failed', error=str(e))
+
+
+def class_stats_snapshot(priority_class, waiting):
+    with _stats_lock:
+        stats = _class_stats[priority_class]
+        waits = sorted(stats['waits'])
+        granted, overflow = stats['granted'], stats['overflow']
+    return {
+        'depth': len(waiting),
+        'waiting_users': len({ticket['user'] for ticket in waiting}),
+        'granted': granted,
+        'overflow': overflow,
+        'avg_wait_ms': int(sum(waits) / len(waits) * 1000) if waits else 0,
+        'p95_wait_ms': int(waits[int(0.95 * (len(waits) - 1))] * 1000) if waits else 0,
+        'max_wait_ms': int(waits[-1] * 1000) if waits else 0
+    }
+
+
+def get_dispatcher_snapshot():
+    """Host-wide slots and queue depth; grant counts and waits are this worker's."""
+    if not Config.OPENAI_DISPATCH_ENABLED:
+        return {'enabled': False}
+
+    def read(state):
+        drop_stale_tickets(state, time.time())
+        return list(state['in_flight'].values()), list(state['waiting'].values())
+
+    try:
+        in_flight, waiting = with_dispatch_state(read)
+    except OSError as e:
+        return {'enabled': True, 'error': str(e)}
+    return {
+        'enabled': True,
+        'in_flight': len(in_flight),
+        'max_concurrency': Config.OPENAI_DISPATCH_MAX_CONCURRENCY,
+        'per_user_limit': Config.OPENAI_DISPATCH_PER_USER_LIMIT,
+        'busy_users': len({ticket['user'] for ticket in in_flight}),
+        'classes': {
+            name: class_stats_snapshot(name, [ticket for ticket in waiting if ticket['class'] == name])
+            for name in PRIORITY_CLASSES
+        }
+    }
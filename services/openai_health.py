@@ -0,0 +1,147 @@
+# services/openai_health.py
+import json
+import os
+import tempfile
+import threading
+import time
+from config import Config
+from utils.structured_log import get_logger
+
+# Errors that mean the account cannot serve any request; transient ones are the circuit breaker's job
+ACCOUNT_ERROR_CODES = {'insufficient_quota', 'invalid_api_key', 'account_deactivated'}
+ACCOUNT_ERROR_STATUS_CODES = {401, 403}
+
+_status_cache = {'mtime': None, 'status': None}
+_cache_lock = threading.Lock()
+_probe_lock = threading.Lock()
+_probe = {'fn': None}
+logger = get_logger('openai_health')
+
+
+def register_openai_health_probe(probe_fn):
+    """probe_fn() -> (available, error_message); runs off the request path."""
+    _probe['fn'] = probe_fn
+
+
+def is_api_key_configured():
+    if Config.OPENAI_API_KEYS.strip():
+        return True
+    return bool(Config.OPENAI_API_KEY) and Config.OPENAI_API_KEY != "your-api-key-here"
+
+
+def default_openai_status():
+    # Before the first probe finishes, trust a configured key; real call outcomes correct it quickly
+    if is_api_key_configured():
+        return {'available': True, 'error': '', 'checked_at': 0.0, 'source': 'default'}
+    return {'available': False, 'error': "OpenAI API key not configured", 'checked_at': 0.0, 'source': 'default'}
+
+
+def read_shared_status():
+    """The status file all workers share, re-read only when its mtime changes."""
+    try:
+        mtime = os.stat(Config.OPENAI_HEALTH_FILE).st_mtime_ns
+    except OSError:
+        return None
+    with _cache_lock:
+        if _status_cache['mtime'] == mtime:
+            return _status_cache['status']
+    try:
+        with open(Config.OPENAI_HEALTH_FILE) as handle:
+            status = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    with _cache_lock:
+        _status_cache['mtime'] = mtime
+        _status_cache['status'] = status
+    return status
+
+
+def write_shared_status(status):
+    """Atomic replace, so a worker never reads a half-written file."""
+    directory = os.path.dirname(Config.OPENAI_HEALTH_FILE) or '.'
+    try:
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.openai_health_')
+        with os.fdopen(descriptor, 'w') as handle:
+            json.dump(status, handle)
+        os.replace(temp_path, Config.OPENAI_HEALTH_FILE)
+    except OSError as e:
+        logger.warning('openai_health.write_failed', path=Config.OPENAI_HEALTH_FILE, error=str(e))
+        return
+    with _cache_lock:
+        _status_cache['mtime'] = None
+        _status_cache['status'] = status
+
+
+def set_openai_status(available, error='', source='probe'):
+    status = {'available': bool(available), 'error': error or '', 'checked_at': time.time(), 'source': source}
+    previous = read_shared_status() or default_openai_status()
+    if previous['available'] != status['available']:
+        log = logger.info if available else logger.error
+        log('openai_health.changed', available=bool(available), error=error or None, source=source)
+    write_shared_status(status)
+    return status
+
+
+def status_max_age(status):
+    # An outage is re-checked sooner than a healthy status
+    if status['available']:
+        return Config.OPENAI_HEALTH_REFRESH_SECONDS
+    return Config.OPENAI_HEALTH_UNAVAILABLE_REFRESH_SECONDS
+
+
+def run_openai_health_probe():
+    try:
+        # Another worker may have refreshed the shared file while this one waited
+        current = read_shared_status()
+        if current and time.time() - current['checked_at'] < status_max_age(current):
+            return
+        available, error = _probe['fn']()
+        set_openai_status(available, error, source='probe')
+    except Exception as e:
+        logger.warning('openai_health.probe_failed', error=str(e))
+    finally:
+        _probe_lock.release()
+
+
+def refresh_openai_status_async():
+    """Start a background probe unless one is already running in this worker."""
+    if not _probe['fn'] or not _probe_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=run_openai_health_probe, name='openai-health-probe', daemon=True).start()
+    return True
+
+
+def get_openai_status():
+    """
+    Stale-while-revalidate: always answers from the shared status immediately and,
+    once it is older than its max age, refreshes it in the background.
+    Returns {'available', 'error', 'checked_at', 'source'}.
+    """
+    status = read_shared_status() or default_openai_status()
+    if time.time() - status['checked_at'] >= status_max_age(status):
+        refresh_openai_status_async()
+    return status
+
+
+def is_openai_available():
+    return get_openai_status()['available']
+
+
+def is_account_error(exc):
+    code = getattr(exc, 'code', None)
+    body = getattr(exc, 'body', None)
+    if not code and isinstance(body, dict):
+        nested_error = body.get('error')
+        code = body.get('code') or (nested_error.get('code') if isinstance(nested_error, dict) else None)
+    return code in ACCOUNT_ERROR_CODES or getattr(exc, 'status_code', None) in ACCOUNT_ERROR_STATUS_CODES
+
+
+def record_openai_call_outcome(success, exc=None):
+    """Real completions flip the shared status without waiting for the next probe."""
+    status = read_shared_status() or default_openai_status()
+    if success:
+        if not status['available']:
+            set_openai_status(True, source='call')
+    elif exc is not None and is_account_error(exc):
+        if status['available'] or status['error'] != str(exc):
+            set_openai_status(False, str(exc), source='call')
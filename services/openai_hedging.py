@@ -0,0 +1,104 @@
+# services/openai_hedging.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import Config
+from utils.structured_log import get_logger
+
+LATENCY_WINDOW_SIZE = 200
+
+_latency_samples = {}
+_latency_lock = threading.Lock()
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+logger = get_logger('hedge')
+
+
+def record_completion_latency(action_type, model, elapsed_seconds):
+    key = (action_type, model)
+    with _latency_lock:
+        samples = _latency_samples.get(key)
+        if samples is None:
+            samples = deque(maxlen=LATENCY_WINDOW_SIZE)
+            _latency_samples[key] = samples
+        samples.append(elapsed_seconds)
+
+
+def get_latency_percentile(action_type, model, percentile):
+    with _latency_lock:
+        samples = sorted(_latency_samples.get((action_type, model)) or [])
+    if not samples:
+        return None
+    index = min(len(samples) - 1, int(round((percentile / 100.0) * (len(samples) - 1))))
+    return samples[index]
+
+
+def get_hedge_delay(action_type, model):
+    """Observed p90 latency once enough samples exist, otherwise the configured default."""
+    with _latency_lock:
+        sample_count = len(_latency_samples.get((action_type, model)) or [])
+    if sample_count < Config.OPENAI_HEDGE_MIN_SAMPLES:
+        return Config.OPENAI_HEDGE_DEFAULT_DELAY_SECONDS
+    p90 = get_latency_percentile(action_type, model, 90)
+    return max(Config.OPENAI_HEDGE_MIN_DELAY_SECONDS, p90)
+
+
+def get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=Config.OPENAI_HEDGE_MAX_THREADS,
+                    thread_name_prefix='openai-hedge'
+                )
+    return _hedge_executor
+
+
+def timed_call(send_request):
+    started_at = time.monotonic()
+    response = send_request()
+    return response, time.monotonic() - started_at
+
+
+def run_hedged(send_request, hedge_delay, on_loser_done):
+    """
+    Start `send_request('primary')` and, if it has not finished after `hedge_delay`
+    seconds, start an identical second request as `send_request('hedge')`. The first successful result
+    wins. The losing future is cancelled if it has not started yet; a request
+    already on the wire cannot be aborted through the sync client, so its
+    result is discarded and handed to `on_loser_done(role, future)` for
+    accounting once it settles.
+
+    Returns (response, elapsed_seconds, role) where role is 'primary' or 'hedge'.
+    """
+    executor = get_hedge_executor()
+    primary = executor.submit(timed_call, lambda: send_request('primary'))
+    done, _ = wait([primary], timeout=hedge_delay)
+    if done:
+        response, elapsed = primary.result()
+        return response, elapsed, 'primary'
+
+    logger.info('hedge.sent', delay_s=hedge_delay)
+    hedge = executor.submit(timed_call, lambda: send_request('hedge'))
+    roles = {primary: 'primary', hedge: 'hedge'}
+    pending = {primary, hedge}
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((future for future in done if future.exception() is None), None)
+        if winner is None:
+            continue
+
+        response, elapsed = winner.result()
+        loser = hedge if winner is primary else primary
+        if loser.done():
+            on_loser_done(roles[loser], loser)
+        elif not loser.cancel():
+            loser.add_done_callback(lambda settled: on_loser_done(roles[loser], settled))
+        return response, elapsed, roles[winner]
+
+    # Both failed: the caller accounts for the primary error, the hedge is reported as a loser
+    on_loser_done('hedge', hedge)
+    raise primary.exception()
@@ -0,0 +1,181 @@
+# services/openai_resilience.py
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from flask import g, has_request_context
+from config import Config
+from utils.structured_log import get_logger
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+NON_RETRYABLE_ERROR_CODES = {'insufficient_quota', 'invalid_api_key', 'context_length_exceeded'}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+logger = get_logger('circuit')
+
+
+class OpenAICircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker: CLOSED until `failure_threshold` consecutive transient
+    failures, then OPEN (fail fast) for `cooldown_seconds`, then HALF_OPEN where
+    a single probe call decides whether to close again or re-open.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, cooldown_seconds):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info('circuit.closed', model=self.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error('circuit.opened', model=self.name, consecutive_failures=self.consecutive_failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN
+
+    def retry_in_seconds(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'model': self.name,
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures
+            }
+
+
+def get_circuit_breaker(model):
+    breaker = _breakers.get(model)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(model)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    model,
+                    failure_threshold=Config.OPENAI_BREAKER_FAILURE_THRESHOLD,
+                    cooldown_seconds=Config.OPENAI_BREAKER_COOLDOWN_SECONDS
+                )
+                _breakers[model] = breaker
+    return breaker
+
+
+def get_circuit_breaker_states():
+    return [breaker.snapshot() for breaker in list(_breakers.values())]
+
+
+def get_error_status_code(exc):
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None:
+        response = getattr(exc, 'response', None)
+        status_code = getattr(response, 'status_code', None)
+    return status_code
+
+
+def is_retryable_openai_error(exc):
+    """Transient failures only: timeouts, connection errors, 408/409/429/5xx (but not quota exhaustion)."""
+    error_code = getattr(exc, 'code', None)
+    if error_code in NON_RETRYABLE_ERROR_CODES or 'insufficient_quota' in str(exc):
+        return False
+
+    error_name = type(exc).__name__
+    if error_name in ('APITimeoutError', 'APIConnectionError'):
+        return True
+
+    status_code = get_error_status_code(exc)
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def get_retry_after_seconds(exc):
+    """Parse retry-after-ms / retry-after (seconds or HTTP date) from the error response."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def compute_backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; an explicit Retry-After always wins when it is longer."""
+    ceiling = min(Config.OPENAI_RETRY_MAX_DELAY_SECONDS, Config.OPENAI_RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def get_request_deadline():
+    """Monotonic deadline for the current HTTP request, set when the usage context is created."""
+    if not has_request_context():
+        return None
+    return getattr(g, 'openai_request_deadline', None)
+
+
+def remaining_request_budget():
+    deadline = get_request_deadline()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
@@ -0,0 +1,257 @@
+# services/openai_scheduler.py
+import json
+import math
+import time
+from config import Config
+from services.image_service import read_base64_image_info
+from services.openai_resilience import remaining_request_budget
+from utils.structured_log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows dev machines; buckets are then per process
+    fcntl = None
+
+# Vision token accounting for detail=high: fit in 2048x2048, shortest side to 768, 170 tokens per 512px tile
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+IMAGE_DEFAULT_TOKENS = IMAGE_BASE_TOKENS + 4 * IMAGE_TILE_TOKENS
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Upper bound on each sleep, so a bucket refilled by header feedback is noticed quickly
+MAX_SLEEP_SECONDS = 1.0
+
+_local_state = {'models': {}}
+logger = get_logger('scheduler')
+
+
+def load_rate_limits():
+    """Per-model {'rpm', 'tpm'} from Config.OPENAI_RATE_LIMITS, falling back to the defaults."""
+    try:
+        configured = json.loads(Config.OPENAI_RATE_LIMITS) if Config.OPENAI_RATE_LIMITS else {}
+    except ValueError as e:
+        logger.warning('scheduler.invalid_rate_limits', error=str(e))
+        configured = {}
+    return configured if isinstance(configured, dict) else {}
+
+
+def get_configured_limits(model):
+    limits = load_rate_limits().get(model) or {}
+    return (
+        float(limits.get('rpm') or Config.OPENAI_DEFAULT_RPM),
+        float(limits.get('tpm') or Config.OPENAI_DEFAULT_TPM)
+    )
+
+
+def estimate_image_tokens(image_url, detail):
+    if detail == 'low':
+        return IMAGE_BASE_TOKENS
+    if not image_url.startswith('data:') or ',' not in image_url:
+        return IMAGE_DEFAULT_TOKENS
+    _, width, height = read_base64_image_info(image_url.split(',', 1)[1])
+    if not width or not height:
+        return IMAGE_DEFAULT_TOKENS
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """
+    What OpenAI counts against TPM: prompt text (chars/4), image tiles and the
+    full max_tokens, which is reserved up front whatever the completion length.
+    """
+    tokens = 0
+    for message in messages or []:
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += len(content) // CHARS_PER_TOKEN
+            continue
+        for part in content or []:
+            if part.get('type') == 'text':
+                tokens += len(part.get('text') or '') // CHARS_PER_TOKEN
+            elif part.get('type') == 'image_url':
+                image = part.get('image_url') or {}
+                tokens += estimate_image_tokens(image.get('url') or '', image.get('detail'))
+    return tokens + int(max_tokens or 0)
+
+
+def refill_bucket(bucket, now):
+    elapsed = max(0.0, now - bucket['updated_at'])
+    bucket['requests'] = min(bucket['rpm_limit'], bucket['requests'] + elapsed * bucket['rpm_limit'] / 60)
+    bucket['tokens'] = min(bucket['tpm_limit'], bucket['tokens'] + elapsed * bucket['tpm_limit'] / 60)
+    bucket['updated_at'] = now
+
+
+def get_bucket_name(model, key_label=None):
+    # Limits are per API key, so each pooled key meters separately
+    return f"{key_label}/{model}" if key_label else model
+
+
+def get_bucket(state, bucket_name, model, now):
+    bucket = state['models'].get(bucket_name)
+    if bucket is None:
+        rpm_limit, tpm_limit = get_configured_limits(model)
+        bucket = state['models'][bucket_name] = {
+            'rpm_limit': rpm_limit,
+            'tpm_limit': tpm_limit,
+            'requests': rpm_limit,
+            'tokens': tpm_limit,
+            'updated_at': now,
+            'model': model,
+            'limit_source': 'config'
+        }
+    refill_bucket(bucket, now)
+    return bucket
+
+
+def with_shared_state(update):
+    """
+    Run update(state) under an exclusive flock on the shared state file, so every
+    gunicorn worker on the host meters against the same buckets.
+    """
+    if fcntl is None:
+        return update(_local_state)
+
+    with open(Config.OPENAI_SCHEDULER_FILE, 'a+') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            handle.seek(0)
+            raw = handle.read()
+            try:
+                state = json.loads(raw) if raw else {'models': {}}
+            except ValueError:
+                state = {'models': {}}
+            result = update(state)
+            handle.seek(0)
+            handle.truncate()
+            json.dump(state, handle)
+            handle.flush()
+            return result
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def try_take_capacity(model, tokens, key_label=None):
+    """Take one request and `tokens` from the model's buckets; returns 0 or the seconds to wait."""
+    def update(state):
+        bucket = get_bucket(state, get_bucket_name(model, key_label), model, time.time())
+        # A single call larger than the whole bucket only waits for a full bucket
+        cost = min(tokens, bucket['tpm_limit'])
+        if bucket['requests'] >= 1 and bucket['tokens'] >= cost:
+            bucket['requests'] -= 1
+            bucket['tokens'] -= cost
+            return 0.0
+        request_wait = max(0.0, 1 - bucket['requests']) * 60 / bucket['rpm_limit']
+        token_wait = max(0.0, cost - bucket['tokens']) * 60 / bucket['tpm_limit']
+        return max(request_wait, token_wait, 0.01)
+
+    return with_shared_state(update)
+
+
+def acquire_openai_capacity(model, tokens, key_label=None):
+    """
+    Block until the model's RPM/TPM buckets admit the call, for at most
+    OPENAI_SCHEDULER_MAX_WAIT_SECONDS (less if the request deadline is closer).
+    Past that the call goes out anyway and the retry loop handles any 429.
+    Returns the seconds spent waiting.
+    """
+    if not Config.OPENAI_SCHEDULER_ENABLED:
+        return 0.0
+
+    bucket_name = get_bucket_name(model, key_label)
+    started_at = time.monotonic()
+    max_wait = Config.OPENAI_SCHEDULER_MAX_WAIT_SECONDS
+    remaining_budget = remaining_request_budget()
+    if remaining_budget is not None:
+        max_wait = min(max_wait, max(0.0, remaining_budget - Config.OPENAI_RETRY_MIN_ATTEMPT_SECONDS))
+
+    while True:
+        try:
+            wait_seconds = try_take_capacity(model, tokens, key_label)
+        except OSError as e:
+            logger.warning('scheduler.buckets_unavailable', bucket=bucket_name, error=str(e))
+            return 0.0
+
+        waited = time.monotonic() - started_at
+        if wait_seconds <= 0:
+            if waited >= 0.5:
+                logger.info('scheduler.queued', bucket=bucket_name, tokens=tokens, waited_s=waited)
+            return waited
+        if waited >= max_wait:
+            logger.warning('scheduler.overflow', bucket=bucket_name, tokens=tokens, waited_s=waited)
+            return waited
+        time.sleep(min(wait_seconds, MAX_SLEEP_SECONDS, max_wait - waited))
+
+
+def parse_header_number(headers, name):
+    value = headers.get(name) if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def update_limits_from_headers(model, headers, key_label=None):
+    """
+    Adopt the account's real limits from x-ratelimit-limit-* and never let the
+    local buckets hold more than x-ratelimit-remaining-* says is left.
+    """
+    if not Config.OPENAI_SCHEDULER_ENABLED or headers is None:
+        return
+
+    limit_requests = parse_header_number(headers, 'x-ratelimit-limit-requests')
+    limit_tokens = parse_header_number(headers, 'x-ratelimit-limit-tokens')
+    remaining_requests = parse_header_number(headers, 'x-ratelimit-remaining-requests')
+    remaining_tokens = parse_header_number(headers, 'x-ratelimit-remaining-tokens')
+    if all(value is None for value in (limit_requests, limit_tokens, remaining_requests, remaining_tokens)):
+        return
+
+    def update(state):
+        bucket = get_bucket(state, get_bucket_name(model, key_label), model, time.time())
+        if limit_requests:
+            bucket['rpm_limit'] = limit_requests
+            bucket['limit_source'] = 'headers'
+        if limit_tokens:
+            bucket['tpm_limit'] = limit_tokens
+            bucket['limit_source'] = 'headers'
+        if remaining_requests is not None:
+            bucket['requests'] = min(bucket['requests'], remaining_requests)
+        if remaining_tokens is not None:
+            bucket['tokens'] = min(bucket['tokens'], remaining_tokens)
+
+    try:
+        with_shared_state(update)
+    except OSError as e:
+        logger.warning('scheduler.headers_failed', model=model, key=key_label, error=str(e))
+
+
+def get_openai_scheduler_snapshot():
+    """Current bucket levels per model, for /status."""
+    if not Config.OPENAI_SCHEDULER_ENABLED:
+        return {'enabled': False}
+
+    def update(state):
+        now = time.time()
+        snapshot = {}
+        for bucket_name, bucket in list(state['models'].items()):
+            bucket = get_bucket(state, bucket_name, bucket.get('model', bucket_name), now)
+            snapshot[bucket_name] = {
+                'rpm_limit': bucket['rpm_limit'],
+                'tpm_limit': bucket['tpm_limit'],
+                'requests_available': round(bucket['requests'], 1),
+                'tokens_available': round(bucket['tokens']),
+                'limit_source': bucket.get('limit_source', 'config')
+            }
+        return snapshot
+
+    try:
+        return {'enabled': True, 'models': with_shared_state(update)}
+    except OSError as e:
+        return {'enabled': True, 'error': str(e)}
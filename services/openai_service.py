@@ -1,22 +1,113 @@
+import logging
 import time
-import base64
-import requests
 import os
 import re
-from PIL import Image
-from io import BytesIO
+from contextlib import ExitStack
+from types import SimpleNamespace
 from flask import g, has_request_context
 from config import Config
 from database.operations import create_openai_usage_event
-
-OPENAI_AVAILABLE = False
+from services.openai_resilience import (
+    OpenAICircuitOpenError,
+    compute_backoff_delay,
+    get_circuit_breaker,
+    get_retry_after_seconds,
+    is_retryable_openai_error,
+    remaining_request_budget
+)
+from services.openai_hedging import get_hedge_delay, record_completion_latency, run_hedged, timed_call
+from services.length_fitter import fit_analysis
+from services.analysis_renderer import parse_structured_analysis, render_analysis
+from services.token_budget import get_token_budget
+from services.model_router import get_primary_model, run_model_route
+from services.openai_scheduler import acquire_openai_capacity, estimate_request_tokens, update_limits_from_headers
+from services.openai_dispatcher import openai_dispatch_slot
+from services.image_service import read_base64_image_info
+from services.openai_clients import (
+    get_primary_client,
+    has_available_client,
+    init_client_pool,
+    mark_call_finished,
+    mark_call_started,
+    record_client_error,
+    record_client_headers,
+    select_pooled_client
+)
+from services.openai_health import (
+    get_openai_status,
+    is_account_error,
+    is_api_key_configured,
+    record_openai_call_outcome,
+    register_openai_health_probe
+)
+from services.chart_normalizer import (
+    FRAME_TIMEFRAME_VOCABULARY,
+    TIMEFRAME_VOCABULARY,
+    canonicalize_symbol,
+    instrument_key,
+    is_recognized_instrument,
+    match_timeframe,
+    normalize_frame_timeframe,
+    normalize_frame_type,
+    normalize_symbol,
+)
+from utils.keyword_scanner import KeywordScanner
+from utils.structured_log import get_logger
+from services.prompts import (
+    CURRENCY_DETECTION_SYSTEM,
+    CURRENCY_DETECTION_USER,
+    FRAME_DETECTION_SYSTEM,
+    FINAL_SECTION_MARKER,
+    FRAME_DETECTION_USER,
+    GOLD_STOP_LOSS_INSTRUCTION,
+    H4_SECTION_MARKER,
+    INLINE_HEADER_INSTRUCTION,
+    STRUCTURED_OUTPUT_INSTRUCTION,
+    STANDARD_STOP_LOSS_INSTRUCTION,
+    TIMEFRAME_DETECTION_SYSTEM,
+    TIMEFRAME_DETECTION_USER,
+    render_prompt
+)
+
+logger = get_logger('openai')
 client = None
 openai_error_message = ""
-openai_last_check = 0
 VISION_IMAGE_DETAIL = "high"
+# Analyses answered as JSON and rendered locally when STRUCTURED_ANALYSIS_ENABLED is set
+STRUCTURED_ACTION_TYPES = ('first_analysis', 'second_analysis', 'single_analysis', 'final_analysis')
+# Fixed budget for the JSON replies: quoted keys and escaping take far more tokens than
+# the rendered text, so the prose budgets of services.token_budget do not apply
+STRUCTURED_MAX_TOKENS = 1200
+# Models sometimes wrap the header line in backticks or bold markers
+INLINE_HEADER_PATTERN = re.compile(
+    r"\A[\s`*]*TF\s*[=:]\s*(?P<timeframe>[^;\n]*?)\s*;\s*SYMBOL\s*[=:]\s*(?P<symbol>[^\n`*]*?)[ \t`*]*(?:\n[ \t]*`{3}[ \t]*)?(?:\n|\Z)",
+    re.IGNORECASE
+)
+MERGED_SECTION_PATTERN = re.compile(
+    rf"^[ \t*#]*({re.escape(H4_SECTION_MARKER)}|{re.escape(FINAL_SECTION_MARKER)})[ \t*]*$", re.MULTILINE
+)
+RECOMMENDATION_SCANNER = KeywordScanner(
+    recommendation=(
+        'توصية', 'توصيات', 'دخول', 'شراء', 'بيع', 'هدف', 'أهداف',
+        'recommendation', 'entry', 'buy', 'sell', 'target', 'stop loss'
+    ),
+    timeframe=(
+        '15 دقيقة', 'ربع ساعة', 'خمسة عشر', 'القادمة', 'المقبلة',
+        '15 minute', 'next 15', 'quarter', 'coming'
+    )
+)
+SHORTENING_CRITICAL_SCANNER = KeywordScanner(ignore_case=False, critical=(
+    'توصية', 'دخول', 'شراء', 'بيع', 'وقف', 'هدف', 'نسبة', 'مخاطرة', 'عائد',
+    'دعم', 'مقاومة', 'سيولة', 'نقطة', 'نقاط', 'شرط', 'شرط الدخول'
+))
+CRITICAL_SECTION_SCANNER = KeywordScanner(ignore_case=False, phrases=(
+    'توصية', 'دخول عند', 'شراء عند', 'بيع عند',
+    'وقف الخسارة', 'جني الأرباح', 'نسبة المخاطرة',
+    'الدعم عند', 'المقاومة عند'
+))
 OPENAI_PRICING_USD_PER_1M_TOKENS = {
-    "gpt-4o": {"input": 5.0, "output": 15.0},
-    "gpt-4o-mini": {"input": 0.15, "output": 0.60}
+    "gpt-4o": {"input": 5.0, "cached_input": 2.5, "output": 15.0},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60}
 }
 
 
@@ -26,24 +117,47 @@ def get_openai_usage_context():
     return getattr(g, 'openai_usage_context', {}) or {}
 
 
-def estimate_openai_cost_usd(model_name, prompt_tokens=0, completion_tokens=0):
+def estimate_openai_cost_usd(model_name, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
     pricing = OPENAI_PRICING_USD_PER_1M_TOKENS.get(model_name)
     if not pricing:
         return 0.0
 
-    input_cost = (max(0, int(prompt_tokens or 0)) / 1_000_000) * pricing['input']
+    # Cached prompt tokens are part of prompt_tokens but billed at the discounted rate
+    cached_tokens = min(max(0, int(cached_tokens or 0)), max(0, int(prompt_tokens or 0)))
+    uncached_tokens = max(0, int(prompt_tokens or 0)) - cached_tokens
+    input_cost = (uncached_tokens / 1_000_000) * pricing['input']
+    input_cost += (cached_tokens / 1_000_000) * pricing.get('cached_input', pricing['input'])
     output_cost = (max(0, int(completion_tokens or 0)) / 1_000_000) * pricing['output']
     return round(input_cost + output_cost, 6)
 
 
+def get_cached_prompt_tokens(usage):
+    # Older SDK versions keep prompt_tokens_details as a plain dict on the usage object
+    details = getattr(usage, 'prompt_tokens_details', None)
+    if isinstance(details, dict):
+        return int(details.get('cached_tokens') or 0)
+    return int(getattr(details, 'cached_tokens', 0) or 0)
+
+
 def record_openai_usage_event(action_type, model_name, response=None, request_mode="text", image_detail=None,
-                              timeframe=None, currency_pair=None, success=True, error_message=None):
+                              timeframe=None, currency_pair=None, success=True, error_message=None,
+                              attempt_count=1, hedge_role=None, usage_context=None,
+                              latency_ms=None, first_token_ms=None, max_tokens=None, token_budget_source=None,
+                              output_chars=None, finish_reason=None, api_key_label=None,
+                              image_bytes=None, image_width=None, image_height=None):
     try:
         usage = getattr(response, 'usage', None)
+        choices = getattr(response, 'choices', None) or []
+        if choices:
+            if output_chars is None:
+                output_chars = len(getattr(choices[0].message, 'content', None) or '')
+            finish_reason = finish_reason or getattr(choices[0], 'finish_reason', None)
         prompt_tokens = int(getattr(usage, 'prompt_tokens', 0) or 0)
         completion_tokens = int(getattr(usage, 'completion_tokens', 0) or 0)
         total_tokens = int(getattr(usage, 'total_tokens', 0) or 0)
-        context = get_openai_usage_context()
+        cached_tokens = get_cached_prompt_tokens(usage)
+        # Hedge losers settle on a pool thread after the request context is gone
+        context = usage_context if usage_context is not None else get_openai_usage_context()
 
         create_openai_usage_event({
             'telegram_user_id': context.get('telegram_user_id'),
@@ -59,125 +173,399 @@ def record_openai_usage_event(action_type, model_name, response=None, request_mo
             'prompt_tokens': prompt_tokens,
             'completion_tokens': completion_tokens,
             'total_tokens': total_tokens,
-            'estimated_cost_usd': estimate_openai_cost_usd(model_name, prompt_tokens, completion_tokens),
+            'cached_tokens': cached_tokens,
+            'estimated_cost_usd': estimate_openai_cost_usd(model_name, prompt_tokens, completion_tokens, cached_tokens),
             'success': success,
-            'error_message': error_message
+            'error_message': error_message,
+            'attempt_count': attempt_count,
+            'hedge_role': hedge_role,
+            'latency_ms': latency_ms,
+            'first_token_ms': first_token_ms,
+            'output_chars': output_chars,
+            'max_tokens': max_tokens,
+            'finish_reason': finish_reason,
+            'token_budget_source': token_budget_source,
+            'api_key_label': api_key_label,
+            'image_bytes': image_bytes,
+            'image_width': image_width,
+            'image_height': image_height,
+            # Prompt-cache hit: part of the prompt was billed at the cached rate
+            'cache_hit': cached_tokens > 0 if usage is not None else None
         })
     except Exception as logging_error:
-        print(f"ERROR: OpenAI usage logging failed: {logging_error}")
-
+        logger.error('usage.record_failed', error=str(logging_error))
+
+
+def get_message_image_info(messages):
+    """image_bytes/width/height of the (first) inline image in the messages, for the usage event."""
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            continue
+        for part in content or []:
+            if part.get('type') != 'image_url':
+                continue
+            image_url = (part.get('image_url') or {}).get('url') or ''
+            if image_url.startswith('data:') and ',' in image_url:
+                image_bytes, width, height = read_base64_image_info(image_url.split(',', 1)[1])
+                return {'image_bytes': image_bytes, 'image_width': width, 'image_height': height}
+    return {}
 
 def create_openai_chat_completion(*, action_type, model, messages, max_tokens, temperature,
                                   timeout=None, request_mode="text", image_detail=None,
-                                  timeframe=None, currency_pair=None):
+                                  timeframe=None, currency_pair=None, hedge=False, stream=False,
+                                  adaptive_max_tokens=False, response_format=None):
+    """
+    Single entry point for chat completions. Transient failures (timeouts,
+    429, 5xx) are retried with jittered exponential backoff, honoring
+    Retry-After and the remaining request budget; a per-model circuit
+    breaker fails fast while OpenAI is degraded.
+
+    hedge=True (short detection calls, when OPENAI_HEDGING_ENABLED) sends a
+    duplicate request once the first one outlives the observed p90 latency.
+
+    stream=True returns a generator of content deltas instead of a response;
+    usage is recorded once the stream ends.
+
+    adaptive_max_tokens=True swaps max_tokens for the per-action budget learned
+    from completion history (see services.token_budget).
+
+    response_format is passed through, e.g. {"type": "json_object"} for structured analyses.
+    Those calls keep their max_tokens and are recorded with token_budget_source
+    'structured', which keeps them out of the prose length history.
+    """
+    token_budget_source = 'static'
+    if response_format:
+        token_budget_source = 'structured'
+    elif adaptive_max_tokens:
+        max_tokens, token_budget_source = get_token_budget(action_type, max_tokens)
+
     request_kwargs = {
         'model': model,
         'messages': messages,
         'max_tokens': max_tokens,
         'temperature': temperature
     }
-    if timeout is not None:
-        request_kwargs['timeout'] = timeout
+    if response_format:
+        request_kwargs['response_format'] = response_format
+    event_kwargs = {
+        'action_type': action_type,
+        'model_name': model,
+        'request_mode': request_mode,
+        'image_detail': image_detail,
+        'timeframe': timeframe,
+        'currency_pair': currency_pair,
+        'max_tokens': max_tokens,
+        'token_budget_source': token_budget_source,
+        **get_message_image_info(messages)
+    }
 
-    try:
-        response = client.chat.completions.create(**request_kwargs)
-        record_openai_usage_event(
-            action_type=action_type,
-            model_name=model,
-            response=response,
-            request_mode=request_mode,
-            image_detail=image_detail,
-            timeframe=timeframe,
-            currency_pair=currency_pair,
-            success=True
-        )
-        return response
-    except Exception as exc:
-        record_openai_usage_event(
-            action_type=action_type,
-            model_name=model,
-            response=None,
-            request_mode=request_mode,
-            image_detail=image_detail,
-            timeframe=timeframe,
-            currency_pair=currency_pair,
-            success=False,
-            error_message=str(exc)
-        )
-        raise
+    # Estimated once: for a vision call this reads the image header out of the base64 payload
+    estimated_tokens = estimate_request_tokens(messages, max_tokens)
+
+    if stream:
+        request_kwargs['stream'] = True
+        request_kwargs['stream_options'] = {'include_usage': True}
+        return stream_chat_completion_deltas(request_kwargs, event_kwargs, timeout, estimated_tokens)
+
+    usage_context = dict(get_openai_usage_context())
+
+    def send_attempt(attempt_kwargs, attempt):
+        # The dispatch slot covers one attempt, so a call sleeping through backoff holds none
+        with openai_dispatch_slot(usage_context, estimated_tokens):
+            if hedge and Config.OPENAI_HEDGING_ENABLED:
+                return send_hedged_chat_completion(attempt_kwargs, event_kwargs, attempt, estimated_tokens)
+            response, elapsed = timed_call(lambda: send_chat_completion(attempt_kwargs, event_kwargs, estimated_tokens))
+            return response, elapsed, None
+
+    call_started_at = time.monotonic()
+    response, elapsed, attempt, hedge_role = execute_with_retries(request_kwargs, event_kwargs, timeout, send_attempt)
+    record_completion_latency(action_type, model, elapsed)
+    record_openai_usage_event(
+        response=response,
+        success=True,
+        attempt_count=attempt,
+        hedge_role=hedge_role,
+        latency_ms=int((time.monotonic() - call_started_at) * 1000),
+        **event_kwargs
+    )
+    return response
+
+
+def send_chat_completion(request_kwargs, event_kwargs, estimated_tokens):
+    """
+    One HTTP call to OpenAI on the pooled key with the most headroom, metered by
+    that key's RPM/TPM buckets against estimated_tokens. The x-ratelimit-*
+    headers of every answer, 429s included, feed back into both. A quota/auth error quarantines the
+    key and hands the call to the next healthy one; other errors go to the retry loop.
+    The serving key is recorded in event_kwargs['api_key_label'].
+    """
+    model = request_kwargs['model']
+    tried_labels = []
+    while True:
+        current = select_pooled_client(exclude=tried_labels)
+        if current is None:
+            raise RuntimeError("OpenAI not available: no API key configured")
+        event_kwargs['api_key_label'] = current.label
+
+        acquire_openai_capacity(model, estimated_tokens, key_label=current.label)
+        mark_call_started(current)
+        try:
+            raw_response = current.client.chat.completions.with_raw_response.create(**request_kwargs)
+        except Exception as exc:
+            error_response = getattr(exc, 'response', None)
+            if error_response is not None:
+                update_limits_from_headers(model, error_response.headers, key_label=current.label)
+                record_client_headers(current, error_response.headers)
+            record_client_error(current, exc)
+            tried_labels.append(current.label)
+            if is_account_error(exc) and has_available_client(exclude=tried_labels):
+                logger.warning('openai.key_failover', action_type=event_kwargs['action_type'], from_key=current.label)
+                continue
+            raise
+        finally:
+            mark_call_finished(current)
+
+        update_limits_from_headers(model, raw_response.headers, key_label=current.label)
+        record_client_headers(current, raw_response.headers)
+        return raw_response.parse()
+
+
+def execute_with_retries(request_kwargs, event_kwargs, timeout, send_attempt):
+    """
+    Circuit breaker + retry loop around `send_attempt(request_kwargs, attempt)`,
+    which returns (result, elapsed_seconds, hedge_role). Failures that end the
+    loop are recorded as usage events here; successes are recorded by the caller.
+    Returns (result, elapsed_seconds, attempt_count, hedge_role).
+    """
+    action_type = event_kwargs['action_type']
+    model = event_kwargs['model_name']
+    call_started_at = time.monotonic()
+
+    breaker = get_circuit_breaker(model)
+    if not breaker.allow_request():
+        error_message = f"OpenAI circuit open for {model}, retry in {breaker.retry_in_seconds():.0f}s"
+        logger.warning('openai.circuit_open', model=model, action_type=action_type)
+        record_openai_usage_event(response=None, success=False, error_message=error_message,
+                                  attempt_count=0, latency_ms=0, **event_kwargs)
+        raise OpenAICircuitOpenError(error_message)
+
+    max_attempts = max(1, Config.OPENAI_RETRY_MAX_ATTEMPTS)
+    attempt = 0
+    while True:
+        attempt += 1
+        attempt_timeout = timeout
+        remaining_budget = remaining_request_budget()
+        if remaining_budget is not None:
+            attempt_timeout = min(attempt_timeout or remaining_budget, max(1.0, remaining_budget))
+        if attempt_timeout is not None:
+            request_kwargs['timeout'] = attempt_timeout
 
+        try:
+            result, elapsed, hedge_role = send_attempt(request_kwargs, attempt)
+            breaker.record_success()
+            record_openai_call_outcome(True)
+            return result, elapsed, attempt, hedge_role
+        except Exception as exc:
+            retryable = is_retryable_openai_error(exc)
+            if retryable:
+                breaker.record_failure()
+            else:
+                # OpenAI answered (e.g. 400/401), so the model endpoint itself is reachable
+                breaker.record_success()
+
+            delay = compute_backoff_delay(attempt, get_retry_after_seconds(exc))
+            remaining_budget = remaining_request_budget()
+            budget_exhausted = (
+                remaining_budget is not None
+                and remaining_budget - delay < Config.OPENAI_RETRY_MIN_ATTEMPT_SECONDS
+            )
+            if not retryable or attempt >= max_attempts or budget_exhausted or breaker.is_open():
+                # A quota/auth error on one key only makes OpenAI unavailable once no pooled key is left
+                if not has_available_client():
+                    record_openai_call_outcome(False, exc)
+                record_openai_usage_event(
+                    response=None,
+                    success=False,
+                    error_message=str(exc),
+                    attempt_count=attempt,
+                    latency_ms=int((time.monotonic() - call_started_at) * 1000),
+                    **event_kwargs
+                )
+                raise
+
+            logger.warning('openai.retry', action_type=action_type, attempt=attempt,
+                           error_type=type(exc).__name__, delay_s=delay)
+            time.sleep(delay)
+
+
+def stream_chat_completion_deltas(request_kwargs, event_kwargs, timeout, estimated_tokens):
+    """
+    Generator behind create_openai_chat_completion(stream=True). Only opening
+    the stream is retried; once tokens flow, an error ends the stream. Time to
+    first token and total latency are recorded separately.
+    """
+    usage_context = dict(get_openai_usage_context())
+    slot = ExitStack()
 
-def canonicalize_instrument_symbol(symbol):
-    if not symbol:
-        return 'UNKNOWN'
+    def send_attempt(attempt_kwargs, attempt):
+        # A failed open gives its slot back before the backoff; an open stream keeps it until fully read or closed
+        slot.enter_context(openai_dispatch_slot(usage_context, estimated_tokens))
+        try:
+            stream, elapsed = timed_call(lambda: send_chat_completion(attempt_kwargs, event_kwargs, estimated_tokens))
+        except BaseException:
+            slot.close()
+            raise
+        return stream, elapsed, None
+
+    with slot:
+        call_started_at = time.monotonic()
+
+        stream, _, attempt, _ = execute_with_retries(request_kwargs, event_kwargs, timeout, send_attempt)
+
+        usage = None
+        first_token_ms = None
+        output_chars = 0
+        finish_reason = None
+        outcome = {'success': False, 'error_message': None}
+        try:
+            for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    output_chars += len(delta)
+                    if first_token_ms is None:
+                        first_token_ms = int((time.monotonic() - call_started_at) * 1000)
+                    yield delta
+            outcome['success'] = True
+        except GeneratorExit:
+            outcome['error_message'] = "Stream closed by consumer before completion"
+            raise
+        except Exception as exc:
+            if is_retryable_openai_error(exc):
+                get_circuit_breaker(event_kwargs['model_name']).record_failure()
+            outcome['error_message'] = str(exc)
+            raise
+        finally:
+            stream.close()
+            latency_seconds = time.monotonic() - call_started_at
+            if outcome['success']:
+                record_completion_latency(event_kwargs['action_type'], event_kwargs['model_name'], latency_seconds)
+            record_openai_usage_event(
+                response=SimpleNamespace(usage=usage),
+                success=outcome['success'],
+                error_message=outcome['error_message'],
+                attempt_count=attempt,
+                latency_ms=int(latency_seconds * 1000),
+                first_token_ms=first_token_ms,
+                output_chars=output_chars,
+                finish_reason=finish_reason,
+                usage_context=usage_context,
+                **event_kwargs
+            )
 
-    cleaned_symbol = str(symbol).replace(' ', '').replace('/', '').upper()
-    if cleaned_symbol in ['UNKNOWN', 'NOTFOUND', '']:
-        return 'UNKNOWN'
 
-    quote_currencies = {'USD', 'EUR', 'JPY', 'GBP', 'CHF', 'AUD', 'CAD', 'NZD'}
-    if len(cleaned_symbol) == 6 and cleaned_symbol.isalpha() and cleaned_symbol[3:] in quote_currencies:
-        return f"{cleaned_symbol[:3]}/{cleaned_symbol[3:]}"
+def send_hedged_chat_completion(request_kwargs, event_kwargs, attempt, estimated_tokens):
+    """Run one hedged attempt; the losing request is logged as its own usage event."""
+    usage_context = dict(get_openai_usage_context())
+    hedge_delay = get_hedge_delay(event_kwargs['action_type'], event_kwargs['model_name'])
+    attempt_kwargs = dict(request_kwargs)
+    # Each racer picks its key and fails over on its own, so each records the key that served it
+    racer_event_kwargs = {role: dict(event_kwargs) for role in ('primary', 'hedge')}
+
+    def on_loser_done(role, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            loser_response, loser_elapsed = future.result()
+            record_completion_latency(event_kwargs['action_type'], event_kwargs['model_name'], loser_elapsed)
+        else:
+            loser_response = None
+        record_openai_usage_event(
+            response=loser_response,
+            success=error is None,
+            error_message=str(error) if error else None,
+            attempt_count=attempt,
+            hedge_role=f"{role}_lost",
+            usage_context=usage_context,
+            **racer_event_kwargs[role]
+        )
+
+    try:
+        response, elapsed, winner_role = run_hedged(
+            lambda role: send_chat_completion(attempt_kwargs, racer_event_kwargs[role], estimated_tokens),
+            hedge_delay,
+            on_loser_done
+        )
+    except Exception:
+        # run_hedged re-raises the primary's error
+        event_kwargs['api_key_label'] = racer_event_kwargs['primary'].get('api_key_label')
+        raise
+    event_kwargs['api_key_label'] = racer_event_kwargs[winner_role].get('api_key_label')
+    return response, elapsed, f"{winner_role}_won"
 
-    return cleaned_symbol
 
-def log_openai_response(action_type, response_content, char_limit=1024):
+def log_openai_response(action_type, response_content, char_limit=1024, response=None, max_tokens=None):
     """
-    Comprehensive logging for OpenAI responses
+    One event per analysis response (length, limit, token usage); the text
+    itself only for the sampled share of requests
     """
-    print(f"\n{'='*80}")
-    print(f"🚨 OPENAI RESPONSE LOG - {action_type.upper()}")
-    print(f"{'='*80}")
-    print(f"📊 Response length: {len(response_content)} characters")
-    print(f"📏 Character limit: {char_limit}")
-    print(f"📈 Limit exceeded: {len(response_content) > char_limit}")
-    print(f"📋 Full response content:")
-    print(f"{'='*40}")
-    print(response_content)
-    print(f"{'='*40}")
-    print(f"🔍 Response ends with: ...{response_content[-50:] if len(response_content) > 50 else response_content}")
-    print(f"{'='*80}\n")
+    usage = getattr(response, 'usage', None)
+    over_limit = len(response_content) > char_limit
+    # A trailing ellipsis or a reply right at the limit usually means the model ran out of tokens
+    possibly_truncated = '...' in response_content[-10:] or len(response_content) >= char_limit - 4
+    logger.log(logging.WARNING if over_limit or possibly_truncated else logging.INFO, 'openai.response',
+               action_type=action_type, chars=len(response_content), char_limit=char_limit,
+               over_limit=over_limit, possibly_truncated=possibly_truncated, max_tokens=max_tokens,
+               prompt_tokens=getattr(usage, 'prompt_tokens', None),
+               completion_tokens=getattr(usage, 'completion_tokens', None))
+    logger.body('openai.response_body', response_content, action_type=action_type)
 
 def check_recommendations(action_type, analysis_text):
     """
     Check if the analysis contains essential recommendations
     """
-    print(f"\n🔍 RECOMMENDATION CHECK - {action_type.upper()}")
+    keyword_groups = RECOMMENDATION_SCANNER.matched_groups(analysis_text)
+    has_recommendation = 'recommendation' in keyword_groups
+    has_timeframe = 'timeframe' in keyword_groups
 
-    # Keywords to check for in Arabic and English
-    recommendation_keywords = [
-        'توصية', 'توصيات', 'دخول', 'شراء', 'بيع', 'هدف', 'أهداف',
-        'recommendation', 'entry', 'buy', 'sell', 'target', 'stop loss'
-    ]
+    logger.log(logging.INFO if has_recommendation and has_timeframe else logging.WARNING,
+               'analysis.recommendation_check', action_type=action_type,
+               has_recommendation=has_recommendation, has_timeframe=has_timeframe)
 
-    timeframe_keywords = [
-        '15 دقيقة', 'ربع ساعة', 'خمسة عشر', 'القادمة', 'المقبلة',
-        '15 minute', 'next 15', 'quarter', 'coming'
-    ]
+def shorten_analysis_text(analysis_text, char_limit=1024, timeframe=None, currency=None):
+    """
+    Fit an over-limit analysis into char_limit with the local length fitter.
+    The gpt-4o rewrite is only attempted when ANALYSIS_LLM_SHORTENING_ENABLED
+    is set and the local fit had to drop a number.
+    """
+    if len(analysis_text) <= char_limit:
+        return analysis_text
 
-    has_recommendation = any(keyword in analysis_text.lower() for keyword in recommendation_keywords)
-    has_timeframe = any(keyword in analysis_text.lower() for keyword in timeframe_keywords)
+    fit = fit_analysis(analysis_text, char_limit)
+    logger.log(logging.WARNING if fit['dropped_numbers'] else logging.INFO, 'length_fitter.fit',
+               original_chars=len(analysis_text), chars=len(fit['text']), stage=fit['stage'],
+               dropped_numbers=fit['dropped_numbers'] or None)
+    if not fit['dropped_numbers']:
+        return fit['text']
 
-    print(f"📊 Has recommendations: {has_recommendation}")
-    print(f"⏰ Has timeframe mention: {has_timeframe}")
-    print(f"📝 Recommendation check passed: {has_recommendation and has_timeframe}")
+    if not Config.ANALYSIS_LLM_SHORTENING_ENABLED:
+        return fit['text']
 
-    if not has_recommendation:
-        print("⚠️ WARNING: Analysis missing trading recommendations!")
-    if not has_timeframe:
-        print("⚠️ WARNING: Analysis missing 15-minute timeframe context!")
+    return shorten_analysis_text_with_openai(analysis_text, char_limit, timeframe, currency) or fit['text']
 
-def shorten_analysis_text(analysis_text, char_limit=1024, timeframe=None, currency=None):
+def shorten_analysis_text_with_openai(analysis_text, char_limit=1024, timeframe=None, currency=None):
     """
     CONSERVATIVE shortening that preserves ALL critical trading information in ARABIC
-    Targets 980-1024 characters range while keeping essential data
+    Targets 980-1024 characters range while keeping essential data.
+    Returns None when the rewrite is unusable so the caller keeps the local fit.
     """
-    global client
-    
-    if len(analysis_text) <= char_limit:
-        return analysis_text
-
-    print(f"📏 CONSERVATIVE SHORTENING: Analysis slightly long ({len(analysis_text)} chars), optimizing...")
+    logger.info('shortening.started', original_chars=len(analysis_text))
 
     try:
         # CONSERVATIVE PROMPT - Only remove non-essential parts
@@ -222,7 +610,7 @@ def shorten_analysis_text(analysis_text, char_limit=1024, timeframe=None, curren
 
         response = create_openai_chat_completion(
             action_type="shorten_analysis_text",
-            model="gpt-4o",
+            model=get_primary_model("shorten_analysis_text"),
             messages=[
                 {
                     "role": "system", 
@@ -242,165 +630,46 @@ def shorten_analysis_text(analysis_text, char_limit=1024, timeframe=None, curren
 
         shortened = response.choices[0].message.content.strip()
         
-        print(f"📏 CONSERVATIVE SHORTENING: Original: {len(analysis_text)} chars -> Shortened: {len(shortened)} chars")
         
         # Enhanced validation to ensure we didn't lose critical information
-        critical_keywords = [
-            'توصية', 'دخول', 'شراء', 'بيع', 'وقف', 'هدف', 'نسبة', 'مخاطرة', 'عائد',
-            'دعم', 'مقاومة', 'سيولة', 'نقطة', 'نقاط', 'شرط', 'شرط الدخول'
-        ]
-        
-        missing_critical = [kw for kw in critical_keywords if kw in analysis_text and kw not in shortened]
+        original_keywords = SHORTENING_CRITICAL_SCANNER.found(analysis_text)
+        kept_keywords = SHORTENING_CRITICAL_SCANNER.found(shortened)
+        missing_critical = [kw for kw in SHORTENING_CRITICAL_SCANNER.keywords if kw in original_keywords and kw not in kept_keywords]
         if missing_critical:
-            print(f"📏 CONSERVATIVE SHORTENING: ⚠️ Critical information lost: {missing_critical}")
-            # Fall back to smart truncation that preserves recommendations
-            return smart_conservative_truncation(analysis_text, char_limit, timeframe, currency)
+            logger.warning('shortening.rejected', reason='critical_lost', chars=len(shortened),
+                           missing=missing_critical)
+            return None
         
-        # If still too long after conservative shortening, use smart truncation
+        # If still too long after conservative shortening, keep the local fit
         if len(shortened) > char_limit:
-            print(f"📏 CONSERVATIVE SHORTENING: ⚠️ Still too long ({len(shortened)} chars), using smart truncation")
-            return smart_conservative_truncation(analysis_text, char_limit, timeframe, currency)
+            logger.warning('shortening.rejected', reason='too_long', chars=len(shortened))
+            return None
         
         # If too short, we might have been too aggressive
         if len(shortened) < 900:
-            print(f"📏 CONSERVATIVE SHORTENING: ⚠️ Too short ({len(shortened)} chars), might have lost information")
             # Check if we can add back some context without exceeding limit
             additional_context = extract_critical_sections(analysis_text, 150)  # Get 150 chars of critical context
             if additional_context and len(shortened + "\n" + additional_context) <= char_limit:
                 shortened += "\n" + additional_context
-                print(f"📏 CONSERVATIVE SHORTENING: ✅ Added back context: {len(shortened)} chars")
         
-        print(f"📏 CONSERVATIVE SHORTENING: ✅ Final optimized length: {len(shortened)} chars")
+        logger.info('shortening.completed', original_chars=len(analysis_text), chars=len(shortened))
         return shortened
 
     except Exception as e:
-        print(f"📏 CONSERVATIVE SHORTENING: ❌ Error shortening analysis: {str(e)}")
-        # Use enhanced conservative truncation as fallback
-        return smart_conservative_truncation(analysis_text, char_limit, timeframe, currency)
-
-def smart_conservative_truncation(analysis_text, char_limit=1024, timeframe=None, currency=None):
-    """
-    Smart truncation that preserves the most critical parts of the analysis
-    """
-    print(f"📏 SMART TRUNCATION: Using intelligent preservation for {len(analysis_text)} chars")
-    
-    # Try to find and preserve these critical sections in order of importance
-    critical_sections = []
-    
-    # 1. Look for recommendations section (most important)
-    recommendation_keywords = ['توصية', 'توصيات', 'دخول', 'شراء', 'بيع', 'الربح', 'الخسارة', 'نقطة دخول']
-    rec_start = -1
-    for keyword in recommendation_keywords:
-        idx = analysis_text.find(keyword)
-        if idx != -1 and (rec_start == -1 or idx < rec_start):
-            rec_start = idx
-    
-    if rec_start != -1:
-        # Take from recommendation start to end, but limit to reasonable length
-        recommendations_section = analysis_text[rec_start:]
-        if len(recommendations_section) > 600:  # If too long, take first 600 chars of recommendations
-            recommendations_section = recommendations_section[:600]
-        critical_sections.append(("توصيات", recommendations_section))
-    
-    # 2. Look for stop loss and take profit
-    sl_tp_keywords = ['وقف', 'هدف', 'stop loss', 'take profit', 'جني الأرباح']
-    sl_tp_sections = []
-    for keyword in sl_tp_keywords:
-        idx = analysis_text.find(keyword)
-        if idx != -1:
-            # Take some context around the keyword
-            start = max(0, idx - 50)
-            end = min(len(analysis_text), idx + 150)
-            section = analysis_text[start:end]
-            sl_tp_sections.append(section)
-    
-    if sl_tp_sections:
-        critical_sections.append(("وقف وهدف", " ".join(sl_tp_sections)))
-    
-    # 3. Look for risk-reward ratio
-    risk_keywords = ['نسبة', 'مخاطرة', 'عائد', 'risk', 'reward']
-    risk_sections = []
-    for keyword in risk_keywords:
-        idx = analysis_text.find(keyword)
-        if idx != -1:
-            start = max(0, idx - 30)
-            end = min(len(analysis_text), idx + 100)
-            section = analysis_text[start:end]
-            risk_sections.append(section)
-    
-    if risk_sections:
-        critical_sections.append(("مخاطرة وعائد", " ".join(risk_sections)))
-    
-    # 4. Get the beginning for context (first 200 chars)
-    beginning = analysis_text[:200]
-    critical_sections.append(("مقدمة", beginning))
-    
-    # Build the truncated text
-    truncated_parts = []
-    current_length = 0
-    
-    # Add timeframe and currency info first
-    header = ""
-    if timeframe:
-        header += f"📊 الإطار: {timeframe}"
-    if currency and currency != 'UNKNOWN':
-        if header:
-            header += " | "
-        header += f"العملة: {currency}"
-    if header:
-        header += "\n\n"
-        current_length += len(header)
-        truncated_parts.append(header)
-    
-    # Add critical sections in order of importance
-    for section_name, section_text in critical_sections:
-        if current_length + len(section_text) + 10 <= char_limit:  # +10 for separators
-            truncated_parts.append(section_text)
-            current_length += len(section_text) + 2  # +2 for newlines
-        else:
-            # If we're running out of space, truncate this section
-            space_left = char_limit - current_length - 10
-            if space_left > 50:  # Only add if we have meaningful space
-                truncated_parts.append(section_text[:space_left] + "...")
-                current_length += space_left + 3
-            break
-    
-    # If we still have space, add a connector
-    if current_length < char_limit - 20 and rec_start > 200:
-        connector = "\n[...]\n"
-        current_length += len(connector)
-        truncated_parts.insert(1, connector)  # Insert after header
-    
-    final_text = "".join(truncated_parts)
-    
-    # Final cleanup - ensure we're within limits
-    if len(final_text) > char_limit:
-        final_text = final_text[:char_limit-3] + "..."
-    
-    print(f"📏 SMART TRUNCATION: ✅ Final length: {len(final_text)} chars")
-    return final_text
+        logger.exception('shortening.failed', error=str(e))
+        return None
 
 def extract_critical_sections(analysis_text, max_chars=200):
     """
     Extract the most critical sections from analysis for context preservation
     """
     critical_parts = []
-    
-    # Look for key sections
-    key_phrases = [
-        'توصية', 'دخول عند', 'شراء عند', 'بيع عند', 
-        'وقف الخسارة', 'جني الأرباح', 'نسبة المخاطرة',
-        'الدعم عند', 'المقاومة عند'
-    ]
-    
-    for phrase in key_phrases:
-        idx = analysis_text.find(phrase)
-        if idx != -1:
-            # Extract context around the phrase
-            start = max(0, idx - 20)
-            end = min(len(analysis_text), idx + 80)
-            section = analysis_text[start:end]
-            critical_parts.append(section)
+
+    # Context around the first occurrence of each key phrase, in phrase order
+    for idx in CRITICAL_SECTION_SCANNER.first_offsets(analysis_text).values():
+        start = max(0, idx - 20)
+        end = min(len(analysis_text), idx + 80)
+        critical_parts.append(analysis_text[start:end])
     
     # Combine and limit length
     if critical_parts:
@@ -411,216 +680,160 @@ def extract_critical_sections(analysis_text, max_chars=200):
     
     return None
 
-def init_openai():
+def probe_openai_models():
     """
-    Initialize OpenAI client and test model availability.
-    Sets OPENAI_AVAILABLE, client, openai_error_message, openai_last_check.
+    Health probe behind services.openai_health: lists models and checks gpt-4o.
+    Runs in a background thread, never on worker boot or the request path.
+    Returns (available, error_message).
     """
-    global OPENAI_AVAILABLE, client, openai_error_message, openai_last_check
+    if client is None:
+        return False, openai_error_message or "OpenAI client not initialized"
+
+    try:
+        # Probe through the pool so one quarantined key does not mark OpenAI down
+        probe_client = select_pooled_client() or SimpleNamespace(client=client)
+        models = probe_client.client.models.list()
+        model_ids = [m.id for m in models.data]
+        has_gpt4o = "gpt-4o" in model_ids
+        logger.log(logging.INFO if has_gpt4o else logging.ERROR, 'health.probe',
+                   models=len(model_ids), has_gpt4o=has_gpt4o)
+
+        if not has_gpt4o:
+            return False, "GPT-4o model not available in your account"
+        return True, ""
+
+    except Exception as e:
+        error_msg = str(e)
+        logger.error('health.probe_failed', error=error_msg)
+        if "insufficient_quota" in error_msg:
+            return False, "Account has no API credits. Please add funds to your OpenAI API account."
+        elif "invalid_api_key" in error_msg:
+            return False, "Invalid API key. Please check your OPENAI_API_KEY environment variable."
+        elif "rate limit" in error_msg.lower():
+            # A rate limit proves the key works; keep serving
+            return True, ""
+        return False, f"OpenAI API test failed: {error_msg}"
 
-    print("🚨 OPENAI INIT: Starting OpenAI initialization...")
+def init_openai():
+    """
+    Create the OpenAI client without any network call and start the background
+    health probe; availability is read through services.openai_health.
+    Returns True when a client was created.
+    """
+    global client, openai_error_message
 
     try:
         from openai import OpenAI
-        print("🚨 OPENAI INIT: OpenAI package imported successfully")
 
         # Get API key from Config
         api_key = Config.OPENAI_API_KEY
-        print(f"🚨 OPENAI INIT: Config.OPENAI_API_KEY = {api_key[:20]}..." if api_key else "🚨 OPENAI INIT: Config.OPENAI_API_KEY = None")
-        print(f"🚨 OPENAI INIT: API Key exists: {bool(api_key)}")
-        print(f"🚨 OPENAI INIT: API Key length: {len(api_key) if api_key else 0}")
 
-        if not api_key or api_key == "your-api-key-here":
+        if not is_api_key_configured():
             openai_error_message = "OpenAI API key not configured"
-            print(f"🚨 OPENAI INIT: ❌ API key check failed - not configured or still default")
-            OPENAI_AVAILABLE = False
+            logger.error('init.failed', reason='api_key_not_configured', has_key=bool(api_key or Config.OPENAI_API_KEYS))
             return False
 
-        print("🚨 OPENAI INIT: Creating OpenAI client...")
-        client = OpenAI(api_key=api_key)
-        print("🚨 OPENAI INIT: OpenAI client created successfully")
+        # Retries are owned by create_openai_chat_completion, not the SDK
+        def build_client(key, organization):
+            return OpenAI(api_key=key, organization=organization, base_url=Config.OPENAI_BASE_URL, max_retries=0)
 
-        try:
-            print("🚨 OPENAI INIT: Testing model availability...")
-            models = client.models.list()
-            model_ids = [m.id for m in models.data]
-            print(f"🚨 OPENAI INIT: Found {len(model_ids)} models")
-            print(f"🚨 OPENAI INIT: First few models: {model_ids[:5]}")
-
-            if "gpt-4o" not in model_ids:
-                openai_error_message = "GPT-4o model not available in your account"
-                print(f"🚨 OPENAI INIT: ❌ GPT-4o not found in available models")
-                OPENAI_AVAILABLE = False
-                return False
-
-            print("🚨 OPENAI INIT: ✅ GPT-4o model found!")
-            OPENAI_AVAILABLE = True
-            openai_error_message = ""
-            openai_last_check = time.time()
-            print("🚨 OPENAI INIT: ✅ OpenAI initialized successfully!")
-            return True
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"🚨 OPENAI INIT: ❌ Model list error: {error_msg}")
-            if "insufficient_quota" in error_msg:
-                openai_error_message = "Account has no API credits. Please add funds to your OpenAI API account."
-            elif "invalid_api_key" in error_msg:
-                openai_error_message = "Invalid API key. Please check your OPENAI_API_KEY environment variable."
-            elif "rate limit" in error_msg.lower():
-                openai_error_message = "Rate limit exceeded. Please try again later."
-            else:
-                openai_error_message = f"OpenAI API test failed: {error_msg}"
-            OPENAI_AVAILABLE = False
-            return False
+        pool_size = init_client_pool(build_client)
+        client = get_primary_client()
+        openai_error_message = ""
+        logger.info('init.completed', key_pool_size=pool_size, base_url=Config.OPENAI_BASE_URL)
+
+        register_openai_health_probe(probe_openai_models)
+        get_openai_status()
+        return True
 
     except ImportError as e:
-        print(f"🚨 OPENAI INIT: ❌ OpenAI package import error: {e}")
+        logger.error('init.failed', reason='import_error', error=str(e))
         openai_error_message = f"OpenAI package not installed: {e}"
-        OPENAI_AVAILABLE = False
         return False
     except Exception as e:
-        print(f"🚨 OPENAI INIT: ❌ General initialization error: {str(e)}")
+        logger.exception('init.failed', reason='error', error=str(e))
         openai_error_message = f"OpenAI initialization error: {str(e)}"
-        OPENAI_AVAILABLE = False
         return False
 
+def ensure_openai_available():
+    """Raise RuntimeError when the shared health status says OpenAI cannot serve requests."""
+    if client is None:
+        raise RuntimeError(f"OpenAI not available: {openai_error_message or 'client not initialized'}")
+    status = get_openai_status()
+    if not status['available']:
+        raise RuntimeError(f"OpenAI not available: {status['error']}")
+
+def parse_frame_detection_result(result):
+    """Parse the 'frame_type,timeframe' answer. Returns (frame_type, timeframe)."""
+    if ',' not in result:
+        logger.warning('detect.frame_unparsed', answer=result)
+        return "unknown", "D1"  # Default to D1 for unknown charts
+
+    frame_type, timeframe = result.split(',', 1)
+    frame_type = normalize_frame_type(frame_type, result)
+    timeframe = normalize_frame_timeframe(timeframe)
+
+    return frame_type, timeframe
+
+def check_frame_detection(detection):
+    """Escalation reason for a frame detection, or None when it can be trusted."""
+    frame_type, timeframe = detection
+    if frame_type == 'unknown':
+        return "frame type unknown"
+    if timeframe not in FRAME_TIMEFRAME_VOCABULARY:
+        return f"timeframe '{timeframe}' outside vocabulary"
+    return None
+
 def detect_investing_frame(image_str, image_format):
     """
     Enhanced frame detection for multiple platforms including stock charts
+    Runs on the routed model tiers, escalating on unknown/unrecognized answers
     Returns: (frame_type, timeframe)
     """
     try:
-        print("🔄 ENHANCED FRAME DETECTION: Detecting frame type...")
+        system_prompt = FRAME_DETECTION_SYSTEM
 
-        system_prompt = """
-        You are a professional trading chart analyzer. Your task is to detect the trading platform frame and identify the timeframe.
-
-        **PLATFORM SIGNATURES TO LOOK FOR:**
-
-        **INVESTING.COM SIGNATURES:**
-        - "Investing" text anywhere
-        - "powered by TradingView" 
-        - "NASDAQ", "NYSE", or other stock exchange names
-        - Company names like "Tesla", "Apple", etc.
-        - Volume displayed as "1.387M" format
-        - Specific layout with time selection buttons
-
-        **TRADING.COM MOBILE APP SIGNATURES:**
-        - Mobile app layout with bottom navigation
-        - Bottom tabs: "Watchlist", "Chart", "Explore", "Community", "Menu"
-        - Top bar with asset name and price (e.g., "Bitcoin 112,042.86")
-        - Buy/Sell buttons visible
-        - Simple chart with EMA indicators
-        - Volume displayed as "Vol : BTC" format
-
-        **STOCK CHART SIGNATURES:**
-        - Simple line charts with price data
-        - Time periods: "1 day", "5 days", "1 month", "6 months", "Year to date"
-        - Percentage changes: "0.24%", "0.99%", "2.61%", etc.
-        - "Prev close" information
-        - Price ranges like "6,880.00", "6,841.89", etc.
-        - Date labels like "Oct 10 21 30"
-        - Minimal trading indicators
-
-        **METATRADER SIGNATURES:**
-        - "MetaTrader" or "MT4" or "MT5" text
-        - Toolbar with technical indicators
-        - Multiple timeframes in top bar
-        - Standard MT4/MT5 layout
-
-        **TIMEFRAME DETECTION FOR ALL PLATFORMS:**
-        - Look for explicit timeframe indicators: "15", "30", "1H", "4H", "1D", "1W", "1M"
-        - For stock charts: "1 day" = D1, "5 days" = D5, "1 month" = MN, "6 months" = 6MN
-        - Check top areas where timeframe buttons are typically located
-        - "15" typically means M15 (15 minutes)
-        - "1H" means H1 (1 hour)
-        - "4H" means H4 (4 hours)
-        - If no explicit timeframe, infer from chart density and time labels
-
-        **CRITICAL INSTRUCTIONS:**
-        - If you see ANY platform signatures, return the platform name as frame type
-        - For stock charts with period labels, return "stock_chart" as frame type
-        - Detect the timeframe and return it in standard format (M15, H1, H4, D1, W1, MN, etc.)
-        - If timeframe cannot be determined, return "UNKNOWN" for timeframe
-        - **NEVER return error messages or apologies**
-        - **ALWAYS return a timeframe even if inferred**
-
-        Return format: "frame_type,timeframe"
-        Example: "investing,M15" or "stock_chart,D1" or "trading_app,H4" or "unknown,UNKNOWN"
-        """
-
-        response = create_openai_chat_completion(
-            action_type="detect_investing_frame",
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Analyze this chart image for platform signatures and detect the timeframe. Return ONLY in format: 'frame_type,timeframe'"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/{image_format};base64,{image_str}",
-                                "detail": VISION_IMAGE_DETAIL
+        def classify(model):
+            response = create_openai_chat_completion(
+                action_type="detect_investing_frame",
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": FRAME_DETECTION_USER
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/{image_format};base64,{image_str}",
+                                    "detail": VISION_IMAGE_DETAIL
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=100,
-            temperature=0.1,
-            request_mode="vision",
-            image_detail=VISION_IMAGE_DETAIL
-        )
+                        ]
+                    }
+                ],
+                max_tokens=100,
+                temperature=0.1,
+                request_mode="vision",
+                image_detail=VISION_IMAGE_DETAIL,
+                hedge=True
+            )
 
-        result = response.choices[0].message.content.strip()
-        print(f"🔄 RAW frame detection result: '{result}'")
-
-        # Parse the result
-        if ',' in result:
-            frame_type, timeframe = result.split(',', 1)
-            frame_type = frame_type.strip().lower()
-            timeframe = timeframe.strip().upper()
-            
-            # Enhanced timeframe mapping for stock charts
-            timeframe_mapping = {
-                '15': 'M15', '30': 'M30', '1H': 'H1', '4H': 'H4', 
-                '1D': 'D1', '1DAY': 'D1', 'DAILY': 'D1',
-                '5D': 'D5', '5DAY': 'D5', 
-                '1W': 'W1', '1WEEK': 'W1', 'WEEKLY': 'W1',
-                '1M': 'MN', '1MONTH': 'MN', 'MONTHLY': 'MN',
-                '6M': '6MN', '6MONTH': '6MN',
-                'YTD': 'YTD', 'YEAR': 'YTD'
-            }
-            
-            if timeframe in timeframe_mapping:
-                timeframe = timeframe_mapping[timeframe]
-            
-            # Validate frame_type
-            valid_frame_types = ['investing', 'trading_app', 'metatrader', 'stock_chart', 'unknown']
-            if frame_type not in valid_frame_types:
-                # Auto-classify based on timeframe if frame type is unclear
-                if any(stock_indicator in result for stock_indicator in ['1 day', '5 days', '1 month', '6 months', 'Prev close']):
-                    frame_type = 'stock_chart'
-                else:
-                    frame_type = 'unknown'
-            
-            print(f"🔄 PARSED: Frame type: '{frame_type}', Timeframe: '{timeframe}'")
-            return frame_type, timeframe
-        else:
-            print(f"🔄 ❌ Invalid format from frame detection: '{result}'")
-            return "unknown", "D1"  # Default to D1 for unknown charts
+            result = response.choices[0].message.content.strip()
+            logger.debug('detect.frame_answer', model=model, answer=result)
+            return parse_frame_detection_result(result)
+
+        return run_model_route("detect_investing_frame", classify, check_frame_detection)
 
     except Exception as e:
-        print(f"ERROR: Frame detection failed: {str(e)}")
+        logger.exception('detect.frame_failed', error=str(e))
         return "unknown", "D1"  # Default to daily timeframe
 
 def extract_investing_data(image_str, image_format):
@@ -629,8 +842,6 @@ def extract_investing_data(image_str, image_format):
     Returns: dictionary with extracted data
     """
     try:
-        print("📊 ENHANCED DATA EXTRACTION: Extracting data from chart...")
-
         system_prompt = """
         You are a professional trading data extractor. Your task is to extract key trading data from various trading platforms.
 
@@ -658,7 +869,7 @@ def extract_investing_data(image_str, image_format):
 
         response = create_openai_chat_completion(
             action_type="extract_investing_data",
-            model="gpt-4o",
+            model=get_primary_model("extract_investing_data"),
             messages=[
                 {
                     "role": "system",
@@ -688,7 +899,7 @@ def extract_investing_data(image_str, image_format):
         )
 
         extracted_data_text = response.choices[0].message.content.strip()
-        print(f"📊 RAW data extraction: '{extracted_data_text}'")
+        logger.body('extract.data_answer', extracted_data_text)
 
         # Enhanced parsing for different platforms
         data = {
@@ -720,131 +931,82 @@ def extract_investing_data(image_str, image_format):
             except:
                 pass
 
-        print(f"📊 EXTRACTED DATA: {data}")
+        logger.info('extract.data', asset_name=data['asset_name'], current_price=data['current_price'])
         return data
 
     except Exception as e:
-        print(f"ERROR: Data extraction failed: {str(e)}")
+        logger.exception('extract.data_failed', error=str(e))
         return {}
 
-def detect_currency_from_image(image_str, image_format):
+def normalize_symbol_response(detected_symbol):
+    """Clean a raw symbol answer into the canonical form, or 'UNKNOWN'."""
+    cleaned_symbol = normalize_symbol(detected_symbol)
+    if cleaned_symbol == 'UNKNOWN':
+        logger.info('detect.symbol_unusable', answer=detected_symbol)
+    return cleaned_symbol
+
+def detect_currency_from_image(image_str, image_format, expected_currency=None):
     """
     Detect the currency pair or stock symbol from the chart image
+    Escalates to the next model tier on UNKNOWN, a malformed symbol, or a
+    disagreement with expected_currency (e.g. the first chart's pair)
     Returns: (symbol, error_message)
     """
     try:
-        print("🪙 ENHANCED SYMBOL DETECTION: Detecting symbol from image...")
-
-        system_prompt = """
-        You are a professional trading chart analyzer. Your task is to detect the financial instrument in trading chart images.
-
-        You MUST check ALL these areas thoroughly:
-
-        **MAIN AREAS TO CHECK:**
-        - Chart title/header (most common)
-        - Top left corner
-        - Top right corner  
-        - Top center area
-        - Chart legend or label
-        - Price labels and axis
-        - Any text displaying symbols or names
-
-        **INSTRUMENT FORMATS TO LOOK FOR:**
-        - **Forex pairs:** EUR/USD, GBP/USD, USD/JPY, USD/CHF, AUD/USD, USD/CAD, NZD/USD
-        - **Crypto:** BTC/USD, ETH/USD, XRP/USD, etc.
-        - **Stocks/Indices:** SPX, SPY, AAPL, TSLA, NASDAQ, DOW, NQ, ES (S&P 500)
-        - **Commodities:** XAU/USD (Gold), XAG/USD (Silver), OIL, WTI, BRENT
-        - **With or without slash:** EURUSD, EUR/USD, SPX, AAPL
-
-        **STOCK CHART SPECIFIC:**
-        - Look for index names: S&P 500, SPX, SPY, NASDAQ, DOW
-        - Look for stock tickers: AAPL, TSLA, GOOGL, MSFT, etc.
-        - Check price ranges that might indicate the instrument
-        - Look for any company names or index names
-
-        **CRITICAL INSTRUCTIONS:**
-        - Scan the ENTIRE image systematically for instrument identification
-        - Look for text that appears to be a financial instrument name
-        - Focus on areas that typically show the instrument name
-        - If you find ANY instrument indicator, return it in standard format
-        - For stocks/indices, return the ticker symbol (SPX, AAPL, etc.)
-        - If no clear instrument is found after thorough search, return 'UNKNOWN'
-        - Only make a best-effort identification when the chart contains a credible instrument clue
-
-        Return ONLY the instrument symbol in standard format.
-        """
+        system_prompt = CURRENCY_DETECTION_SYSTEM
 
-        response = create_openai_chat_completion(
-            action_type="detect_currency",
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Perform a COMPREHENSIVE search for the financial instrument in this trading chart. Check ALL areas thoroughly. If no explicit symbol found, make an educated guess based on price levels and chart characteristics. Return ONLY the instrument symbol."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/{image_format};base64,{image_str}",
-                                "detail": VISION_IMAGE_DETAIL
+        def classify(model):
+            response = create_openai_chat_completion(
+                action_type="detect_currency",
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": CURRENCY_DETECTION_USER
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/{image_format};base64,{image_str}",
+                                    "detail": VISION_IMAGE_DETAIL
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=150,
-            temperature=0.1,
-            request_mode="vision",
-            image_detail=VISION_IMAGE_DETAIL
-        )
+                        ]
+                    }
+                ],
+                max_tokens=150,
+                temperature=0.1,
+                request_mode="vision",
+                image_detail=VISION_IMAGE_DETAIL,
+                hedge=True
+            )
 
-        detected_symbol = response.choices[0].message.content.strip().upper()
-        print(f"🪙 RAW symbol detection result: '{detected_symbol}'")
+            detected_symbol = response.choices[0].message.content.strip().upper()
+            logger.debug('detect.symbol_answer', model=model, answer=detected_symbol)
+            return normalize_symbol_response(detected_symbol)
 
-        # Enhanced cleaning and standardization
-        cleaned_symbol = detected_symbol.replace(' ', '').replace('"', '').replace("'", "")
-        
-        # Add slash if missing for forex pairs (e.g., EURUSD -> EUR/USD)
-        if len(cleaned_symbol) == 6 and '/' not in cleaned_symbol:
-            # Common forex pairs
-            forex_pairs = ['EURUSD', 'GBPUSD', 'USDJPY', 'USDCHF', 'AUDUSD', 'USDCAD', 'NZDUSD']
-            if cleaned_symbol in forex_pairs:
-                cleaned_symbol = f"{cleaned_symbol[:3]}/{cleaned_symbol[3:]}"
-        
-        # Handle common stock/index symbols
-        symbol_mapping = {
-            'S&P500': 'SPX', 'S&P': 'SPX', 'SP500': 'SPX',
-            'DOW': 'DOW', 'DJI': 'DOW', 
-            'NASDAQ': 'NQ', 'NQ100': 'NQ',
-            'GOLD': 'XAU/USD', 'XAU': 'XAU/USD',
-            'SILVER': 'XAG/USD', 'XAG': 'XAG/USD',
-            'OIL': 'WTI', 'CRUDE': 'WTI'
-        }
-        
-        if cleaned_symbol in symbol_mapping:
-            cleaned_symbol = symbol_mapping[cleaned_symbol]
-        
-        cleaned_symbol = canonicalize_instrument_symbol(cleaned_symbol)
-        
-        print(f"🪙 Cleaned symbol: '{cleaned_symbol}'")
+        expected_symbol = canonicalize_symbol(expected_currency)
 
-        # Validate it's a reasonable symbol
-        if len(cleaned_symbol) >= 2 and len(cleaned_symbol) <= 10:
-            print(f"🪙 ✅ Valid symbol detected: '{cleaned_symbol}'")
-            return cleaned_symbol, None
-        else:
-            print(f"🪙 ⚠️ Questionable symbol detected, returning UNKNOWN: '{cleaned_symbol}'")
-            return 'UNKNOWN', None
+        def check(symbol):
+            if symbol == 'UNKNOWN':
+                return "symbol unknown"
+            if not is_recognized_instrument(symbol):
+                return f"symbol '{symbol}' outside vocabulary"
+            if expected_symbol != 'UNKNOWN' and instrument_key(symbol) != instrument_key(expected_symbol):
+                return f"symbol '{symbol}' disagrees with expected '{expected_symbol}'"
+            return None
+
+        return run_model_route("detect_currency", classify, check), None
 
     except Exception as e:
-        print(f"ERROR: Symbol detection failed: {str(e)}")
+        logger.exception('detect.symbol_failed', error=str(e))
         return 'UNKNOWN', None
 
 def validate_currency_consistency(first_currency, second_currency):
@@ -853,207 +1015,90 @@ def validate_currency_consistency(first_currency, second_currency):
     Returns: (is_valid, error_message)
     """
     try:
-        print(f"🪙 CURRENCY VALIDATION: First: '{first_currency}', Second: '{second_currency}'")
-
         if first_currency == 'UNKNOWN' or second_currency == 'UNKNOWN':
-            print(f"🪙 ⚠️ Currency validation skipped - one or both currencies unknown")
+            logger.info('currency.validation_skipped', first=first_currency, second=second_currency)
             return True, None  # Skip validation if currency detection failed
 
-        # Normalize currencies for comparison so XAUUSD and XAU/USD match.
-        first_normalized = canonicalize_instrument_symbol(first_currency).replace('/', '')
-        second_normalized = canonicalize_instrument_symbol(second_currency).replace('/', '')
-
-        # Check if they are the same
-        if first_normalized == second_normalized:
-            print(f"🪙 ✅ Currency validation PASSED")
+        # Compare canonical keys so XAUUSD and XAU/USD match
+        if instrument_key(first_currency) == instrument_key(second_currency):
             return True, None
         else:
-            print(f"🪙 ❌ Currency validation FAILED - different currencies")
             return False, f"❌ العملات مختلفة! الصورة الأولى لـ {first_currency} والصورة الثانية لـ {second_currency}.\n\nيرجى إرسال صور لنفس زوج العملات:\n• الصورة الأولى: M15 لـ {first_currency}\n• الصورة الثانية: H4 لـ {first_currency}"
 
     except Exception as e:
-        print(f"ERROR: Currency validation failed: {str(e)}")
+        logger.exception('currency.validation_failed', error=str(e))
         return True, None  # Skip validation on error to avoid blocking users
 
-def detect_timeframe_from_image(image_str, image_format):
+def normalize_timeframe_response(detected_timeframe):
     """
-    Detect the timeframe from the chart image - IMPROVED VERSION
+    Map a raw timeframe answer onto the standard codes
     Better logic to prevent M15 being misclassified as M1
+    Returns: timeframe code or 'UNKNOWN'
+    """
+    timeframe, cleaned_timeframe, stage = match_timeframe(detected_timeframe)
+    logger.debug('detect.timeframe_match', stage=stage, cleaned=cleaned_timeframe, timeframe=timeframe)
+    return timeframe
+
+def detect_timeframe_from_image(image_str, image_format, expected_timeframe=None):
+    """
+    Detect the timeframe from the chart image - IMPROVED VERSION
+    Escalates to the next model tier on UNKNOWN, a code outside the vocabulary,
+    or a disagreement with expected_timeframe
     Returns: (timeframe, error_message)
     """
     try:
-        print("🕵️ IMPROVED timeframe detection from image...")
-
-        system_prompt = """
-        You are a professional trading chart analyzer. Your ONLY task is to detect the timeframe in trading chart images.
-
-        You MUST check ALL these areas thoroughly:
-
-        **TOP AREAS:**
-        - Top left corner (most common)
-        - Top right corner (very common)
-        - Top center/header area
-        - Chart title/header bar
-
-        **BOTTOM AREAS:**
-        - Bottom left corner
-        - Bottom right corner
-        - Bottom center below the chart
-        - X-axis (time axis) labels
-        - Bottom status bar or information panel
-
-        **OTHER AREAS:**
-        - Left side panel/scale area
-        - Right side panel/scale area
-        - Chart information box/overlay
-        - Any text labels anywhere in the image
-
-        **TIMEFRAME FORMATS TO LOOK FOR:**
-        - Standard: M1, M5, M15, M30, H1, H4, D1, W1, MN
-        - Variations: 15M, 15m, 1H, 1h, 4H, 4h, 1D, 1d, 1W, 1w
-        - Full words: 1 Minute, 5 Minutes, 15 Minutes, 30 Minutes, 1 Hour, 4 Hours, Daily, Weekly, Monthly
-        - With labels: TF: M15, Timeframe: H4, Period: D1
-        - Investing.com specific: "15" (means M15), "1H", "4H", etc.
-
-        **CRITICAL INSTRUCTIONS:**
-        - Scan the ENTIRE image systematically from top to bottom, left to right
-        - Pay special attention to bottom areas which are often missed
-        - Look for small text in corners and edges
-        - Check both standard formats and variations
-        - If you find ANY timeframe indicator, return it
-        - If no clear timeframe found after thorough search, return 'UNKNOWN'
-
-        Return ONLY the timeframe code in standard format or 'UNKNOWN'.
-        """
+        system_prompt = TIMEFRAME_DETECTION_SYSTEM
 
-        response = create_openai_chat_completion(
-            action_type="detect_timeframe",
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Perform a COMPREHENSIVE search for the timeframe label in this trading chart. Check ALL areas: top left, top right, top center, bottom left, bottom right, bottom center, x-axis, side panels, and any text labels. Return ONLY the timeframe code like M15, H4, D1 or UNKNOWN if not found after thorough search."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/{image_format};base64,{image_str}",
-                                "detail": VISION_IMAGE_DETAIL
+        def classify(model):
+            response = create_openai_chat_completion(
+                action_type="detect_timeframe",
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": TIMEFRAME_DETECTION_USER
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/{image_format};base64,{image_str}",
+                                    "detail": VISION_IMAGE_DETAIL
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=100,
-            temperature=0.1,
-            request_mode="vision",
-            image_detail=VISION_IMAGE_DETAIL
-        )
+                        ]
+                    }
+                ],
+                max_tokens=100,
+                temperature=0.1,
+                request_mode="vision",
+                image_detail=VISION_IMAGE_DETAIL,
+                hedge=True
+            )
 
-        detected_timeframe = response.choices[0].message.content.strip().upper()
-        print(f"🕵️ RAW timeframe detection result: '{detected_timeframe}'")
-
-        # Enhanced cleaning and validation
-        cleaned_timeframe = detected_timeframe.replace(' ', '').replace('TF:', '').replace('TIMEFRAME:', '').replace('PERIOD:', '').replace('TIMEFRAME', '').replace('PERIOD', '')
-        print(f"🕵️ Cleaned timeframe: '{cleaned_timeframe}'")
-
-        # Comprehensive timeframe mapping - ORDER MATTERS! Check longer strings first
-        timeframe_map = {
-            # M15 variations - CHECK THESE FIRST to prevent M1 false positives
-            '15MINUTES': 'M15', '15MINUTE': 'M15', '15MIN': 'M15', '15M': 'M15', '15m': 'M15', 'M15M': 'M15',
-            # Special case for investing.com "15"
-            '15': 'M15',
-            # M30 variations
-            '30MINUTES': 'M30', '30MINUTE': 'M30', '30MIN': 'M30', '30M': 'M30', '30m': 'M30', 'M30M': 'M30',
-            # H4 variations
-            '4HOURS': 'H4', '4HOUR': 'H4', '4H': 'H4', '4h': 'H4', 'H4H': 'H4', '240M': 'H4',
-            # H1 variations
-            '1HOUR': 'H1', '1H': 'H1', '1h': 'H1', 'H1H': 'H1', '60M': 'H1', '60MIN': 'H1',
-            # D1 variations
-            'DAILY': 'D1', '1DAY': 'D1', '1D': 'D1', '1d': 'D1', 'D1D': 'D1',
-            # W1 variations
-            'WEEKLY': 'W1', '1WEEK': 'W1', '1W': 'W1', '1w': 'W1',
-            # MN variations
-            'MONTHLY': 'MN', '1MONTH': 'MN', 'MN': 'MN',
-            # M5 variations
-            '5MINUTES': 'M5', '5MINUTE': 'M5', '5MIN': 'M5', '5M': 'M5', '5m': 'M5', 'M5M': 'M5',
-            # M1 variations - CHECK THESE LAST to prevent false positives
-            '1MINUTE': 'M1', '1MIN': 'M1', '1M': 'M1', '1m': 'M1', 'M1M': 'M1'
-        }
+            detected_timeframe = response.choices[0].message.content.strip().upper()
+            logger.debug('detect.timeframe_answer', model=model, answer=detected_timeframe)
+            return normalize_timeframe_response(detected_timeframe)
 
-        # Try exact match first - check in order of priority
-        for timeframe_variant, standard_tf in timeframe_map.items():
-            if cleaned_timeframe == timeframe_variant:
-                print(f"🕵️ Exact match: '{cleaned_timeframe}' -> '{standard_tf}'")
-                return standard_tf, None
-
-        # Try partial matches with priority (longer timeframes first)
-        priority_timeframes = ['M15', 'M30', 'H4', 'H1', 'D1', 'W1', 'MN', 'M5', 'M1']
-
-        for tf in priority_timeframes:
-            if tf in cleaned_timeframe:
-                print(f"🕵️ Partial match: found '{tf}' in '{cleaned_timeframe}'")
-                return tf, None
-
-        # Special case: if we see "15" anywhere, prioritize M15
-        if '15' in cleaned_timeframe and any(word in cleaned_timeframe for word in ['M', 'MIN', 'MINUTE']):
-            print(f"🕵️ Special case: '15' found in '{cleaned_timeframe}', returning M15")
-            return 'M15', None
-
-        # Special case: if we see "1" but it's likely part of "15", be careful
-        if '1' in cleaned_timeframe and '15' not in cleaned_timeframe and any(word in cleaned_timeframe for word in ['M', 'MIN', 'MINUTE']):
-            # Only return M1 if we're sure it's not M15
-            if cleaned_timeframe in ['1M', '1MIN', '1MINUTE', 'M1']:
-                print(f"🕵️ Confident M1 detection: '{cleaned_timeframe}'")
-                return 'M1', None
-
-        # Try word-based detection with M15 priority
-        if any(word in cleaned_timeframe for word in ['MINUTE', 'MIN', 'M']):
-            if '15' in cleaned_timeframe or 'FIFTEEN' in cleaned_timeframe:
-                print(f"🕵️ Word-based: M15 detected from '{cleaned_timeframe}'")
-                return 'M15', None
-            elif '30' in cleaned_timeframe or 'THIRTY' in cleaned_timeframe:
-                print(f"🕵️ Word-based: M30 detected from '{cleaned_timeframe}'")
-                return 'M30', None
-            elif '5' in cleaned_timeframe or 'FIVE' in cleaned_timeframe:
-                print(f"🕵️ Word-based: M5 detected from '{cleaned_timeframe}'")
-                return 'M5', None
-            elif '1' in cleaned_timeframe and '15' not in cleaned_timeframe:
-                print(f"🕵️ Word-based: M1 detected from '{cleaned_timeframe}'")
-                return 'M1', None
-
-        if any(word in cleaned_timeframe for word in ['HOUR', 'H']):
-            if '4' in cleaned_timeframe or 'FOUR' in cleaned_timeframe:
-                print(f"🕵️ Word-based: H4 detected from '{cleaned_timeframe}'")
-                return 'H4', None
-            elif '1' in cleaned_timeframe:
-                print(f"🕵️ Word-based: H1 detected from '{cleaned_timeframe}'")
-                return 'H1', None
-
-        if any(word in cleaned_timeframe for word in ['DAY', 'D']):
-            print(f"🕵️ Word-based: D1 detected from '{cleaned_timeframe}'")
-            return 'D1', None
-
-        if any(word in cleaned_timeframe for word in ['WEEK', 'W']):
-            print(f"🕵️ Word-based: W1 detected from '{cleaned_timeframe}'")
-            return 'W1', None
-
-        if any(word in cleaned_timeframe for word in ['MONTH', 'MN']):
-            print(f"🕵️ Word-based: MN detected from '{cleaned_timeframe}'")
-            return 'MN', None
-
-        print(f"🕵️ No valid timeframe found in '{cleaned_timeframe}', returning UNKNOWN")
-        return 'UNKNOWN', None
+        def check(timeframe):
+            if timeframe == 'UNKNOWN':
+                return "timeframe unknown"
+            if timeframe not in TIMEFRAME_VOCABULARY:
+                return f"timeframe '{timeframe}' outside vocabulary"
+            if expected_timeframe and timeframe != expected_timeframe:
+                return f"timeframe '{timeframe}' disagrees with expected '{expected_timeframe}'"
+            return None
+
+        return run_model_route("detect_timeframe", classify, check), None
 
     except Exception as e:
-        print(f"ERROR: Improved timeframe detection failed: {str(e)}")
+        logger.exception('detect.timeframe_failed', error=str(e))
         return 'UNKNOWN', None
 
 def validate_timeframe_for_analysis(image_str, image_format, expected_timeframe):
@@ -1062,36 +1107,106 @@ def validate_timeframe_for_analysis(image_str, image_format, expected_timeframe)
     Returns: (is_valid, error_message)
     """
     try:
-        print(f"🕵️ STRICT VALIDATION: Expecting '{expected_timeframe}'")
-
-        detected_timeframe, detection_error = detect_timeframe_from_image(image_str, image_format)
+        detected_timeframe, detection_error = detect_timeframe_from_image(
+            image_str, image_format, expected_timeframe=expected_timeframe
+        )
 
         if detection_error:
             return False, f"❌ لا يمكن تحليل الإطار الزمني للصورة. يرجى التأكد من أن الصورة تحتوي على إطار {expected_timeframe} واضح."
 
-        print(f"🕵️ Validation Result: Detected '{detected_timeframe}', Expected '{expected_timeframe}'")
+        logger.log(logging.INFO if detected_timeframe == expected_timeframe else logging.WARNING,
+                   'timeframe.validation', expected=expected_timeframe, detected=detected_timeframe)
 
         if detected_timeframe == expected_timeframe:
-            print(f"🕵️ ✅ Validation PASSED")
             return True, None
-        elif detected_timeframe == 'UNKNOWN':
-            print(f"🕵️ ❌ Validation FAILED - No timeframe detected")
-            return False, f"❌ لم يتم العثور على إطار زمني واضح في الصورة. يرجى:\n• التأكد من أن الإطار الزمني ({expected_timeframe}) مرئي في الصورة\n• تحميل صورة أوضح تحتوي على {expected_timeframe}\n• التأكد من أن النص غير مقطوع"
-        else:
-            print(f"🕵️ ❌ Validation FAILED - Wrong timeframe")
-            return False, f"❌ الإطار الزمني الموجود في الصورة هو {detected_timeframe} ولكن المطلوب هو {expected_timeframe}.\n\nيرجى تحميل صورة تحتوي على الإطار الزمني الصحيح:\n• للتحليل الأول: M15 (15 دقيقة)\n• للتحليل الثاني: H4 (4 ساعات)"
+        return False, timeframe_mismatch_message(detected_timeframe, expected_timeframe)
 
     except Exception as e:
-        print(f"ERROR: Timeframe validation failed: {str(e)}")
+        logger.exception('timeframe.validation_failed', error=str(e))
         return False, f"❌ خطأ في التحقق من الإطار الزمني: {str(e)}"
 
+def timeframe_mismatch_message(detected_timeframe, expected_timeframe):
+    """The user-facing error for an M15/H4 chart whose timeframe is missing or wrong."""
+    if detected_timeframe == 'UNKNOWN':
+        return f"❌ لم يتم العثور على إطار زمني واضح في الصورة. يرجى:\n• التأكد من أن الإطار الزمني ({expected_timeframe}) مرئي في الصورة\n• تحميل صورة أوضح تحتوي على {expected_timeframe}\n• التأكد من أن النص غير مقطوع"
+    return f"❌ الإطار الزمني الموجود في الصورة هو {detected_timeframe} ولكن المطلوب هو {expected_timeframe}.\n\nيرجى تحميل صورة تحتوي على الإطار الزمني الصحيح:\n• للتحليل الأول: M15 (15 دقيقة)\n• للتحليل الثاني: H4 (4 ساعات)"
+
+def with_inline_header_request(prompt):
+    """Ask the analysis call to report the chart's timeframe and symbol on its first line."""
+    static_prefix, dynamic_suffix = prompt
+    return f"{static_prefix}\n\n{INLINE_HEADER_INSTRUCTION}", dynamic_suffix
+
+def split_inline_header(text):
+    """
+    Separate the "TF=..;SYMBOL=.." line from the reply. Returns (header, body), where
+    header is {'timeframe', 'symbol'} normalized like the detection answers, or None
+    when the reply does not start with one.
+    """
+    match = INLINE_HEADER_PATTERN.match(text)
+    if not match:
+        return None, text
+    header = {
+        'timeframe': match_timeframe(match.group('timeframe'))[0],
+        'symbol': normalize_symbol(match.group('symbol'))
+    }
+    return header, text[match.end():].strip()
+
+def check_inline_header(text, image_str, image_format, expected_timeframe, currency_pair=None):
+    """
+    Validate the reply's inline timeframe against the expected M15/H4. Returns
+    (body, error_message). Without a header, falls back to the separate detection call.
+    """
+    header, body = split_inline_header(text)
+    return body, check_reported_timeframe(header, image_str, image_format, expected_timeframe, currency_pair)
+
+def check_reported_timeframe(header, image_str, image_format, expected_timeframe, currency_pair=None):
+    """Error message for a header timeframe other than expected_timeframe, else None."""
+    if header is None:
+        logger.warning('timeframe.inline_header_missing', expected=expected_timeframe)
+        is_valid, error_msg = validate_timeframe_for_analysis(image_str, image_format, expected_timeframe)
+        return None if is_valid else error_msg
+
+    timeframe_matches = header['timeframe'] == expected_timeframe
+    symbol_matches = (not currency_pair or header['symbol'] == 'UNKNOWN' or
+                      instrument_key(header['symbol']) == instrument_key(currency_pair))
+    logger.log(logging.INFO if timeframe_matches and symbol_matches else logging.WARNING,
+               'timeframe.validation', source='inline', expected=expected_timeframe,
+               detected=header['timeframe'], symbol=header['symbol'], expected_symbol=currency_pair)
+    if timeframe_matches:
+        return None
+    return timeframe_mismatch_message(header['timeframe'], expected_timeframe)
+
+def with_structured_output_request(prompt):
+    """Ask the analysis call for the JSON object services.analysis_renderer renders."""
+    static_prefix, dynamic_suffix = prompt
+    return f"{static_prefix}\n\n{STRUCTURED_OUTPUT_INSTRUCTION}", dynamic_suffix
+
+def structured_header(analysis_data):
+    """The chart_timeframe/chart_symbol a structured analysis reports, shaped like split_inline_header's."""
+    if not analysis_data['chart_timeframe']:
+        return None
+    return {
+        'timeframe': match_timeframe(analysis_data['chart_timeframe'])[0],
+        'symbol': normalize_symbol(analysis_data['chart_symbol'] or 'UNKNOWN')
+    }
+
+def remember_structured_analysis(action_type, analysis_data):
+    if has_request_context():
+        g.setdefault('structured_analyses', {})[action_type] = analysis_data
+
+def get_structured_analysis(action_type):
+    """The parsed JSON behind this request's rendered analysis of action_type, or None."""
+    if not has_request_context():
+        return None
+    return g.get('structured_analyses', {}).get(action_type)
+
 def analyze_simple_chart_fallback(image_str, image_format, timeframe, currency_pair):
     """
     Fallback analysis for simple charts when OpenAI refuses
     """
     try:
-        print("🔄 FALLBACK ANALYSIS: Using fallback for simple chart...")
-        
+        logger.info('fallback.started', timeframe=timeframe, currency_pair=currency_pair)
+
         fallback_prompt = f"""
         هذا رسم بياني بسيط للأداة {currency_pair} على الإطار {timeframe}. 
         حتى مع محدودية البيانات، قدم تحليلاً تقنياً أساسياً:
@@ -1109,7 +1224,7 @@ def analyze_simple_chart_fallback(image_str, image_format, timeframe, currency_p
         
         response = create_openai_chat_completion(
             action_type="simple_chart_fallback",
-            model="gpt-4o",
+            model=get_primary_model("simple_chart_fallback"),
             messages=[
                 {
                     "role": "system", 
@@ -1135,11 +1250,11 @@ def analyze_simple_chart_fallback(image_str, image_format, timeframe, currency_p
         )
         
         analysis = response.choices[0].message.content.strip()
-        print(f"🔄 FALLBACK ANALYSIS: ✅ Completed, length: {len(analysis)} chars")
+        logger.info('fallback.completed', chars=len(analysis))
         return analysis
         
     except Exception as e:
-        print(f"ERROR: Fallback analysis failed: {str(e)}")
+        logger.exception('fallback.failed', error=str(e))
         # Ultimate fallback
         return f"""
         📊 تحليل {currency_pair} على الإطار {timeframe}:
@@ -1156,320 +1271,293 @@ def analyze_simple_chart_fallback(image_str, image_format, timeframe, currency_p
         ⚠️ ملاحظة: هذا تحليل عام، المراقبة المستمرة مطلوبة.
         """
 
+def build_stop_loss_instruction(currency_pair):
+    """Gold uses a 2-5 pip stop loss cap, everything else 20-50 pips."""
+    # 🟡 SPECIAL STOP LOSS FOR GOLD vs OTHER PAIRS
+    if currency_pair and currency_pair.upper() in ['XAU/USD', 'XAUUSD', 'GOLD']:
+        return GOLD_STOP_LOSS_INSTRUCTION
+    return STANDARD_STOP_LOSS_INSTRUCTION
+
+def build_analysis_prompt(timeframe=None, previous_analysis=None, user_analysis=None,
+                          action_type="chart_analysis", currency_pair=None):
+    """Pick the registered analysis prompt for this step; returns (static_prefix, dynamic_suffix)."""
+    if action_type == "user_analysis_feedback":
+        return render_prompt('user_analysis_feedback', user_analysis=user_analysis)
+
+    stop_loss_instruction = build_stop_loss_instruction(currency_pair)
+
+    if action_type == "single_analysis":
+        return render_prompt('single_analysis', timeframe=timeframe, currency_pair=currency_pair,
+                             stop_loss_instruction=stop_loss_instruction)
+
+    if timeframe == "H4" and previous_analysis:
+        return render_prompt('h4_analysis', previous_analysis=previous_analysis,
+                             stop_loss_instruction=stop_loss_instruction)
+
+    if action_type == "final_analysis":
+        return render_prompt('final_analysis', previous_analysis=previous_analysis, user_analysis=user_analysis,
+                             stop_loss_instruction=stop_loss_instruction)
+
+    # First analysis with detailed prompt
+    return render_prompt('first_analysis', timeframe=timeframe, stop_loss_instruction=stop_loss_instruction)
+
+def build_prompt_messages(prompt, image_str=None, image_format=None):
+    """Static prefix as the system message, dynamic suffix (and image) as the user message."""
+    static_prefix, dynamic_suffix = prompt
+    system_message = {"role": "system", "content": static_prefix}
+    if not image_str:
+        return [system_message, {"role": "user", "content": dynamic_suffix}]
+
+    return [
+        system_message,
+        {"role": "user", "content": [
+            {"type": "text", "text": dynamic_suffix},
+            {"type": "image_url", "image_url": {"url": f"data:image/{image_format.lower()};base64,{image_str}", "detail": VISION_IMAGE_DETAIL}}
+        ]}
+    ]
+
+def prompt_length(prompt):
+    return sum(len(part) for part in prompt)
+
 def analyze_with_openai(image_str, image_format, timeframe=None, previous_analysis=None, user_analysis=None, action_type="chart_analysis", currency_pair=None):
     """
     Analyze an image or text using OpenAI with enhanced, detailed analysis.
     STRICTLY ENFORCES 1024 CHARACTER LIMIT AND 50 PIP STOP LOSS
+    In structured mode the model answers in JSON and the text is rendered locally
+    within the limit; the JSON stays available through get_structured_analysis.
     """
     global client
 
-    if not OPENAI_AVAILABLE:
-        raise RuntimeError(f"OpenAI not available: {openai_error_message}")
+    ensure_openai_available()
 
-    # STRICT validation for first and second analysis
+    # STRICT validation for first and second analysis: a separate detection call,
+    # or the analysis call's own header line in inline mode
+    expected_timeframe = None
+    inline_check = False
     if image_str and action_type in ['first_analysis', 'second_analysis']:
         expected_timeframe = 'M15' if action_type == 'first_analysis' else 'H4'
-        is_valid, error_msg = validate_timeframe_for_analysis(image_str, image_format, expected_timeframe)
-        if not is_valid:
-            return error_msg
+        inline_check = Config.INLINE_TIMEFRAME_CHECK_ENABLED
+        if not inline_check:
+            is_valid, error_msg = validate_timeframe_for_analysis(image_str, image_format, expected_timeframe)
+            if not is_valid:
+                return error_msg
 
     # ALL ANALYSIS TYPES STRICTLY LIMITED TO 1024 CHARACTERS
     char_limit = 1024
     max_tokens = 600
+    structured = Config.STRUCTURED_ANALYSIS_ENABLED and action_type in STRUCTURED_ACTION_TYPES
 
-    # 🟡 SPECIAL STOP LOSS FOR GOLD vs OTHER PAIRS
-    if currency_pair and currency_pair.upper() in ['XAU/USD', 'XAUUSD', 'GOLD']:
-        stop_loss_instruction = """
-        **🟡 إعدادات وقف الخسارة الإلزامية للذهب (XAU/USD):**
-        - **انتبه: الذهب مختلف عن العملات! كل 1 نقطة في الذهب = 10 نقاط في العملات العادية**
-        - **الحد الأقصى المطلق: 5 نقاط فقط للذهب (تعادل 50 نقطة في العملات)**
-        - **ممنوع منعاً باتاً تجاوز 5 نقاط للذهب تحت أي ظرف**
-        - **يجب أن يكون وقف الخسارة بين 2-5 نقاط للذهب حسب التقلب**
-        - **إذا تطلب السوق أكثر من 5 نقاط للذهب، لا تقدم توصية بالتداول**
-        - **السبب: حماية رأس المال - 5 نقاط ذهب = 50 نقطة فعلية**
-        """
-        print("🟡 GOLD DETECTED: Using special stop loss rules (2-5 pips)")
-    else:
-        stop_loss_instruction = """
-        **🛑 إعدادات وقف الخسارة الإلزامية:**
-        - **الحد الأقصى المطلق: 50 نقطة فقط**
-        - **ممنوع منعاً باتاً تجاوز 50 نقطة تحت أي ظرف**
-        - **يجب أن يكون وقف الخسارة بين 20-50 نقطة حسب التقلب**
-        - **إذا تطلب السوق أكثر من 50 نقطة، لا تقدم توصية بالتداول**
-        - **السبب: حماية رأس المال ومنع المخاطرة العالية**
-        """
-        print("🟢 REGULAR CURRENCY: Using standard stop loss rules (20-50 pips)")
-
-    if action_type == "user_analysis_feedback":
-        analysis_prompt = f"""
-أنت خبير تحليل فني صارم وصادق. قم بتقييم تحليل المستخدم التالي بصدق وموضوعية.
-
-تحليل المستخدم:
-{user_analysis}
-
-**تعليمات صارمة:**
-1. قيم التحليل بناءً على الدقة الفنية والمنطق
-2. كن صادقًا وواضحًا - إذا كان التحليل ضعيفًا أو خاطئًا، قل ذلك بوضوح
-3. لا تبالغ في الإيجابيات إذا كانت غير موجودة
-4. ركز على الأخطاء الجسيمة في التفكير التحليلي
-5. قدم نقدًا بناءً مع حلول عملية
-
-**مهمتك:**
-- قدم تقييماً موضوعياً في حدود 1000 حرف فقط
-- لا تتجاوز 1024 حرف تحت أي ظرف
-- كن مباشراً وواضحاً
-- ركز على النقاط الأساسية
-
-**لا تضف عدد الأحرف في نهاية الرد.**
-"""
-
-    elif action_type == "single_analysis":
-        analysis_prompt = f"""
-أنت محلل فني محترف متخصص في تحليل الأسواق المالية. مهمتك تحليل الرسم البياني المقدم وتقديم توصيات عملية.
-
-**معلومات الرسم البياني:**
-- الإطار الزمني: {timeframe}
-- الأداة المالية: {currency_pair}
-
-**المطلوب تحليل كامل يتضمن:**
-
-### 📊 التحليل الفني الأساسي
-**📈 اتجاه السوق:** حدد الاتجاه العام (صاعد/هابط/جانبي)
-**🛡️ الدعم والمقاومة:** حدد المستويات الرئيسية
-**📊 حركة السعر:** حلل نمط الشموع/الخط
-
-### 💡 التوصيات العملية الإلزامية
-**يجب تقديم توصية واضحة بناءً على التحليل:**
-
-{stop_loss_instruction}
-
-**التعليمات الصارمة:**
-- **ممنوع رفض التحليل** - يجب تقديم تحليل بناءً على البيانات المتاحة
-- **يجب تقديم توصية تداول واضحة** حتى لو كانت تحذيرية
-- **ركز على التحليل الفني الأساسي** إذا كانت البيانات محدودة
-- **استخدم مستويات الدعم والمقاومة الظاهرة** في الرسم
-- **قدم إطار زمني للتوصية** (مثال: خلال اليوم/الجلسة القادمة)
-- **التزم بـ 1000 حرف كحد أقصى**
-- **لا تتجاوز 1024 حرف بأي حال**
-
-**إذا كان الرسم البياني بسيطاً:** ركز على:
-1. تحليل الاتجاه من الشكل العام
-2. تحديد أقوى مستويات الدعم والمقاومة
-3. تقديم توصية مع وقف خسارة مناسب
-4. ذكر نسبة المخاطرة إلى العائد المتوقعة
-
-**لا ترفض التحليل أبداً - قدم أفضل تحليل ممكن بناءً على البيانات المتوفرة.**
-"""
-
-    elif timeframe == "H4" and previous_analysis:
-        analysis_prompt = f"""
-أنت محلل فني محترف. قدم تحليلاً شاملاً يجمع بين الإطارين الزمنيين.
-
-التحليل السابق (15 دقيقة): {previous_analysis}
-
-**المطلوب تحليل شامل يتضمن:**
-
-### 📊 التحليل الفني الشامل
-**1. تحليل فيبوناتشي الرئيسية**
-**2. الدعم والمقاومة الحرجة**
-**3. تحليل السيولة باستخدام SMC وICT**
-**4. قاتل الجلسات (SK) ومناطق الاختراق**
-**5. التوصيات العملية:**
-- نقاط الدخول
-
-{stop_loss_instruction}
-
-- أهداف جني الأرباح (نسبة مخاطرة إلى عائد 1:2 على الأقل)
-
-**التعليمات الإلزامية:**
-- التزم بـ 1000 حرف كحد أقصى
-- لا تتجاوز 1024 حرف بأي حال
-- ركز على الدمج بين الإطارين
-- قدم توصيات عملية مباشرة
-- **ممنوع منعاً باتاً اقتراح وقف خسارة أكثر من الحد المسموح**
-- **لا تضف عدد الأحرف في نهاية الرد**
-"""
-
-    elif action_type == "final_analysis":
-        analysis_prompt = f"""
-أنت خبير تحليل فني محترف. قم بتحليل شامل بناءً على التحليلين السابقين.
-
-التحليل الأول (M15): {previous_analysis}
-
-التحليل الثاني (H4): {user_analysis}
-
-**المطلوب تحليل نهائي متكامل يتضمن:**
-
-### 📈 التحليل الشامل
-**🎯 الاتجاه العام وهيكل السوق:**
-**📊 مستويات فيبوناتشي الحرجة:**
-**🛡️ الدعم والمقاومة الرئيسية:**
-**💧 تحليل SMC وICT:**
-- مناطق السيولة (Liquidity)
-- أوامر التجميع (Order Blocks)
-- قاتل الجلسات (Session Killers)
-- مناطق العرض والطلب (Supply/Demand)
-
-**💼 التوصيات الاستراتيجية:**
-- نقاط الدخول الاستراتيجية
-
-{stop_loss_instruction}
-
-- أهداف جني الأرباح (نسبة مخاطرة إلى العائد 1:2 كحد أدنى)
-
-**التعليمات الإلزامية:**
-- التزم بـ 1000 حرف كحد أقصى
-- لا تتجاوز 1024 حرف بأي حال
-- ركز على دمج التحليلين واستخراج التوصيات العملية النهائية
-- كن مباشراً وواضحاً
-- **ممنوع منعاً باتاً اقتراح وقف خسارة أكثر من الحد المسموح**
-- **لا تضف عدد الأحرف في نهاية الرد**
-"""
-
-    else:
-        # First analysis with detailed prompt
-        analysis_prompt = f"""
-أنت محلل فني محترف متخصص في تحليل العملات. قدم تحليلاً شاملاً للرسم البياني.
-
-**المطلوب تحليل كامل يتضمن:**
-
-### 📊 التحليل الفني لشارت {timeframe}
-**🎯 الاتجاه العام وهيكل السوق:**
-**📊 مستويات فيبوناتشي الرئيسية:**
-**🛡️ الدعم والمقاومة الحرجة:**
-**💧 تحليل السيولة باستخدام SMC وICT:**
-- مناطق السيولة (Liquidity)
-- أوامر التجميع (Order Blocks)
-- قاتل الجلسات (Session Killers)
-- مناطق الاختراق (Breaker Blocks)
-
-**⚡ التوصيات العملية الفورية:**
-- نقاط الدخول القريبة
-
-{stop_loss_instruction}
-
-- أهداف جني الأرباح (نسبة مخاطرة إلى العائد 1:2 كحد أدنى)
-
-**التعليمات الإلزامية:**
-- التزم بـ 1000 حرف كحد أقصى
-- لا تتجاوز 1024 حرف بأي حال
-- ركز على التوصيات خلال 5-15 دقيقة
-- كن مباشراً وواضحاً
-- **ممنوع منعاً باتاً اقتراح وقف خسارة أكثر من الحد المسموح**
-- **لا تضف عدد الأحرف في نهاية الرد**
-"""
+    base_prompt = build_analysis_prompt(timeframe, previous_analysis, user_analysis, action_type, currency_pair)
 
     if not client:
         raise RuntimeError("OpenAI client not initialized")
 
-    try:
-        import time
-        start_time = time.time()
+    def request_analysis(structured_output):
+        # Structured replies carry chart_timeframe themselves; prose replies get the header line
+        if structured_output:
+            analysis_prompt = with_structured_output_request(base_prompt)
+        elif inline_check:
+            analysis_prompt = with_inline_header_request(base_prompt)
+        else:
+            analysis_prompt = base_prompt
 
-        # Add pre-call logging
-        print(f"🔍 OPENAI PRE-REQUEST: {action_type}")
-        print(f"🔍 Prompt length: {len(analysis_prompt)} characters")
-        print(f"🔍 Max tokens: {max_tokens}")
+        logger.info('openai.analysis_request', action_type=action_type, has_image=bool(image_str),
+                    prompt_chars=prompt_length(analysis_prompt),
+                    max_tokens=STRUCTURED_MAX_TOKENS if structured_output else max_tokens,
+                    structured=structured_output)
 
         if image_str:
-            print(f"🚨 OPENAI ANALYSIS: Analyzing image with {action_type}")
-            response = create_openai_chat_completion(
+            return create_openai_chat_completion(
                 action_type=action_type,
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": f"أنت محلل فني محترف. التزم بعدم تجاوز {char_limit} حرف في ردك. لا تضف عدد الأحرف في النهاية."},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": analysis_prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/{image_format.lower()};base64,{image_str}", "detail": VISION_IMAGE_DETAIL}}
-                    ]}
-                ],
-                max_tokens=max_tokens,
+                model=get_primary_model(action_type),
+                messages=build_prompt_messages(analysis_prompt, image_str, image_format),
+                max_tokens=STRUCTURED_MAX_TOKENS if structured_output else max_tokens,
+                adaptive_max_tokens=not structured_output,
                 temperature=0.7,
                 timeout=30,
                 request_mode="vision",
                 image_detail=VISION_IMAGE_DETAIL,
                 timeframe=timeframe,
-                currency_pair=currency_pair
-            )
-        else:
-            print(f"🚨 OPENAI ANALYSIS: Analyzing text with {action_type}")
-            response = create_openai_chat_completion(
-                action_type=action_type,
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": f"أنت محلل فني محترف. التزم بعدم تجاوز {char_limit} حرف في ردك. لا تضف عدد الأحرف في النهاية."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7,
-                timeout=20,
-                request_mode="text",
-                timeframe=timeframe,
-                currency_pair=currency_pair
+                currency_pair=currency_pair,
+                response_format={"type": "json_object"} if structured_output else None
             )
+        return create_openai_chat_completion(
+            action_type=action_type,
+            model=get_primary_model(action_type),
+            messages=build_prompt_messages(analysis_prompt),
+            max_tokens=STRUCTURED_MAX_TOKENS if structured_output else max_tokens,
+            adaptive_max_tokens=not structured_output,
+            temperature=0.7,
+            timeout=20,
+            request_mode="text",
+            timeframe=timeframe,
+            currency_pair=currency_pair,
+            response_format={"type": "json_object"} if structured_output else None
+        )
+
+    try:
+        import time
+        start_time = time.time()
 
+        response = request_analysis(structured)
         analysis = response.choices[0].message.content.strip()
-        processing_time = time.time() - start_time
 
-        # Enhanced token usage logging
-        if response.usage:
-            print(f"🔢 Token Usage - Prompt: {response.usage.prompt_tokens}, Completion: {response.usage.completion_tokens}, Total: {response.usage.total_tokens}")
-            print(f"🔢 Max Tokens Limit: {max_tokens}, Completion Used: {response.usage.completion_tokens}/{max_tokens}")
-        else:
-            print("🔢 Token Usage: Not available")
-
-        # Comprehensive logging
-        print(f"\n{'='*60}")
-        print(f"🚨 OPENAI RAW RESPONSE - {action_type.upper()}")
-        print(f"{'='*60}")
-        print(f"⏰ Processing time: {processing_time:.2f}s")
-        print(f"📊 Response length: {len(analysis)} characters")
-        print(f"📝 Full content:")
-        print(f"{'-'*40}")
-        print(analysis)
-        print(f"{'-'*40}")
-        print(f"{'='*60}\n")
-
-        # Check for truncation indicators
-        if '...' in analysis[-10:] or len(analysis) >= 1020:
-            print("⚠️ WARNING: Response might be truncated!")
-
-        # Log the full response
-        log_openai_response(action_type, analysis)
+        analysis_data = None
+        if structured:
+            analysis_data = parse_structured_analysis(analysis)
+            if analysis_data is None:
+                # Cut-off or off-schema JSON: ask again for prose, which the length fitter can handle
+                logger.warning('analysis.structured_unusable', action_type=action_type, chars=len(analysis))
+                logger.body('analysis.structured_body', analysis, action_type=action_type)
+                response = request_analysis(False)
+                analysis = response.choices[0].message.content.strip()
+        logger.debug('openai.analysis_timing', action_type=action_type, seconds=time.time() - start_time)
+
+        if inline_check:
+            # A mismatch discards the analysis and returns the same error the separate check gives
+            if analysis_data is not None:
+                error_msg = check_reported_timeframe(structured_header(analysis_data), image_str, image_format,
+                                                     expected_timeframe, currency_pair)
+            else:
+                analysis, error_msg = check_inline_header(analysis, image_str, image_format, expected_timeframe, currency_pair)
+            if error_msg:
+                return error_msg
+
+        if analysis_data is not None:
+            logger.body('analysis.structured_body', analysis, action_type=action_type)
+            rendered = render_analysis(analysis_data, char_limit)
+            logger.info('analysis.rendered', action_type=action_type, json_chars=len(analysis),
+                        chars=len(rendered['text']), stage=rendered['stage'])
+            analysis = rendered['text']
+            remember_structured_analysis(action_type, analysis_data)
+
+        log_openai_response(action_type, analysis, char_limit, response=response,
+                            max_tokens=STRUCTURED_MAX_TOKENS if analysis_data is not None else max_tokens)
 
         # Check for recommendations
         if action_type in ['first_analysis', 'single_analysis', 'technical_analysis']:
             check_recommendations(action_type, analysis)
 
         # NO TRIMMING - We rely on prompt engineering to enforce limits
-        if len(analysis) > char_limit:
-            print(f"🚨 OPENAI ANALYSIS: ⚠️ Analysis exceeded limit ({len(analysis)} chars), but keeping original response")
-
         return analysis
 
     except Exception as e:
-        print(f"🚨 OPENAI ANALYSIS: ❌ Analysis failed: {str(e)}")
+        logger.exception('openai.analysis_failed', action_type=action_type, error=str(e))
         raise RuntimeError(f"OpenAI analysis failed: {str(e)}")
 
-def load_image_from_url(image_url):
-    """Load and encode image from URL and return (b64string, format) or (None, None)"""
+def split_merged_analysis(text):
+    """
+    Split a merged_analysis reply on its marker lines. Returns (h4_analysis, final_analysis);
+    a section that is missing or empty comes back as None.
+    """
+    sections = {}
+    matches = list(MERGED_SECTION_PATTERN.finditer(text))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        section = text[match.end():end].strip()
+        if section and match.group(1) not in sections:
+            sections[match.group(1)] = section
+    return sections.get(H4_SECTION_MARKER), sections.get(FINAL_SECTION_MARKER)
+
+def analyze_merged_h4_final(image_str, image_format, previous_analysis, currency_pair=None):
+    """
+    Merged second step: the H4 analysis and the combined final analysis from one
+    vision completion. Returns (h4_analysis, final_analysis); final_analysis is None
+    when the reply could not be split, so the caller runs the separate final call.
+    A failed H4 validation comes back as the '❌' message in place of h4_analysis.
+    """
+    ensure_openai_available()
+
+    inline_check = Config.INLINE_TIMEFRAME_CHECK_ENABLED
+    if not inline_check:
+        is_valid, error_msg = validate_timeframe_for_analysis(image_str, image_format, 'H4')
+        if not is_valid:
+            return error_msg, None
+
+    char_limit = 1024
+    # Two sections of up to char_limit each; the adaptive budget is sized for one
+    max_tokens = 1200
+
+    stop_loss_instruction = build_stop_loss_instruction(currency_pair)
+    analysis_prompt = render_prompt('merged_analysis', previous_analysis=previous_analysis,
+                                    stop_loss_instruction=stop_loss_instruction)
+    if inline_check:
+        analysis_prompt = with_inline_header_request(analysis_prompt)
+
+    if not client:
+        raise RuntimeError("OpenAI client not initialized")
+
     try:
-        print(f"🚨 IMAGE LOAD: Loading image from {image_url}")
-        response = requests.get(image_url, timeout=10)
-        if response.status_code == 200:
-            img = Image.open(BytesIO(response.content))
-            if img.format in ['PNG', 'JPEG', 'JPG']:
-                buffered = BytesIO()
-                img_format = img.format if img.format else 'JPEG'
-                img.save(buffered, format=img_format)
-                b64_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                print(f"🚨 IMAGE LOAD: ✅ Image loaded successfully, format: {img_format}, size: {len(b64_data)} chars")
-                return b64_data, img_format
-        print(f"🚨 IMAGE LOAD: ❌ Failed to load image, status: {response.status_code}")
-        return None, None
+        logger.info('openai.analysis_request', action_type='merged_analysis', has_image=True,
+                    prompt_chars=prompt_length(analysis_prompt), max_tokens=max_tokens)
+
+        response = create_openai_chat_completion(
+            action_type="merged_analysis",
+            model=get_primary_model("merged_analysis"),
+            messages=build_prompt_messages(analysis_prompt, image_str, image_format),
+            max_tokens=max_tokens,
+            temperature=0.7,
+            timeout=45,
+            request_mode="vision",
+            image_detail=VISION_IMAGE_DETAIL,
+            timeframe="H4",
+            currency_pair=currency_pair
+        )
+
+        merged = response.choices[0].message.content.strip()
+        log_openai_response("merged_analysis", merged, char_limit * 2, response=response, max_tokens=max_tokens)
+
+        if inline_check:
+            merged, error_msg = check_inline_header(merged, image_str, image_format, 'H4', currency_pair)
+            if error_msg:
+                return error_msg, None
+
+        h4_analysis, final_analysis = split_merged_analysis(merged)
+        if not h4_analysis or not final_analysis:
+            logger.warning('merged_analysis.unsplit', has_h4=bool(h4_analysis), has_final=bool(final_analysis))
+            if not h4_analysis:
+                # No usable markers: the reply as a whole stands in for the H4 analysis
+                h4_analysis = MERGED_SECTION_PATTERN.sub('', merged).strip()
+            return h4_analysis, None
+
+        check_recommendations("merged_analysis", final_analysis)
+        return h4_analysis, final_analysis
+
     except Exception as e:
-        print(f"🚨 IMAGE LOAD: ❌ Error loading image: {e}")
-        return None, None
+        logger.exception('openai.analysis_failed', action_type='merged_analysis', error=str(e))
+        raise RuntimeError(f"OpenAI analysis failed: {str(e)}")
+
+def stream_analysis_with_openai(image_str, image_format, timeframe=None, action_type="single_analysis", currency_pair=None):
+    """
+    Streaming variant of analyze_with_openai for vision analysis: yields text
+    deltas as they arrive. The caller assembles the full text and applies the
+    usual refusal fallback / 1024-character shortening afterwards.
+    """
+    ensure_openai_available()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized")
+
+    analysis_prompt = build_analysis_prompt(timeframe, None, None, action_type, currency_pair)
+
+    logger.info('openai.stream_request', action_type=action_type, prompt_chars=prompt_length(analysis_prompt))
+    return create_openai_chat_completion(
+        action_type=action_type,
+        model=get_primary_model(action_type),
+        messages=build_prompt_messages(analysis_prompt, image_str, image_format),
+        max_tokens=600,
+        adaptive_max_tokens=True,
+        temperature=0.7,
+        timeout=30,
+        request_mode="vision",
+        image_detail=VISION_IMAGE_DETAIL,
+        timeframe=timeframe,
+        currency_pair=currency_pair,
+        stream=True
+    )
+
+def build_technical_analysis_prompt(timeframe=None, currency_pair=None):
+    stop_loss_instruction = build_stop_loss_instruction(currency_pair)
+    return render_prompt('technical_analysis', timeframe=timeframe, stop_loss_instruction=stop_loss_instruction)
 
 def analyze_technical_chart(image_str, image_format, timeframe=None, currency_pair=None):
     """
@@ -1478,87 +1566,26 @@ def analyze_technical_chart(image_str, image_format, timeframe=None, currency_pa
     """
     global client
 
-    if not OPENAI_AVAILABLE:
-        raise RuntimeError(f"OpenAI not available: {openai_error_message}")
+    ensure_openai_available()
 
     char_limit = 1024
     max_tokens = 600
 
-    # 🟡 SPECIAL STOP LOSS FOR GOLD vs OTHER PAIRS
-    if currency_pair and currency_pair.upper() in ['XAU/USD', 'XAUUSD', 'GOLD']:
-        stop_loss_instruction = """
-        **🟡 إعدادات وقف الخسارة الإلزامية للذهب (XAU/USD):**
-        - **انتبه: الذهب مختلف عن العملات! كل 1 نقطة في الذهب = 10 نقاط في العملات العادية**
-        - **الحد الأقصى المطلق: 5 نقاط فقط للذهب (تعادل 50 نقطة في العملات)**
-        - **ممنوع منعاً باتاً تجاوز 5 نقاط للذهب تحت أي ظرف**
-        - **يجب أن يكون وقف الخسارة بين 2-5 نقاط للذهب حسب التقلب**
-        - **إذا تطلب السوق أكثر من 5 نقاط للذهب، لا تقدم توصية بالتداول**
-        - **السبب: حماية رأس المال - 5 نقاط ذهب = 50 نقطة فعلية**
-        """
-        print("🟡 GOLD DETECTED: Using special stop loss rules (2-5 pips)")
-    else:
-        stop_loss_instruction = """
-        **🛑 إعدادات وقف الخسارة الإلزامية:**
-        - **الحد الأقصى المطلق: 50 نقطة فقط**
-        - **ممنوع منعاً باتاً تجاوز 50 نقطة تحت أي ظرف**
-        - **يجب أن يكون وقف الخسارة بين 20-50 نقطة حسب التقلب**
-        - **إذا تطلب السوق أكثر من 50 نقطة، لا تقدم توصية بالتداول**
-        - **السبب: حماية رأس المال ومنع المخاطرة العالية**
-        """
-        print("🟢 REGULAR CURRENCY: Using standard stop loss rules (20-50 pips)")
-
-    analysis_prompt = f"""
-أنت خبير تحليل فني للمخططات المالية. قم بتحليل الرسم البياني من الناحية الفنية فقط.
-
-**المطلوب تحليل فني كامل يتضمن:**
-
-### 📊 التحليل الفني لشارت {timeframe}
-**🎯 الاتجاه العام وهيكل السوق:**
-**📊 مستويات فيبوناتشي الرئيسية:**
-**🛡️ الدعم والمقاومة الحرجة:**
-**💧 تحليل السيولة باستخدام SMC وICT:**
-- مناطق السيولة (Liquidity)
-- أوامر التجميع (Order Blocks)
-- قاتل الجلسات (Session Killers)
-- مناطق العرض والطلب (Supply/Demand)
-
-**💼 التوصيات العملية:**
-- نقاط الدخول
-
-{stop_loss_instruction}
-
-- أهداف جني الأرباح (نسبة مخاطرة إلى العائد 1:2 على الأقل)
-
-**التعليمات الإلزامية:**
-- ركز فقط على التحليل الفني للمخطط
-- التزم بـ 1000 حرف كحد أقصى
-- لا تتجاوز 1024 حرف بأي حال
-- كن مباشراً وواضحاً
-- **ممنوع منعاً باتاً اقتراح وقف خسارة أكثر من الحد المسموح**
-- **لا تضف عدد الأحرف في نهاية الرد**
-"""
+    analysis_prompt = build_technical_analysis_prompt(timeframe, currency_pair)
 
     if not client:
         raise RuntimeError("OpenAI client not initialized")
 
     try:
-        print(f"🚨 OPENAI ANALYSIS: 🧠 Starting technical analysis with timeframe: {timeframe}")
-
-        # Add pre-call logging
-        print(f"🔍 TECHNICAL PRE-REQUEST")
-        print(f"🔍 Prompt length: {len(analysis_prompt)} characters")
+        logger.info('openai.analysis_request', action_type='technical_analysis', has_image=True,
+                    timeframe=timeframe, prompt_chars=prompt_length(analysis_prompt), max_tokens=max_tokens)
 
         response = create_openai_chat_completion(
             action_type="technical_analysis",
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "أنت خبير تحليل فني. ركز فقط على التحليل الفني. التزم بعدم تجاوز 1024 حرف. لا تضف عدد الأحرف في النهاية."},
-                {"role": "user", "content": [
-                    {"type": "text", "text": analysis_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/{image_format.lower()};base64,{image_str}", "detail": VISION_IMAGE_DETAIL}}
-                ]}
-            ],
+            model=get_primary_model("technical_analysis"),
+            messages=build_prompt_messages(analysis_prompt, image_str, image_format),
             max_tokens=max_tokens,
+            adaptive_max_tokens=True,
             temperature=0.7,
             timeout=30,
             request_mode="vision",
@@ -1569,40 +1596,43 @@ def analyze_technical_chart(image_str, image_format, timeframe=None, currency_pa
 
         analysis = response.choices[0].message.content.strip()
 
-        # Enhanced token usage logging
-        if response.usage:
-            print(f"🔢 Token Usage - Prompt: {response.usage.prompt_tokens}, Completion: {response.usage.completion_tokens}, Total: {response.usage.total_tokens}")
-            print(f"🔢 Max Tokens Limit: {max_tokens}, Completion Used: {response.usage.completion_tokens}/{max_tokens}")
-        else:
-            print("🔢 Token Usage: Not available")
-
-        # Comprehensive logging
-        print(f"\n{'='*60}")
-        print(f"🚨 TECHNICAL ANALYSIS RAW RESPONSE")
-        print(f"{'='*60}")
-        print(f"📊 Response length: {len(analysis)} characters")
-        print(f"📝 Full content:")
-        print(f"{'-'*40}")
-        print(analysis)
-        print(f"{'-'*40}")
-        print(f"{'='*60}\n")
-
-        # Log the full response
-        log_openai_response("technical_analysis", analysis)
+        log_openai_response("technical_analysis", analysis, char_limit, response=response, max_tokens=max_tokens)
 
         # Check for recommendations
         check_recommendations("technical_analysis", analysis)
 
         # NO TRIMMING - We rely on prompt engineering
-        if len(analysis) > char_limit:
-            print(f"🚨 OPENAI ANALYSIS: ⚠️ Technical analysis exceeded limit ({len(analysis)} chars), but keeping original response")
-
         return analysis
 
     except Exception as e:
-        print(f"🚨 OPENAI ANALYSIS: ❌ Technical analysis failed: {str(e)}")
+        logger.exception('openai.analysis_failed', action_type='technical_analysis', error=str(e))
         raise RuntimeError(f"OpenAI analysis failed: {str(e)}")
 
+def stream_technical_chart(image_str, image_format, timeframe=None, currency_pair=None):
+    """Streaming variant of analyze_technical_chart: yields text deltas as they arrive."""
+    ensure_openai_available()
+    if not client:
+        raise RuntimeError("OpenAI client not initialized")
+
+    analysis_prompt = build_technical_analysis_prompt(timeframe, currency_pair)
+
+    logger.info('openai.stream_request', action_type='technical_analysis', timeframe=timeframe,
+                prompt_chars=prompt_length(analysis_prompt))
+    return create_openai_chat_completion(
+        action_type="technical_analysis",
+        model=get_primary_model("technical_analysis"),
+        messages=build_prompt_messages(analysis_prompt, image_str, image_format),
+        max_tokens=600,
+        adaptive_max_tokens=True,
+        temperature=0.7,
+        timeout=30,
+        request_mode="vision",
+        image_detail=VISION_IMAGE_DETAIL,
+        timeframe=timeframe,
+        currency_pair=currency_pair,
+        stream=True
+    )
+
 def analyze_user_drawn_feedback_simple(image_str, image_format, timeframe=None):
     """
     Simple version for user feedback analysis without technical analysis context
@@ -1610,8 +1640,7 @@ def analyze_user_drawn_feedback_simple(image_str, image_format, timeframe=None):
     """
     global client
 
-    if not OPENAI_AVAILABLE:
-        raise RuntimeError(f"OpenAI not available: {openai_error_message}")
+    ensure_openai_available()
 
     char_limit = 1024
     max_tokens = 600
@@ -1639,15 +1668,12 @@ def analyze_user_drawn_feedback_simple(image_str, image_format, timeframe=None):
         raise RuntimeError("OpenAI client not initialized")
 
     try:
-        print(f"🚨 OPENAI ANALYSIS: 🧠 Starting simple user feedback analysis with timeframe: {timeframe}")
-
-        # Add pre-call logging
-        print(f"🔍 USER FEEDBACK PRE-REQUEST")
-        print(f"🔍 Prompt length: {len(feedback_prompt)} characters")
+        logger.info('openai.analysis_request', action_type='user_feedback', has_image=True,
+                    timeframe=timeframe, prompt_chars=len(feedback_prompt), max_tokens=max_tokens)
 
         response = create_openai_chat_completion(
             action_type="user_feedback",
-            model="gpt-4o",
+            model=get_primary_model("user_feedback"),
             messages=[
                 {"role": "system", "content": "أنت مدرس تحليل فني محترف. قيم تحليل المستخدم المرسوم بموضوعية. التزم بعدم تجاوز 1024 حرف. لا تضف عدد الأحرف في النهاية."},
                 {"role": "user", "content": [
@@ -1656,6 +1682,7 @@ def analyze_user_drawn_feedback_simple(image_str, image_format, timeframe=None):
                 ]}
             ],
             max_tokens=max_tokens,
+            adaptive_max_tokens=True,
             temperature=0.7,
             timeout=30,
             request_mode="vision",
@@ -1665,33 +1692,11 @@ def analyze_user_drawn_feedback_simple(image_str, image_format, timeframe=None):
 
         feedback = response.choices[0].message.content.strip()
 
-        # Enhanced token usage logging
-        if response.usage:
-            print(f"🔢 Token Usage - Prompt: {response.usage.prompt_tokens}, Completion: {response.usage.completion_tokens}, Total: {response.usage.total_tokens}")
-            print(f"🔢 Max Tokens Limit: {max_tokens}, Completion Used: {response.usage.completion_tokens}/{max_tokens}")
-        else:
-            print("🔢 Token Usage: Not available")
-
-        # Comprehensive logging
-        print(f"\n{'='*60}")
-        print(f"🚨 USER FEEDBACK RAW RESPONSE")
-        print(f"{'='*60}")
-        print(f"📊 Response length: {len(feedback)} characters")
-        print(f"📝 Full content:")
-        print(f"{'-'*40}")
-        print(feedback)
-        print(f"{'-'*40}")
-        print(f"{'='*60}\n")
-
-        # Log the full response
-        log_openai_response("user_feedback", feedback)
+        log_openai_response("user_feedback", feedback, char_limit, response=response, max_tokens=max_tokens)
 
         # NO TRIMMING - We rely on prompt engineering
-        if len(feedback) > char_limit:
-            print(f"🚨 OPENAI ANALYSIS: ⚠️ Feedback exceeded limit ({len(feedback)} chars), but keeping original response")
-
         return feedback
 
     except Exception as e:
-        print(f"🚨 OPENAI ANALYSIS: ❌ Simple user feedback analysis failed: {str(e)}")
+        logger.exception('openai.analysis_failed', action_type='user_feedback', error=str(e))
         raise RuntimeError(f"OpenAI feedback analysis failed: {str(e)}")
@@ -0,0 +1,115 @@
+# services/single_flight.py
+import hashlib
+import threading
+from config import Config
+from database.operations import (
+    get_single_flight_result,
+    release_advisory_lock,
+    store_single_flight_result,
+    try_advisory_lock,
+    wait_for_advisory_lock,
+)
+from utils.structured_log import get_logger
+
+# A joined request holds a sync gunicorn worker; keep well below --timeout=120 (railway.json)
+MAX_WAIT_SECONDS = 60
+logger = get_logger('single_flight')
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+def build_flight_key(endpoint, telegram_user_id, action_type, payload_digest):
+    """A 64-char hash, so client-supplied parts of any length fit single_flight_results.flight_key."""
+    return hashlib.sha256(
+        f"{endpoint}:{telegram_user_id}:{action_type}:{payload_digest}".encode('utf-8')
+    ).hexdigest()
+
+
+def payload_digest(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def flight_lock_id(flight_key):
+    # pg advisory locks take a signed bigint
+    return int.from_bytes(hashlib.sha256(flight_key.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+def get_wait_seconds():
+    return max(1, min(Config.SINGLE_FLIGHT_WAIT_SECONDS, MAX_WAIT_SECONDS))
+
+
+def run_single_flight(flight_key, compute):
+    """
+    compute() -> {'status_code', 'mimetype', 'response_body'}.
+    The first caller for a key runs it; identical requests arriving meanwhile
+    (in this worker or another one) get the same result instead of a second OpenAI run.
+    Once the flight has landed, the next identical request runs normally.
+    """
+    with _flights_lock:
+        flight = _flights.get(flight_key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[flight_key] = Flight()
+
+    if not is_leader:
+        logger.info('single_flight.joined', flight_key=flight_key, scope='worker')
+        # Like the cross-worker path, a server error is not shared: each follower retries itself
+        if flight.done.wait(get_wait_seconds()) and flight.result and flight.result['status_code'] < 500:
+            return flight.result
+        logger.warning('single_flight.no_result', flight_key=flight_key, scope='worker')
+        return compute()
+
+    try:
+        flight.result = run_across_workers(flight_key, compute)
+        return flight.result
+    finally:
+        flight.done.set()
+        with _flights_lock:
+            _flights.pop(flight_key, None)
+
+
+def run_across_workers(flight_key, compute):
+    """
+    The advisory lock marks a flight in progress. Only a request that fails to take it
+    reads single_flight_results, after the holder releases it; the stored row only has
+    to outlive that hand-over, so it expires after SINGLE_FLIGHT_RESULT_TTL_SECONDS.
+    """
+    ttl = Config.SINGLE_FLIGHT_RESULT_TTL_SECONDS
+    lock_id = flight_lock_id(flight_key)
+    try:
+        lock_conn = try_advisory_lock(lock_id)
+    except Exception as e:
+        logger.warning('single_flight.unavailable', flight_key=flight_key, error=str(e))
+        return compute()
+
+    if lock_conn is None:
+        logger.info('single_flight.joined', flight_key=flight_key, scope='cluster')
+        try:
+            if wait_for_advisory_lock(lock_id, get_wait_seconds()):
+                stored = get_single_flight_result(flight_key, ttl)
+                if stored:
+                    return stored
+        except Exception as e:
+            logger.warning('single_flight.wait_failed', flight_key=flight_key, error=str(e))
+        logger.warning('single_flight.no_result', flight_key=flight_key, scope='cluster')
+        return compute()
+
+    try:
+        result = compute()
+        # Server errors are not shared; a retry should get a fresh attempt
+        if result['status_code'] < 500:
+            try:
+                store_single_flight_result(
+                    flight_key, result['status_code'], result['mimetype'], result['response_body'], ttl
+                )
+            except Exception as e:
+                logger.warning('single_flight.store_failed', flight_key=flight_key, error=str(e))
+        return result
+    finally:
+        release_advisory_lock(lock_conn, lock_id)
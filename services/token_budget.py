@@ -0,0 +1,73 @@
+# services/token_budget.py
+import math
+import threading
+import time
+from config import Config
+from database.operations import get_completion_length_stats
+from utils.structured_log import get_logger
+
+_budget_state = {'loaded_at': 0.0, 'stats': {}}
+_budget_lock = threading.Lock()
+logger = get_logger('token_budget')
+
+
+def compute_token_budget(chars_per_token, p90_output_chars):
+    """
+    max_tokens that leaves ADAPTIVE_MAX_TOKENS_HEADROOM over the p90 completion length at
+    the observed density. Sized to what the model writes, not to the 1024-char delivery
+    limit: a cap near the limit cuts off the tail, where entries, stop loss and targets sit.
+    """
+    if not chars_per_token or chars_per_token <= 0 or not p90_output_chars:
+        return None
+    budget = math.ceil(p90_output_chars * Config.ADAPTIVE_MAX_TOKENS_HEADROOM / chars_per_token)
+    return max(Config.ADAPTIVE_MAX_TOKENS_MIN, min(Config.ADAPTIVE_MAX_TOKENS_MAX, budget))
+
+
+def refresh_token_budgets(force=False):
+    """Reload per-action length stats once they are older than the refresh interval."""
+    now = time.monotonic()
+    if not force and _budget_state['loaded_at'] and now - _budget_state['loaded_at'] < Config.ADAPTIVE_MAX_TOKENS_REFRESH_SECONDS:
+        return _budget_state['stats']
+
+    # One thread refreshes; the others keep serving the previous stats meanwhile
+    if not _budget_lock.acquire(blocking=False):
+        return _budget_state['stats']
+    try:
+        stats = get_completion_length_stats(
+            days=Config.ADAPTIVE_MAX_TOKENS_LOOKBACK_DAYS,
+            min_samples=Config.ADAPTIVE_MAX_TOKENS_MIN_SAMPLES
+        )
+        _budget_state['stats'] = stats
+        logger.info('token_budget.refreshed', actions=len(stats))
+    except Exception as e:
+        logger.warning('token_budget.refresh_failed', error=str(e))
+    finally:
+        # Failed refreshes also wait a full interval so a DB outage is not hammered per call
+        _budget_state['loaded_at'] = now
+        _budget_lock.release()
+    return _budget_state['stats']
+
+
+def get_token_budget(action_type, default_max_tokens):
+    """Returns (max_tokens, source) where source is 'adaptive' or 'static'."""
+    if not Config.ADAPTIVE_MAX_TOKENS_ENABLED:
+        return default_max_tokens, 'static'
+
+    action_stats = refresh_token_budgets().get(action_type)
+    budget = compute_token_budget(action_stats['chars_per_token'], action_stats['p90_output_chars']) if action_stats else None
+    if not budget:
+        return default_max_tokens, 'static'
+    return budget, 'adaptive'
+
+
+def get_token_budget_snapshot():
+    snapshot = []
+    for action_type, action_stats in sorted(refresh_token_budgets().items()):
+        snapshot.append({
+            'action_type': action_type,
+            'sample_count': action_stats['sample_count'],
+            'chars_per_token': round(action_stats['chars_per_token'], 2),
+            'p90_output_chars': int(action_stats['p90_output_chars']),
+            'max_tokens': compute_token_budget(action_stats['chars_per_token'], action_stats['p90_output_chars'])
+        })
+    return snapshot
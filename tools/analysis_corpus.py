@@ -0,0 +1,158 @@
+# tools/analysis_corpus.py
+# Representative over-limit analyses in the shape gpt-4o returns them, used by the tools/ checks.
+
+ANALYSIS_CORPUS = [
+    """### 📊 التحليل الفني لشارت M15
+**🎯 الاتجاه العام وهيكل السوق:**
+بشكل عام، يتحرك زوج EUR/USD في اتجاه صاعد على المدى القصير بعد أن نجح السعر في كسر القمة السابقة عند 1.0842، ومن الجدير بالذكر أن الزخم الشرائي ما زال قوياً رغم التباطؤ الطفيف في الجلسة الآسيوية.
+
+**📊 مستويات فيبوناتشي الرئيسية:**
+- مستوى 38.2% عند 1.0831
+- مستوى 61.8% عند 1.0818
+
+**🛡️ الدعم والمقاومة الحرجة:**
+- الدعم الأول: 1.0825 والدعم الثاني: 1.0810
+- المقاومة الأولى: 1.0860 والمقاومة الثانية: 1.0875
+
+**💧 تحليل السيولة باستخدام SMC وICT:**
+- تتركز السيولة فوق القمم المتساوية عند 1.0862، وهي منطقة مغرية لصناع السوق لجمع أوامر وقف البائعين قبل أي حركة حقيقية.
+- أمر تجميع صاعد (Order Block) بين 1.0828 و1.0833 يمثل منطقة طلب واضحة على هذا الإطار.
+- قاتل الجلسات يظهر بوضوح مع افتتاح لندن، حيث تحدث عادة تحركات خادعة قبل تحديد الاتجاه الفعلي لليوم، لذا يفضل الانتظار والتحلي بالصبر.
+
+**⚡ التوصيات العملية الفورية:**
+- نقطة الدخول: شراء من 1.0830
+- وقف الخسارة: 1.0805 (25 نقطة)
+- الهدف الأول: 1.0860 والهدف الثاني: 1.0880
+- نسبة المخاطرة إلى العائد: 1:2
+
+تجدر الإشارة إلى أن هذا التحليل يعتمد على البيانات الظاهرة في الرسم البياني فقط، وأنه من المهم دائماً الالتزام بإدارة رأس المال وعدم المخاطرة بأكثر من 2% من الحساب في صفقة واحدة مهما كانت الإشارة قوية.""",
+
+    """### 📈 التحليل الشامل
+**🎯 الاتجاه العام وهيكل السوق:**
+بناءً على ما سبق، يظهر الذهب XAU/USD هيكلاً صاعداً واضحاً على إطار H4 مع سلسلة من القمم والقيعان الأعلى، في حين يؤكد إطار M15 استمرار الزخم بعد اختراق منطقة 2345.
+بالإضافة إلى ذلك، فإن الشموع الأخيرة تعكس ضغطاً شرائياً مستمراً مع أحجام تداول متزايدة خلال الجلسة الأمريكية، مما يدعم فرضية الاستمرار.
+
+**📊 مستويات فيبوناتشي الحرجة:**
+- تصحيح 50% عند 2338.5
+- تصحيح 61.8% عند 2334.2
+
+**🛡️ الدعم والمقاومة الرئيسية:**
+- دعم قوي: 2336 ثم 2328
+- مقاومة: 2352 ثم 2360
+
+**💧 تحليل SMC وICT:**
+- مناطق السيولة: أسفل القاع عند 2331 توجد سيولة بيعية كبيرة قد يتم استهدافها قبل الصعود.
+- أوامر التجميع: منطقة Order Block صاعدة بين 2337 و2340.
+- مناطق العرض والطلب: منطقة طلب قوية بين 2330 و2334، ومنطقة عرض بين 2358 و2362.
+- قاتل الجلسات: من المتوقع حدوث حركة خادعة في بداية الجلسة الأوروبية تستهدف السيولة أسفل القيعان الآسيوية قبل الانطلاق.
+
+**💼 التوصيات الاستراتيجية:**
+- الدخول: شراء عند 2338
+- وقف الخسارة: 2334 (4 نقاط ذهب)
+- جني الأرباح: الهدف الأول 2346 والهدف الثاني 2352
+- نسبة المخاطرة إلى العائد 1:2
+
+من الجدير بالذكر أن الذهب شديد الحساسية لبيانات التضخم الأمريكية، لذلك يجب مراقبة الأخبار الاقتصادية بعناية وتقليل حجم الصفقة قبل صدور البيانات المهمة.""",
+
+    """📊 تحليل GBP/USD على إطار H1
+
+**📈 اتجاه السوق:** هابط على المدى القصير، حيث فشل السعر عدة مرات في تجاوز منطقة 1.2715 وشكل قمماً أدنى متتالية، وهو ما يعكس سيطرة البائعين بشكل ملحوظ خلال الجلسات الأخيرة.
+
+**🛡️ الدعم والمقاومة:**
+- المقاومة الرئيسية: 1.2715
+- المقاومة الثانوية: 1.2740
+- الدعم الأول: 1.2660
+- الدعم الثاني: 1.2635
+
+**📊 حركة السعر:**
+الشموع الأخيرة تظهر ذيولاً علوية طويلة، مما يدل على رفض الأسعار المرتفعة. كما نلاحظ أن نموذج القمة المزدوجة بدأ يتشكل بالقرب من المقاومة، وفي حال كسر خط العنق عند 1.2680 فإن ذلك سيؤكد استمرار الهبوط نحو مستويات الدعم الأدنى.
+إلى حد ما، يبقى الحجم منخفضاً مقارنة بالأيام السابقة، وهذا قد يعني أن الحركة الحالية تفتقر إلى القوة الكافية، لذلك يجب الحذر من الانعكاسات المفاجئة.
+
+### 💡 التوصيات العملية
+- توصية: بيع عند 1.2705
+- وقف الخسارة: 1.2745 (40 نقطة)
+- الهدف الأول: 1.2660
+- الهدف الثاني: 1.2625
+- نسبة المخاطرة إلى العائد: 1:2
+- الإطار الزمني للتوصية: خلال الجلسة الأوروبية القادمة
+
+**⚠️ ملاحظة:** في حال إغلاق شمعة ساعة فوق 1.2745 تلغى التوصية بالكامل، ويفضل انتظار إشارة جديدة بدلاً من محاولة التداول عكس الاتجاه الجديد.""",
+
+    """### 📊 التحليل الفني لشارت H4
+**🎯 الاتجاه العام وهيكل السوق:**
+يتداول USD/JPY ضمن قناة صاعدة واضحة منذ أكثر من أسبوعين، وفي الوقت الحالي يختبر السعر الحد العلوي للقناة قرب 157.80، وهي منطقة شهدت رفضاً متكرراً في الماضي، وبشكل واضح تبقى البنية العامة إيجابية طالما بقي السعر فوق 156.20.
+
+**📊 مستويات فيبوناتشي الرئيسية:**
+- 23.6% عند 157.10
+- 38.2% عند 156.65
+- 61.8% عند 155.90
+
+**🛡️ الدعم والمقاومة الحرجة:**
+- الدعم: 156.20 و155.80
+- المقاومة: 157.80 و158.40
+
+**💧 تحليل السيولة باستخدام SMC وICT:**
+- السيولة متراكمة أعلى 158.00 حيث توجد أوامر وقف البائعين، ومن المحتمل أن يتم سحبها قبل أي تصحيح.
+- أمر تجميع هابط (Bearish Order Block) بين 158.20 و158.50.
+- مناطق الاختراق (Breaker Blocks) تظهر عند 156.90 بعد كسر القاع السابق.
+- قاتل الجلسات في طوكيو غالباً ما يعكس اتجاه الجلسة السابقة، وهذا ما يجعل الدخول في بداية الجلسة الآسيوية محفوفاً بالمخاطر ويتطلب مراقبة دقيقة لرد فعل السعر عند المستويات الرئيسية.
+
+**⚡ التوصيات العملية:**
+- نقطة الدخول: بيع من 158.20 بعد سحب السيولة
+- وقف الخسارة: 158.65 (45 نقطة)
+- جني الأرباح: 157.30 ثم 156.90
+- نسبة المخاطرة إلى العائد: 1:2
+
+تجدر الإشارة إلى أن تدخل بنك اليابان المحتمل يبقى عاملاً رئيسياً قد يغير المشهد الفني بالكامل في أي لحظة، لذلك يجب الالتزام الصارم بوقف الخسارة.""",
+
+    """**📊 التحليل الفني لشارت BTC/USD على إطار D1**
+
+**🎯 الاتجاه العام:** صاعد على المدى المتوسط بعد الارتداد القوي من منطقة 61200، ومن المهم ملاحظة أن السعر استعاد المتوسط المتحرك 50 يوماً، وهذا يعتبر إشارة إيجابية لدى أغلب المتداولين والمؤسسات.
+
+**📊 فيبوناتشي:**
+- 38.2% عند 64850
+- 50% عند 63900
+- 61.8% عند 62950
+
+**🛡️ الدعم والمقاومة:**
+- الدعم الرئيسي: 63500 ثم 61200
+- المقاومة الرئيسية: 67400 ثم 69000
+
+**💧 السيولة:**
+- سيولة كبيرة أعلى القمة عند 67400، ومن الطبيعي أن يتجه السعر إليها قبل أي تصحيح أعمق.
+- أوامر تجميع صاعدة بين 63200 و63800.
+- بالإضافة إلى ذلك، تظهر فجوة قيمة عادلة (FVG) بين 64100 و64600 لم تملأ بعد وقد تجذب السعر في تصحيح قصير.
+- سلوك السعر خلال عطلة نهاية الأسبوع يكون عادة أقل سيولة وأكثر عرضة للحركات الحادة، ولذلك ينصح بتخفيف المراكز قبل نهاية الأسبوع.
+
+**💼 التوصيات العملية:**
+- شراء عند 64200
+- وقف الخسارة: 63100
+- الهدف الأول: 66500
+- الهدف الثاني: 67400
+- نسبة المخاطرة إلى العائد: 1:2.9
+
+بناءً على ما سبق، يبقى السيناريو الإيجابي هو الأرجح طالما بقي السعر فوق 61200 على الإغلاق اليومي، أما كسر هذا المستوى فسيفتح الطريق نحو 58000.""",
+
+    """### 📊 التحليل الفني لشارت M15
+**🎯 الاتجاه العام وهيكل السوق:**
+يتحرك AUD/USD في نطاق عرضي ضيق بين 0.6620 و0.6650 منذ بداية الجلسة، ومن المهم أن نلاحظ أن هذا النوع من النطاقات غالباً ما ينتهي بحركة قوية في اتجاه الاختراق، خاصة مع اقتراب موعد صدور بيانات التوظيف الأسترالية.
+
+**🛡️ الدعم والمقاومة الحرجة:**
+- الدعم: 0.6620
+- المقاومة: 0.6650
+
+**💧 تحليل السيولة باستخدام SMC وICT:**
+- السيولة متوزعة على جانبي النطاق، مع تركيز أكبر أسفل 0.6618 حيث أوامر وقف المشترين.
+- أمر تجميع صاعد عند 0.6622 - 0.6626.
+- قاتل الجلسات يظهر عادة قبل افتتاح نيويورك بساعة تقريباً، وهي الفترة التي يجب فيها توخي الحذر الشديد من الاختراقات الكاذبة التي تستهدف المتداولين المتسرعين.
+- كما يلاحظ أن الشمعة الأخيرة ذات ذيل سفلي طويل، وهذا يدل على وجود اهتمام شرائي واضح عند قاع النطاق الحالي.
+
+**⚡ التوصيات العملية الفورية:**
+- شرط الدخول: شراء بعد إغلاق شمعة M15 فوق 0.6652
+- نقطة الدخول: 0.6654
+- وقف الخسارة: 0.6630 (24 نقطة)
+- الهدف الأول: 0.6680 والهدف الثاني: 0.6702
+- نسبة المخاطرة إلى العائد: 1:2
+
+بشكل عام، يفضل عدم الدخول داخل النطاق نفسه لأن نسبة المخاطرة إلى العائد تكون غير مناسبة، والانتظار حتى يتضح الاتجاه هو الخيار الأكثر أماناً للمتداول اليومي في مثل هذه الظروف.""",
+]
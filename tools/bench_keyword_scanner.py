@@ -0,0 +1,185 @@
+# tools/bench_keyword_scanner.py
+# Run from the repo root: python -m tools.bench_keyword_scanner [--iterations N]
+import argparse
+import sys
+import timeit
+from collections import deque
+from services.length_fitter import CRITICAL_KEYWORDS, SUPPORTING_KEYWORDS, parse_analysis_lines
+from services.openai_service import (
+    CRITICAL_SECTION_SCANNER,
+    RECOMMENDATION_SCANNER,
+    SHORTENING_CRITICAL_SCANNER,
+    extract_critical_sections,
+)
+from tools.analysis_corpus import ANALYSIS_CORPUS
+from utils.keyword_scanner import KeywordScanner
+
+# The keyword loops the scanner replaced, kept as the baseline
+
+def legacy_recommendations(text):
+    recommendation_keywords = [
+        'توصية', 'توصيات', 'دخول', 'شراء', 'بيع', 'هدف', 'أهداف',
+        'recommendation', 'entry', 'buy', 'sell', 'target', 'stop loss'
+    ]
+    timeframe_keywords = [
+        '15 دقيقة', 'ربع ساعة', 'خمسة عشر', 'القادمة', 'المقبلة',
+        '15 minute', 'next 15', 'quarter', 'coming'
+    ]
+    return (any(keyword in text.lower() for keyword in recommendation_keywords),
+            any(keyword in text.lower() for keyword in timeframe_keywords))
+
+
+def legacy_line_flags(text):
+    flags = []
+    for line in text.split('\n'):
+        lowered = line.lower()
+        flags.append((any(keyword in lowered for keyword in CRITICAL_KEYWORDS),
+                      any(keyword in lowered for keyword in SUPPORTING_KEYWORDS)))
+    return flags
+
+
+def legacy_missing_critical(original, shortened):
+    critical_keywords = [
+        'توصية', 'دخول', 'شراء', 'بيع', 'وقف', 'هدف', 'نسبة', 'مخاطرة', 'عائد',
+        'دعم', 'مقاومة', 'سيولة', 'نقطة', 'نقاط', 'شرط', 'شرط الدخول'
+    ]
+    return [kw for kw in critical_keywords if kw in original and kw not in shortened]
+
+
+def legacy_critical_sections(text, max_chars=200):
+    key_phrases = [
+        'توصية', 'دخول عند', 'شراء عند', 'بيع عند',
+        'وقف الخسارة', 'جني الأرباح', 'نسبة المخاطرة',
+        'الدعم عند', 'المقاومة عند'
+    ]
+    parts = []
+    for phrase in key_phrases:
+        idx = text.find(phrase)
+        if idx != -1:
+            parts.append(text[max(0, idx - 20):min(len(text), idx + 80)])
+    if not parts:
+        return None
+    combined = " | ".join(parts)
+    return combined[:max_chars - 3] + "..." if len(combined) > max_chars else combined
+
+
+def scanner_recommendations(text):
+    groups = RECOMMENDATION_SCANNER.matched_groups(text)
+    return 'recommendation' in groups, 'timeframe' in groups
+
+
+LINE_SCANNER = KeywordScanner(critical=CRITICAL_KEYWORDS, supporting=SUPPORTING_KEYWORDS)
+
+
+def scanner_line_flags(text):
+    flags = []
+    for line in text.split('\n'):
+        groups = LINE_SCANNER.matched_groups(line)
+        flags.append(('critical' in groups, 'supporting' in groups))
+    return flags
+
+
+def scanner_missing_critical(original, shortened):
+    original_keywords = SHORTENING_CRITICAL_SCANNER.found(original)
+    kept_keywords = SHORTENING_CRITICAL_SCANNER.found(shortened)
+    return [kw for kw in SHORTENING_CRITICAL_SCANNER.keywords if kw in original_keywords and kw not in kept_keywords]
+
+
+class AhoCorasick:
+    """Textbook automaton over the same keywords, to show what a per-character walk costs in CPython."""
+
+    def __init__(self, keywords):
+        self.goto = [{}]
+        self.output = [()]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.output.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] += (keyword,)
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if state else 0
+                self.output[child] += self.output[self.fail[child]]
+
+    def found(self, text):
+        hits = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                hits.update(self.output[state])
+        return hits
+
+
+def check_equivalence(texts):
+    failures = 0
+    automaton = AhoCorasick(RECOMMENDATION_SCANNER.keywords)
+    for index, text in enumerate(texts):
+        shortened = text[:len(text) // 2]
+        checks = (
+            ('recommendations', legacy_recommendations(text), scanner_recommendations(text)),
+            ('line flags', legacy_line_flags(text), scanner_line_flags(text)),
+            ('missing critical', legacy_missing_critical(text, shortened), scanner_missing_critical(text, shortened)),
+            ('critical sections', legacy_critical_sections(text), extract_critical_sections(text)),
+            ('automaton', RECOMMENDATION_SCANNER.found(text), automaton.found(text)),
+        )
+        for name, expected, actual in checks:
+            if expected != actual:
+                failures += 1
+                print(f"   ❌ text {index} {name}: legacy {expected!r}, scanner {actual!r}")
+        offsets = CRITICAL_SECTION_SCANNER.scan(text)
+        if any(text[offset:offset + len(keyword)] != keyword for offset, keyword in offsets):
+            failures += 1
+            print(f"   ❌ text {index}: scan() offsets do not point at their keywords")
+    return failures
+
+
+def bench(label, texts, legacy, scanner, iterations):
+    legacy_seconds = timeit.timeit(lambda: [legacy(text) for text in texts], number=iterations)
+    scanner_seconds = timeit.timeit(lambda: [scanner(text) for text in texts], number=iterations)
+    calls = iterations * len(texts)
+    print(f"{label:<20} {legacy_seconds / calls * 1e6:>10.1f} {scanner_seconds / calls * 1e6:>10.1f} {legacy_seconds / scanner_seconds:>7.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check KeywordScanner against the old keyword loops and time both.")
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # Each corpus analysis, plus all of them run together as one very long analysis
+    texts = list(ANALYSIS_CORPUS) + ['\n\n'.join(ANALYSIS_CORPUS * 4)]
+    failures = check_equivalence(texts)
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+        return 1
+    print(f"✅ scanner matches the old keyword loops on {len(texts)} analyses")
+
+    automaton = AhoCorasick(RECOMMENDATION_SCANNER.keywords)
+    print(f"{'':<20} {'legacy µs':>10} {'new µs':>10} {'speedup':>8}")
+    bench('recommendations', texts, legacy_recommendations, scanner_recommendations, args.iterations)
+    bench('line scoring', texts, legacy_line_flags, scanner_line_flags, args.iterations)
+    bench('missing critical', texts, lambda text: legacy_missing_critical(text, text[:500]),
+          lambda text: scanner_missing_critical(text, text[:500]), args.iterations)
+    bench('critical sections', texts, legacy_critical_sections, extract_critical_sections, args.iterations)
+    # Here the first column is KeywordScanner and the second the automaton
+    bench('scanner vs automaton', texts, RECOMMENDATION_SCANNER.found, automaton.found, args.iterations)
+    print(f"Long analysis: {len(texts[-1])} chars; full parse_analysis_lines "
+          f"{timeit.timeit(lambda: parse_analysis_lines(texts[-1]), number=args.iterations) / args.iterations * 1e6:.1f} µs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# tools/bench_normalizer.py
+# Run from the repo root: python -m tools.bench_normalizer [--iterations N]
+import argparse
+import sys
+import timeit
+from services.chart_normalizer import (
+    FRAME_TIMEFRAME_VOCABULARY,
+    instrument_key,
+    match_timeframe,
+    normalize_frame_timeframe,
+    normalize_frame_type,
+    normalize_symbol,
+)
+from tools.normalizer_corpus import FRAME_CORPUS, SAME_INSTRUMENT_CORPUS, SYMBOL_CORPUS, TIMEFRAME_CORPUS
+
+
+# The per-call implementations chart_normalizer replaced, minus their print() calls, kept as the baseline
+
+def legacy_timeframe(detected_timeframe):
+    cleaned = detected_timeframe.upper().replace(' ', '').replace('TF:', '').replace('TIMEFRAME:', '').replace('PERIOD:', '').replace('TIMEFRAME', '').replace('PERIOD', '')
+    if cleaned in ('', 'UNKNOWN', 'NOTFOUND', 'NONE', 'N/A'):
+        return 'UNKNOWN'
+    timeframe_map = {
+        '15MINUTES': 'M15', '15MINUTE': 'M15', '15MIN': 'M15', '15M': 'M15', '15m': 'M15', 'M15M': 'M15', '15': 'M15',
+        '30MINUTES': 'M30', '30MINUTE': 'M30', '30MIN': 'M30', '30M': 'M30', '30m': 'M30', 'M30M': 'M30',
+        '4HOURS': 'H4', '4HOUR': 'H4', '4H': 'H4', '4h': 'H4', 'H4H': 'H4', '240M': 'H4',
+        '1HOUR': 'H1', '1H': 'H1', '1h': 'H1', 'H1H': 'H1', '60M': 'H1', '60MIN': 'H1',
+        'DAILY': 'D1', '1DAY': 'D1', '1D': 'D1', '1d': 'D1', 'D1D': 'D1',
+        'WEEKLY': 'W1', '1WEEK': 'W1', '1W': 'W1', '1w': 'W1',
+        'MONTHLY': 'MN', '1MONTH': 'MN', 'MN': 'MN',
+        '5MINUTES': 'M5', '5MINUTE': 'M5', '5MIN': 'M5', '5M': 'M5', '5m': 'M5', 'M5M': 'M5',
+        '1MINUTE': 'M1', '1MIN': 'M1', '1M': 'M1', '1m': 'M1', 'M1M': 'M1'
+    }
+    for variant, standard in timeframe_map.items():
+        if cleaned == variant:
+            return standard
+    for tf in ['M15', 'M30', 'H4', 'H1', 'D1', 'W1', 'MN', 'M5', 'M1']:
+        if tf in cleaned:
+            return tf
+    if '15' in cleaned and any(word in cleaned for word in ['M', 'MIN', 'MINUTE']):
+        return 'M15'
+    if '1' in cleaned and '15' not in cleaned and any(word in cleaned for word in ['M', 'MIN', 'MINUTE']):
+        if cleaned in ['1M', '1MIN', '1MINUTE', 'M1']:
+            return 'M1'
+    if any(word in cleaned for word in ['MINUTE', 'MIN', 'M']):
+        if '15' in cleaned or 'FIFTEEN' in cleaned:
+            return 'M15'
+        elif '30' in cleaned or 'THIRTY' in cleaned:
+            return 'M30'
+        elif '5' in cleaned or 'FIVE' in cleaned:
+            return 'M5'
+        elif '1' in cleaned and '15' not in cleaned:
+            return 'M1'
+    if any(word in cleaned for word in ['HOUR', 'H']):
+        if '4' in cleaned or 'FOUR' in cleaned:
+            return 'H4'
+        elif '1' in cleaned:
+            return 'H1'
+    if any(word in cleaned for word in ['DAY', 'D']):
+        return 'D1'
+    if any(word in cleaned for word in ['WEEK', 'W']):
+        return 'W1'
+    if any(word in cleaned for word in ['MONTH', 'MN']):
+        return 'MN'
+    return 'UNKNOWN'
+
+
+def legacy_frame(result):
+    if ',' not in result:
+        return "unknown", "D1"
+    frame_type, timeframe = result.split(',', 1)
+    frame_type = frame_type.strip().lower()
+    timeframe = timeframe.strip().upper()
+    timeframe_mapping = {
+        '15': 'M15', '30': 'M30', '1H': 'H1', '4H': 'H4',
+        '1D': 'D1', '1DAY': 'D1', 'DAILY': 'D1',
+        '5D': 'D5', '5DAY': 'D5',
+        '1W': 'W1', '1WEEK': 'W1', 'WEEKLY': 'W1',
+        '1M': 'MN', '1MONTH': 'MN', 'MONTHLY': 'MN',
+        '6M': '6MN', '6MONTH': '6MN',
+        'YTD': 'YTD', 'YEAR': 'YTD'
+    }
+    if timeframe in timeframe_mapping:
+        timeframe = timeframe_mapping[timeframe]
+    valid_frame_types = ['investing', 'trading_app', 'metatrader', 'stock_chart', 'unknown']
+    if frame_type not in valid_frame_types:
+        if any(marker in result for marker in ['1 day', '5 days', '1 month', '6 months', 'Prev close']):
+            frame_type = 'stock_chart'
+        else:
+            frame_type = 'unknown'
+    return frame_type, timeframe
+
+
+def legacy_canonicalize(symbol):
+    if not symbol:
+        return 'UNKNOWN'
+    cleaned = str(symbol).replace(' ', '').replace('/', '').upper()
+    if cleaned in ['UNKNOWN', 'NOTFOUND', '']:
+        return 'UNKNOWN'
+    quote_currencies = {'USD', 'EUR', 'JPY', 'GBP', 'CHF', 'AUD', 'CAD', 'NZD'}
+    if len(cleaned) == 6 and cleaned.isalpha() and cleaned[3:] in quote_currencies:
+        return f"{cleaned[:3]}/{cleaned[3:]}"
+    return cleaned
+
+
+def legacy_symbol(detected_symbol):
+    cleaned = detected_symbol.upper().replace(' ', '').replace('"', '').replace("'", "")
+    if len(cleaned) == 6 and '/' not in cleaned:
+        forex_pairs = ['EURUSD', 'GBPUSD', 'USDJPY', 'USDCHF', 'AUDUSD', 'USDCAD', 'NZDUSD']
+        if cleaned in forex_pairs:
+            cleaned = f"{cleaned[:3]}/{cleaned[3:]}"
+    symbol_mapping = {
+        'S&P500': 'SPX', 'S&P': 'SPX', 'SP500': 'SPX',
+        'DOW': 'DOW', 'DJI': 'DOW',
+        'NASDAQ': 'NQ', 'NQ100': 'NQ',
+        'GOLD': 'XAU/USD', 'XAU': 'XAU/USD',
+        'SILVER': 'XAG/USD', 'XAG': 'XAG/USD',
+        'OIL': 'WTI', 'CRUDE': 'WTI'
+    }
+    if cleaned in symbol_mapping:
+        cleaned = symbol_mapping[cleaned]
+    cleaned = legacy_canonicalize(cleaned)
+    return cleaned if 2 <= len(cleaned) <= 10 else 'UNKNOWN'
+
+
+def compiled_timeframe(raw):
+    return match_timeframe(raw)[0]
+
+
+def compiled_frame(result):
+    if ',' not in result:
+        return "unknown", "D1"
+    frame_type, timeframe = result.split(',', 1)
+    return normalize_frame_type(frame_type, result), normalize_frame_timeframe(timeframe)
+
+
+def check_corpus(name, corpus, normalize, legacy, allow_difference=None):
+    failures = 0
+    for raw, expected in corpus:
+        actual = normalize(raw)
+        if actual != expected:
+            failures += 1
+            print(f"   ❌ {name} {raw!r}: expected {expected!r}, got {actual!r}")
+        before = legacy(raw)
+        if before != actual:
+            if allow_difference and allow_difference(before, actual):
+                print(f"   ℹ️ {name} {raw!r}: {before!r} -> {actual!r} (legacy escalated)")
+            else:
+                failures += 1
+                print(f"   ❌ {name} {raw!r}: legacy {before!r}, compiled {actual!r}")
+    return failures
+
+
+def frame_escalated_before(before, actual):
+    # Exact aliases may now rescue answers the old table left outside the vocabulary
+    return before[0] == actual[0] and before[1] not in FRAME_TIMEFRAME_VOCABULARY and actual[1] in FRAME_TIMEFRAME_VOCABULARY
+
+
+def bench(label, corpus, normalize, legacy, iterations):
+    inputs = [raw for raw, _ in corpus]
+    legacy_seconds = timeit.timeit(lambda: [legacy(raw) for raw in inputs], number=iterations)
+    compiled_seconds = timeit.timeit(lambda: [normalize(raw) for raw in inputs], number=iterations)
+    calls = iterations * len(inputs)
+    print(f"{label:<10} {legacy_seconds / calls * 1e6:>9.2f} {compiled_seconds / calls * 1e6:>9.2f} {legacy_seconds / compiled_seconds:>7.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check chart_normalizer against its corpus and time it against the old code.")
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    failures = check_corpus('timeframe', TIMEFRAME_CORPUS, compiled_timeframe, legacy_timeframe)
+    failures += check_corpus('frame', FRAME_CORPUS, compiled_frame, legacy_frame, frame_escalated_before)
+    failures += check_corpus('symbol', SYMBOL_CORPUS, normalize_symbol, legacy_symbol)
+    for first, second, expected in SAME_INSTRUMENT_CORPUS:
+        if (instrument_key(first) == instrument_key(second)) != expected:
+            failures += 1
+            print(f"   ❌ same instrument {first!r}/{second!r}: expected {expected}")
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+        return 1
+    total = len(TIMEFRAME_CORPUS) + len(FRAME_CORPUS) + len(SYMBOL_CORPUS) + len(SAME_INSTRUMENT_CORPUS)
+    print(f"✅ {total} corpus entries match")
+
+    print(f"{'':<10} {'legacy µs':>9} {'new µs':>9} {'speedup':>8}")
+    bench('timeframe', TIMEFRAME_CORPUS, compiled_timeframe, legacy_timeframe, args.iterations)
+    bench('frame', FRAME_CORPUS, compiled_frame, legacy_frame, args.iterations)
+    bench('symbol', SYMBOL_CORPUS, normalize_symbol, legacy_symbol, args.iterations)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
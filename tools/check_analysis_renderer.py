@@ -0,0 +1,109 @@
+# tools/check_analysis_renderer.py
+# Run from the repo root: python -m tools.check_analysis_renderer [--iterations N]
+import argparse
+import json
+import sys
+import timeit
+from services.analysis_renderer import RENDER_STAGES, parse_structured_analysis, render_analysis
+
+COMPACT_ANALYSIS = {
+    "chart_timeframe": "M15",
+    "chart_symbol": "EURUSD",
+    "trend": {"direction": "bullish", "summary": "قمم وقيعان صاعدة فوق المتوسط 50"},
+    "levels": {"support": [1.0835, 1.082], "resistance": [1.0872, 1.089]},
+    "entries": [{"side": "buy", "price": 1.0842, "condition": "إغلاق شمعة فوق 1.0840"}],
+    "stop_loss": {"price": 1.0812, "pips": 30},
+    "targets": [1.0872, 1.089],
+    "risk_reward": "1:1.6",
+    "notes": ["الزخم يدعم الصعود"],
+}
+
+# Every section filled to well past 1024 chars once rendered
+VERBOSE_ANALYSIS = {
+    "chart_timeframe": "H4",
+    "chart_symbol": "XAU/USD",
+    "trend": {"direction": "bearish", "summary": "كسر خط الاتجاه الصاعد مع تباعد سلبي واضح على مؤشر القوة النسبية " * 3},
+    "levels": {"support": [2310.5, 2298, 2285.4, 2270], "resistance": [2335, 2348.2, 2360, 2375.8]},
+    "entries": [
+        {"side": "sell", "price": 2332, "condition": "ارتداد من المقاومة مع شمعة ابتلاعية هابطة على إطار الساعة " * 2},
+        {"side": "sell", "price": 2340, "condition": "اختبار ثانٍ للمقاومة بعد سحب السيولة فوق القمة السابقة " * 2},
+    ],
+    "stop_loss": {"price": 2337, "pips": 50},
+    "targets": [2310, 2298, 2285, 2270],
+    "risk_reward": "1:2.5",
+    "notes": ["بيانات التضخم الأمريكية قد تسبب تذبذباً حاداً قبل الإغلاق الأسبوعي " * 2] * 5,
+}
+
+# (label, raw model reply, should parse)
+REPLY_CORPUS = (
+    ('compact', json.dumps(COMPACT_ANALYSIS, ensure_ascii=False), True),
+    ('verbose', json.dumps(VERBOSE_ANALYSIS, ensure_ascii=False), True),
+    ('fenced', f"```json\n{json.dumps(COMPACT_ANALYSIS, ensure_ascii=False)}\n```", True),
+    ('flat stop loss', json.dumps({**COMPACT_ANALYSIS, 'stop_loss': 1.0812, 'trend': 'up'}), True),
+    ('cut off by max_tokens', json.dumps(VERBOSE_ANALYSIS, ensure_ascii=False)[:700], False),
+    ('no stop loss', json.dumps({**COMPACT_ANALYSIS, 'stop_loss': None}), False),
+    ('no entries', json.dumps({**COMPACT_ANALYSIS, 'entries': []}), False),
+    ('prose', "🎯 الاتجاه: صاعد\n💼 الدخول: 1.0842", False),
+)
+
+
+def check_replies(char_limit):
+    failures = 0
+    for label, raw, should_parse in REPLY_CORPUS:
+        data = parse_structured_analysis(raw)
+        if (data is not None) != should_parse:
+            failures += 1
+            print(f"   ❌ {label}: parsed={data is not None}, expected {should_parse}")
+            continue
+        if data is None:
+            continue
+        rendered = render_analysis(data, char_limit)
+        text = rendered['text']
+        if len(text) > char_limit:
+            failures += 1
+            print(f"   ❌ {label}: {len(text)} chars > {char_limit}")
+        # Entries and the stop loss survive every stage
+        missing = [value for value in (data['entries'][0]['price'], data['stop_loss']['price']) if value not in text]
+        if missing:
+            failures += 1
+            print(f"   ❌ {label}: rendered text lost {missing}")
+        print(f"   {label:<16} {len(text):>5} chars  stage={rendered['stage']}")
+    return failures
+
+
+def check_stages(char_limit):
+    """Tighter limits must walk the stages in order, never jumping back."""
+    data = parse_structured_analysis(json.dumps(VERBOSE_ANALYSIS, ensure_ascii=False))
+    order = [None] + [name for name, _ in RENDER_STAGES] + ['cut_at_line_boundary']
+    failures = 0
+    previous = 0
+    for limit in range(2000, 99, -50):
+        stage = render_analysis(data, limit)['stage']
+        if order.index(stage) < previous:
+            failures += 1
+            print(f"   ❌ limit {limit}: stage {stage} comes before {order[previous]}")
+        previous = order.index(stage)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that structured analyses parse and render within the limit.")
+    parser.add_argument('--char-limit', type=int, default=1024)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    failures = check_replies(args.char_limit) + check_stages(args.char_limit)
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+        return 1
+    print(f"✅ {len(REPLY_CORPUS)} replies checked, every rendering fits {args.char_limit} chars")
+
+    for label, raw, should_parse in REPLY_CORPUS[:2]:
+        seconds = timeit.timeit(lambda: render_analysis(parse_structured_analysis(raw), args.char_limit),
+                                number=args.iterations)
+        print(f"{label:<10} parse + render {seconds / args.iterations * 1e6:.1f} µs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
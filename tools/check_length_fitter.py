@@ -0,0 +1,36 @@
+# tools/check_length_fitter.py
+# Run from the repo root: python -m tools.check_length_fitter
+import sys
+import time
+from services.length_fitter import extract_numbers, fit_analysis
+from tools.analysis_corpus import ANALYSIS_CORPUS
+
+CHAR_LIMIT = 1024
+
+
+def main():
+    failures = 0
+    print(f"{'#':>2} {'orig':>5} {'fit':>5} {'ms':>6}  stage")
+    for index, analysis in enumerate(ANALYSIS_CORPUS):
+        started_at = time.perf_counter()
+        fit = fit_analysis(analysis, CHAR_LIMIT)
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        print(f"{index:>2} {len(analysis):>5} {len(fit['text']):>5} {elapsed_ms:>6.2f}  {fit['stage']}")
+
+        if len(fit['text']) > CHAR_LIMIT:
+            failures += 1
+            print(f"   ❌ over limit: {len(fit['text'])} chars")
+        missing = extract_numbers(analysis) - extract_numbers(fit['text'])
+        if missing or fit['dropped_numbers']:
+            failures += 1
+            print(f"   ❌ numbers dropped: {sorted(missing)}")
+
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+        return 1
+    print(f"✅ {len(ANALYSIS_CORPUS)} analyses fit in {CHAR_LIMIT} chars with every number kept")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,439 @@
+# tools/load_test.py
+# End-to-end load test of the SendPulse flows against a real app process, a local Postgres,
+# a local chart image server and tools/mock_openai_server.py. Run from the repo root:
+#   DATABASE_URL=postgresql://localhost/xflexai_load python -m tools.load_test --users 20 --duration 300
+#   python -m tools.load_test --workers 4 --worker-class gthread --threads 4 --scenario multi_frame=1 --json-out gthread.json
+# Each run prints throughput, latency percentiles per endpoint/stage, OpenAI stage latencies from
+# openai_usage_events, Postgres connection counts and error rates; --json-out keeps them for comparisons.
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from config import Config
+from tools.mock_openai_server import build_chart_png, parse_args as parse_mock_args, start_mock_server
+
+GUNICORN_TIMEOUT_SECONDS = 120
+CLIENT_TIMEOUT_SECONDS = 150
+LOAD_TEST_USER_ID_BASE = 990_000_000_000
+LOAD_TEST_KEY_NOTE = 'load-test'
+SYMBOLS = ('EURUSD', 'GBPUSD', 'USDJPY', 'XAUUSD', 'AUDUSD')
+USER_ANALYSIS_TEXT = "أرى أن السعر سيصعد نحو المقاومة بعد كسر القمة السابقة، الدخول شراء مع وقف تحت آخر قاع."
+
+# Scenario name -> ordered steps (label, path, payload builder). Builders get (vu, image_url).
+SCENARIOS = {
+    'multi_frame': (
+        ('analyze:first_analysis', '/analyze',
+         lambda vu, image_url: {'action_type': 'first_analysis', 'timeframe': 'M15',
+                                'image_url': image_url(vu, 'M15')}),
+        ('analyze:second_analysis', '/analyze',
+         lambda vu, image_url: {'action_type': 'second_analysis', 'image_url': image_url(vu, 'H4')}),
+        ('analyze:user_analysis', '/analyze',
+         lambda vu, image_url: {'action_type': 'user_analysis', 'user_analysis': USER_ANALYSIS_TEXT}),
+    ),
+    'single': (
+        ('analyze-single', '/analyze-single',
+         lambda vu, image_url: {'image_url': image_url(vu, random.choice(('M15', 'H1', 'H4', 'D1')))}),
+    ),
+    'technical': (
+        ('analyze-technical', '/analyze-technical',
+         lambda vu, image_url: {'image_url': image_url(vu, random.choice(('M15', 'H4')))}),
+    ),
+    'single_stream': (
+        ('analyze-single/stream', '/analyze-single/stream',
+         lambda vu, image_url: {'image_url': image_url(vu, 'H1')}),
+    ),
+}
+
+
+class ChartImageHandler(BaseHTTPRequestHandler):
+    """GET /chart/<timeframe>/<symbol>.png -> a PNG the mock OpenAI server reads its answers from."""
+    protocol_version = 'HTTP/1.1'
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'chart' or not parts[2].endswith('.png'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        timeframe, symbol = parts[1], parts[2][:-4]
+        with self.cache_lock:
+            body = self.cache.get((timeframe, symbol))
+            if body is None:
+                body = build_chart_png(1280, 720, timeframe=timeframe, symbol=symbol, frame='metatrader')
+                self.cache[(timeframe, symbol)] = body
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_image_server(port):
+    server = ThreadingHTTPServer(('127.0.0.1', port), ChartImageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+        self.db_samples = []
+
+    def record(self, label, started_at, latency, status, outcome, first_byte=None):
+        with self.lock:
+            self.samples.append({
+                'label': label, 'started_at': started_at, 'latency': latency,
+                'status': status, 'outcome': outcome, 'first_byte': first_byte
+            })
+
+    def summarize(self, elapsed):
+        by_label = {}
+        for sample in self.samples:
+            by_label.setdefault(sample['label'], []).append(sample)
+
+        endpoints = []
+        for label, samples in sorted(by_label.items()):
+            latencies = sorted(sample['latency'] for sample in samples)
+            first_bytes = sorted(sample['first_byte'] for sample in samples if sample['first_byte'] is not None)
+            outcomes = {}
+            for sample in samples:
+                outcomes[sample['outcome']] = outcomes.get(sample['outcome'], 0) + 1
+            endpoints.append({
+                'label': label,
+                'count': len(samples),
+                'throughput_rps': len(samples) / elapsed if elapsed else 0,
+                'p50_s': percentile(latencies, 0.5),
+                'p90_s': percentile(latencies, 0.9),
+                'p95_s': percentile(latencies, 0.95),
+                'p99_s': percentile(latencies, 0.99),
+                'max_s': latencies[-1],
+                'p50_first_byte_s': percentile(first_bytes, 0.5) if first_bytes else None,
+                'over_timeout': sum(1 for latency in latencies if latency >= GUNICORN_TIMEOUT_SECONDS),
+                'error_rate': 1 - outcomes.get('ok', 0) / len(samples),
+                'outcomes': outcomes,
+            })
+
+        total = len(self.samples)
+        ok = sum(1 for sample in self.samples if sample['outcome'] == 'ok')
+        db_totals = [sum(sample.values()) for sample in self.db_samples]
+        db_active = [sample.get('active', 0) for sample in self.db_samples]
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'throughput_rps': total / elapsed if elapsed else 0,
+            'error_rate': 1 - ok / total if total else 0,
+            'endpoints': endpoints,
+            'db_connections': {
+                'samples': len(self.db_samples),
+                'peak_total': max(db_totals, default=0),
+                'avg_total': sum(db_totals) / len(db_totals) if db_totals else 0,
+                'peak_active': max(db_active, default=0),
+                'peak_idle_in_transaction': max(
+                    (sample.get('idle in transaction', 0) for sample in self.db_samples), default=0
+                ),
+            },
+        }
+
+
+def classify_response(response):
+    if response.status_code == 429:
+        return 'rate_limited'
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if response.headers.get('Content-Type', '').startswith('text/event-stream'):
+        return 'ok'
+    try:
+        payload = response.json()
+    except ValueError:
+        return 'bad_json'
+    if payload.get('success') is False:
+        return 'validation_error' if payload.get('validation_error') else 'app_error'
+    return 'ok'
+
+
+def send_step(session, metrics, base_url, label, path, payload):
+    started_at = time.time()
+    started = time.monotonic()
+    streaming = path.endswith('/stream')
+    try:
+        response = session.post(f"{base_url}{path}", json=payload, timeout=CLIENT_TIMEOUT_SECONDS, stream=streaming)
+        first_byte = None
+        if streaming:
+            for line in response.iter_lines():
+                if first_byte is None and line:
+                    first_byte = time.monotonic() - started
+        outcome = classify_response(response)
+        metrics.record(label, started_at, time.monotonic() - started, response.status_code, outcome, first_byte)
+        return outcome == 'ok'
+    except requests.Timeout:
+        metrics.record(label, started_at, time.monotonic() - started, None, 'client_timeout')
+    except requests.ConnectionError:
+        # gunicorn's sync worker timeout kills the worker mid-request, which surfaces as a dropped connection
+        metrics.record(label, started_at, time.monotonic() - started, None, 'disconnected')
+    return False
+
+
+def run_virtual_user(vu, args, metrics, base_url, image_url, scenario_weights, deadline, start_delay):
+    time.sleep(start_delay)
+    session = requests.Session()
+    telegram_user_id = LOAD_TEST_USER_ID_BASE + vu
+    send_step(session, metrics, base_url, 'redeem-key', '/redeem-key',
+              {'telegram_user_id': telegram_user_id, 'key': load_test_key(vu)})
+
+    names, weights = zip(*scenario_weights.items())
+    iterations = 0
+    while time.monotonic() < deadline and (not args.iterations or iterations < args.iterations):
+        scenario = random.choices(names, weights)[0]
+        for label, path, build_payload in SCENARIOS[scenario]:
+            if time.monotonic() >= deadline:
+                break
+            payload = build_payload(vu, image_url)
+            payload['telegram_user_id'] = telegram_user_id
+            if not send_step(session, metrics, base_url, label, path, payload):
+                break  # later stages of a flow depend on the earlier ones
+            if args.think_time:
+                time.sleep(random.uniform(0, args.think_time))
+        iterations += 1
+    session.close()
+
+
+def load_test_key(vu):
+    return f"LOADTEST{vu:06d}"
+
+
+def seed_users(count):
+    from database.operations import create_registration_key
+    cleanup_users(count)
+    for vu in range(count):
+        create_registration_key(load_test_key(vu), 1, None, LOAD_TEST_USER_ID_BASE + vu, notes=LOAD_TEST_KEY_NOTE)
+    print(f"🧪 LOAD TEST: Seeded {count} registration keys")
+
+
+def cleanup_users(count):
+    from database.operations import execute_query
+    user_ids = [LOAD_TEST_USER_ID_BASE + vu for vu in range(count)]
+    execute_query("DELETE FROM analysis_sessions WHERE telegram_user_id = ANY(%s)", (user_ids,))
+    execute_query("UPDATE registration_keys SET used_by = NULL WHERE notes = %s", (LOAD_TEST_KEY_NOTE,))
+    execute_query("DELETE FROM users WHERE telegram_user_id = ANY(%s)", (user_ids,))
+    execute_query("DELETE FROM registration_keys WHERE notes = %s", (LOAD_TEST_KEY_NOTE,))
+
+
+def sample_db_connections(metrics, interval, stop_event):
+    from database.operations import get_db_connection_counts
+    while not stop_event.wait(interval):
+        try:
+            counts = get_db_connection_counts()
+        except Exception as e:
+            print(f"🧪 LOAD TEST: ⚠️ DB sampling failed: {e}")
+            continue
+        with metrics.lock:
+            metrics.db_samples.append(counts)
+
+
+def start_app(args, mock_url):
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(args.app_port),
+        'OPENAI_BASE_URL': mock_url,
+        'OPENAI_API_KEY': env.get('OPENAI_API_KEY') or 'sk-mock',
+        'DATABASE_URL': Config.DATABASE_URL,
+    })
+    if not args.keep_rate_limits:
+        env['RATELIMIT_ENABLED'] = 'False'
+    for override in args.app_env:
+        name, value = override.split('=', 1)
+        env[name] = value
+
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:app',
+        f"--workers={args.workers}",
+        f"--worker-class={args.worker_class}",
+        f"--threads={args.threads}",
+        f"--timeout={GUNICORN_TIMEOUT_SECONDS}",
+        f"--bind=127.0.0.1:{args.app_port}",
+    ]
+    log_file = open(args.app_log, 'w')
+    process = subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True)
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app exited with {process.returncode}, see {args.app_log}")
+        try:
+            if requests.get(base_url + '/', timeout=2).status_code == 200:
+                print(f"🧪 LOAD TEST: App ready on {base_url} ({' '.join(command[3:])})")
+                return process, base_url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"app did not become ready, see {args.app_log}")
+
+
+def parse_scenarios(specs):
+    weights = {}
+    for spec in specs or ['multi_frame=3', 'single=2', 'technical=1']:
+        name, _, weight = spec.partition('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}', choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def print_report(summary, stage_latency):
+    print(f"\n🧪 LOAD TEST RESULTS ({summary['elapsed_s']:.0f}s, {summary['requests']} requests, "
+          f"{summary['throughput_rps']:.2f} req/s, error rate {summary['error_rate']:.1%})")
+    print(f"{'endpoint/stage':<26} {'n':>5} {'rps':>6} {'p50':>6} {'p90':>6} {'p95':>6} {'p99':>6} "
+          f"{'max':>6} {'>120s':>5} {'err':>6}  outcomes")
+    for row in summary['endpoints']:
+        print(f"{row['label']:<26} {row['count']:>5} {row['throughput_rps']:>6.2f} {row['p50_s']:>6.1f} "
+              f"{row['p90_s']:>6.1f} {row['p95_s']:>6.1f} {row['p99_s']:>6.1f} {row['max_s']:>6.1f} "
+              f"{row['over_timeout']:>5} {row['error_rate']:>6.1%}  {row['outcomes']}")
+
+    if stage_latency:
+        print(f"\n{'openai stage':<26} {'model':<12} {'n':>5} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} {'err':>6}")
+        for row in stage_latency:
+            print(f"{row['action_type']:<26} {row['model_name']:<12} {row['call_count']:>5} "
+                  f"{row['p50_latency_ms']:>7.0f} {row['p95_latency_ms']:>7.0f} {row['p99_latency_ms']:>7.0f} "
+                  f"{row['error_rate']:>6.1%}")
+
+    db = summary['db_connections']
+    print(f"\nPostgres connections: peak {db['peak_total']} (active {db['peak_active']}, "
+          f"idle in transaction {db['peak_idle_in_transaction']}), avg {db['avg_total']:.1f} "
+          f"over {db['samples']} samples")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end load test for the XFLEXAI analysis flows')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=120, help='Seconds to generate load')
+    parser.add_argument('--iterations', type=int, default=0, help='Stop each user after N scenarios (0 = until duration)')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users start')
+    parser.add_argument('--think-time', type=float, default=0, help='Max random pause between steps')
+    parser.add_argument('--scenario', action='append', help=f"NAME=WEIGHT, names: {', '.join(SCENARIOS)}")
+    parser.add_argument('--target', help='Base URL of an already running app (skips launching gunicorn)')
+    parser.add_argument('--database-url', help='Defaults to DATABASE_URL')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--app-port', type=int, default=5055)
+    parser.add_argument('--app-env', action='append', default=[], help='KEY=VALUE for the app process')
+    parser.add_argument('--app-log', default='load_test_app.log')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='Leave Flask-Limiter on in the app')
+    parser.add_argument('--image-port', type=int, default=8766)
+    parser.add_argument('--mock-port', type=int, default=8765)
+    parser.add_argument('--mock-arg', action='append', default=[],
+                        help='Extra tools.mock_openai_server argument, e.g. --mock-arg=--rate-limit-rate=0.05')
+    parser.add_argument('--db-sample-interval', type=float, default=1.0)
+    parser.add_argument('--keep-data', action='store_true', help='Leave seeded users and keys in the database')
+    parser.add_argument('--json-out', help='Write the configuration and results as JSON')
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.database_url:
+        Config.DATABASE_URL = args.database_url
+    if not Config.DATABASE_URL:
+        raise SystemExit('DATABASE_URL (or --database-url) must point at a local Postgres')
+    scenario_weights = parse_scenarios(args.scenario)
+
+    mock_server = start_mock_server(parse_mock_args(['--port', str(args.mock_port)] + args.mock_arg))
+    mock_url = f"http://127.0.0.1:{args.mock_port}/v1"
+    image_server = start_image_server(args.image_port)
+
+    def image_url(vu, timeframe):
+        return f"http://127.0.0.1:{args.image_port}/chart/{timeframe}/{SYMBOLS[vu % len(SYMBOLS)]}.png"
+
+    app_process = None
+    stop_event = threading.Event()
+    try:
+        if args.target:
+            base_url = args.target.rstrip('/')
+        else:
+            app_process, base_url = start_app(args, mock_url)
+        seed_users(args.users)
+
+        metrics = Metrics()
+        sampler = threading.Thread(target=sample_db_connections, args=(metrics, args.db_sample_interval, stop_event),
+                                   daemon=True)
+        sampler.start()
+
+        from database.operations import execute_query, get_openai_latency_percentiles
+        # openai_usage_events.created_at is the database's local time, so take the window start from it too
+        run_started_at = execute_query("SELECT LOCALTIMESTAMP AS now", fetch=True, dict_cursor=True)[0]['now']
+        started = time.monotonic()
+        deadline = started + args.ramp_up + args.duration
+        print(f"🧪 LOAD TEST: {args.users} users, scenarios {scenario_weights}, {args.duration:.0f}s after "
+              f"{args.ramp_up:.0f}s ramp-up")
+        threads = [
+            threading.Thread(
+                target=run_virtual_user,
+                args=(vu, args, metrics, base_url, image_url, scenario_weights, deadline,
+                      args.ramp_up * vu / max(1, args.users)),
+                daemon=True
+            )
+            for vu in range(args.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()) + CLIENT_TIMEOUT_SECONDS)
+        elapsed = time.monotonic() - started
+        stop_event.set()
+
+        summary = metrics.summarize(elapsed)
+        stage_latency = get_openai_latency_percentiles(since=run_started_at)
+        summary['openai_stages'] = stage_latency
+        summary['mock_counters'] = dict(mock_server.state.counters)
+        print_report(summary, stage_latency)
+
+        if args.json_out:
+            config = {key: value for key, value in vars(args).items() if key not in ('database_url',)}
+            with open(args.json_out, 'w') as handle:
+                json.dump({'config': config, 'scenarios': scenario_weights, 'results': summary}, handle, indent=2)
+            print(f"🧪 LOAD TEST: Results written to {args.json_out}")
+        return 0 if summary['requests'] else 1
+    finally:
+        stop_event.set()
+        if app_process and app_process.poll() is None:
+            os.killpg(app_process.pid, signal.SIGTERM)
+            app_process.wait(timeout=30)
+        if not args.keep_data:
+            try:
+                cleanup_users(args.users)
+            except Exception as e:
+                print(f"🧪 LOAD TEST: ⚠️ Cleanup failed: {e}")
+        image_server.shutdown()
+        mock_server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,417 @@
+# tools/mock_openai_server.py
+# Local stand-in for the OpenAI endpoints the app uses (GET /v1/models, POST /v1/chat/completions).
+# Run from the repo root:
+#   python -m tools.mock_openai_server --port 8765 --latency analysis=lognormal:12:0.3 --rate-limit-rate 0.05
+# and start the app with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-mock.
+#
+# The action is recognized from the system prompt. Detection answers come from a PNG tEXt chunk
+# "xflex-mock" in the chart image (e.g. "timeframe=H4;symbol=EUR/USD;frame=investing"), falling
+# back to --timeframe/--symbol/--frame; tools.mock_openai_server.build_chart_png() makes such images.
+import argparse
+import base64
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.length_fitter import fit_analysis_text
+from services.prompts import PROMPT_REGISTRY
+from tools.analysis_corpus import ANALYSIS_CORPUS
+
+MOCK_MODELS = ['gpt-4o', 'gpt-4o-mini']
+PNG_HINT_KEYWORD = b'xflex-mock'
+DATA_URL_PATTERN = re.compile(r'^data:image/[A-Za-z]+;base64,(.*)$', re.S)
+
+# System prompts the registry does not own, recognized by a fragment
+EXTRA_ACTION_MARKERS = (
+    ('shorten_analysis_text', 'لتقصير نصوص تحليلات التداول'),
+    ('extract_investing_data', 'trading data extractor'),
+)
+DETECTION_ACTIONS = ('detect_investing_frame', 'detect_timeframe', 'detect_currency')
+
+# Seconds per action group; override with --latency ACTION_OR_GROUP=DIST
+DEFAULT_LATENCY = {
+    'detection': 'lognormal:0.9:0.35',
+    'analysis': 'lognormal:9:0.3',
+    'default': 'lognormal:3:0.4',
+}
+
+# Prompt caching: prefixes of 1024+ tokens are cached in 128-token increments once seen
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT_TOKENS = 128
+
+
+def build_png_chunk(chunk_type, payload):
+    body = chunk_type + payload
+    return struct.pack('>I', len(payload)) + body + struct.pack('>I', zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def build_chart_png(width=800, height=500, **hints):
+    """A flat grey PNG carrying detection hints for the mock, e.g. build_chart_png(timeframe='M15')."""
+    raw_rows = b''.join(b'\x00' + b'\x80' * width for _ in range(height))
+    hint_text = ';'.join(f"{key}={value}" for key, value in hints.items()).encode('latin-1')
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        build_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)),
+        build_png_chunk(b'tEXt', PNG_HINT_KEYWORD + b'\x00' + hint_text),
+        build_png_chunk(b'IDAT', zlib.compress(raw_rows, 9)),
+        build_png_chunk(b'IEND', b''),
+    ))
+
+
+def read_png_hints(data):
+    """Hints from the xflex-mock tEXt chunk plus the image size, read without decoding pixels."""
+    hints = {}
+    if not data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return hints
+    offset = 8
+    while offset + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[offset:offset + 8])
+        payload = data[offset + 8:offset + 8 + length]
+        if chunk_type == b'IHDR':
+            hints['width'], hints['height'] = struct.unpack('>II', payload[:8])
+        elif chunk_type == b'tEXt' and payload.startswith(PNG_HINT_KEYWORD + b'\x00'):
+            for pair in payload[len(PNG_HINT_KEYWORD) + 1:].decode('latin-1').split(';'):
+                if '=' in pair:
+                    key, value = pair.split('=', 1)
+                    hints[key.strip()] = value.strip()
+        elif chunk_type == b'IDAT':
+            break
+        offset += 12 + length
+    return hints
+
+
+def parse_latency(spec):
+    """'fixed:S', 'uniform:A:B' or 'lognormal:MEDIAN:SIGMA' -> sampler returning seconds."""
+    kind, *values = spec.split(':')
+    values = [float(value) for value in values]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def estimate_text_tokens(text):
+    # Arabic runs close to 2.3 chars/token on gpt-4o, Latin text near 4
+    arabic_chars = sum(1 for char in text if '؀' <= char <= 'ۿ')
+    return max(1, int(arabic_chars / 2.3 + (len(text) - arabic_chars) / 4))
+
+
+def estimate_image_tokens(width, height, detail):
+    if detail == 'low' or not width or not height:
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return 85 + 170 * tiles
+
+
+class MockOpenAIState:
+    """Scripted behaviour shared by all handler threads."""
+
+    def __init__(self, args):
+        self.args = args
+        self.latency = {name: parse_latency(spec) for name, spec in DEFAULT_LATENCY.items()}
+        for override in args.latency:
+            name, spec = override.split('=', 1)
+            self.latency[name] = parse_latency(spec)
+        self.system_prompt_actions = {static: name for name, (static, _) in PROMPT_REGISTRY.items()}
+        self.seen_prefixes = set()
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def recognize_action(self, system_prompt):
+        if system_prompt in self.system_prompt_actions:
+            return self.system_prompt_actions[system_prompt]
+        for action_type, marker in EXTRA_ACTION_MARKERS:
+            if marker in system_prompt:
+                return action_type
+        return 'analysis' if re.search('[؀-ۿ]', system_prompt) else 'unrecognized'
+
+    def sample_latency(self, action_type):
+        group = 'detection' if action_type in DETECTION_ACTIONS else (
+            'default' if action_type in ('unrecognized', 'extract_investing_data') else 'analysis'
+        )
+        sampler = self.latency.get(action_type) or self.latency[group]
+        return max(0.0, sampler() * self.args.time_scale)
+
+    def cached_tokens(self, system_prompt, prompt_tokens):
+        prefix_tokens = estimate_text_tokens(system_prompt)
+        if prefix_tokens < CACHE_MIN_TOKENS:
+            return 0
+        with self.lock:
+            seen = system_prompt in self.seen_prefixes
+            self.seen_prefixes.add(system_prompt)
+        if not seen:
+            return 0
+        return min(prompt_tokens, prefix_tokens // CACHE_INCREMENT_TOKENS * CACHE_INCREMENT_TOKENS)
+
+    def scripted_content(self, action_type, hints, user_text):
+        args = self.args
+        if action_type == 'detect_timeframe':
+            return hints.get('timeframe', args.timeframe)
+        if action_type == 'detect_currency':
+            return hints.get('symbol', args.symbol)
+        if action_type == 'detect_investing_frame':
+            return f"{hints.get('frame', args.frame)},{hints.get('timeframe', args.timeframe)}"
+        if action_type == 'extract_investing_data':
+            return '{"current_price": 1.0842, "asset_name": "EUR/USD"}'
+        if action_type == 'shorten_analysis_text':
+            original = user_text.split('حرف):', 1)[-1].strip() or random.choice(ANALYSIS_CORPUS)
+            return fit_analysis_text(original, 1000)
+        analysis = random.choice(ANALYSIS_CORPUS)
+        if random.random() >= args.long_analysis_rate:
+            analysis = fit_analysis_text(analysis, 1000)
+        return analysis
+
+
+def split_messages(messages):
+    system_prompt = ''
+    user_text = ''
+    image_bytes = None
+    image_detail = None
+    for message in messages:
+        content = message.get('content')
+        parts = content if isinstance(content, list) else [{'type': 'text', 'text': content or ''}]
+        for part in parts:
+            if part.get('type') == 'text':
+                if message.get('role') == 'system':
+                    system_prompt += part['text']
+                else:
+                    user_text += part['text']
+            elif part.get('type') == 'image_url':
+                match = DATA_URL_PATTERN.match(part['image_url'].get('url', ''))
+                if match:
+                    image_bytes = base64.b64decode(match.group(1))
+                    image_detail = part['image_url'].get('detail', 'auto')
+    return system_prompt, user_text, image_bytes, image_detail
+
+
+def truncate_to_tokens(text, max_tokens):
+    if estimate_text_tokens(text) <= max_tokens:
+        return text, 'stop'
+    cut = len(text)
+    while cut > 0 and estimate_text_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.95)
+    return text[:cut], 'length'
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockOpenAI/1.0'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, error_type, code=None, headers=None):
+        self.send_json(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}, headers)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/v1/models', '/models'):
+            self.state.count('models')
+            created = int(time.time())
+            self.send_json(200, {'object': 'list', 'data': [
+                {'id': model, 'object': 'model', 'created': created, 'owned_by': 'mock'} for model in MOCK_MODELS
+            ]})
+        elif self.path.rstrip('/') == '/stats':
+            with self.state.lock:
+                self.send_json(200, dict(self.state.counters))
+        else:
+            self.send_error_json(404, f"Unknown path {self.path}", 'invalid_request_error')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error_json(400, 'Invalid JSON body', 'invalid_request_error')
+            return
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_error_json(404, f"Unknown path {self.path}", 'invalid_request_error')
+            return
+
+        state = self.state
+        args = state.args
+        model = request.get('model', 'gpt-4o')
+        system_prompt, user_text, image_bytes, image_detail = split_messages(request.get('messages', []))
+        action_type = state.recognize_action(system_prompt)
+        state.count(f"requests:{action_type}")
+
+        roll = random.random()
+        if roll < args.rate_limit_rate:
+            state.count('injected:429')
+            self.send_error_json(429, 'Rate limit reached for requests (mock)', 'requests', 'rate_limit_exceeded',
+                                 {'retry-after': str(args.retry_after), 'x-ratelimit-remaining-requests': '0'})
+            return
+        if roll < args.rate_limit_rate + args.error_rate:
+            state.count('injected:500')
+            time.sleep(state.sample_latency(action_type) * random.random())
+            self.send_error_json(500, 'The server had an error while processing your request (mock)', 'server_error')
+            return
+
+        hints = read_png_hints(image_bytes) if image_bytes else {}
+        content = state.scripted_content(action_type, hints, user_text)
+        content, finish_reason = truncate_to_tokens(content, request.get('max_tokens') or 4096)
+
+        prompt_tokens = estimate_text_tokens(system_prompt + user_text) + 7 * len(request.get('messages', []))
+        if image_bytes:
+            prompt_tokens += estimate_image_tokens(hints.get('width'), hints.get('height'), image_detail)
+        completion_tokens = estimate_text_tokens(content)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': state.cached_tokens(system_prompt, prompt_tokens)},
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:24]}"
+        latency = state.sample_latency(action_type)
+        rate_headers = {
+            'x-ratelimit-limit-requests': '10000',
+            'x-ratelimit-remaining-requests': '9999',
+            'x-ratelimit-limit-tokens': '2000000',
+            'x-ratelimit-remaining-tokens': str(2000000 - usage['total_tokens']),
+            'x-request-id': completion_id,
+        }
+
+        if request.get('stream'):
+            include_usage = (request.get('stream_options') or {}).get('include_usage')
+            self.stream_completion(completion_id, model, content, finish_reason,
+                                   usage if include_usage else None, latency, rate_headers)
+            return
+
+        time.sleep(latency)
+        self.send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'logprobs': None,
+                'finish_reason': finish_reason,
+            }],
+            'usage': usage,
+            'system_fingerprint': 'fp_mock',
+        }, rate_headers)
+
+    def stream_completion(self, completion_id, model, content, finish_reason, usage, latency, headers):
+        """Server-sent events: first token after ~20% of the latency, the rest spread evenly."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish=None, chunk_usage=None, with_choice=True):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'logprobs': None, 'finish_reason': finish}] if with_choice else [],
+            }
+            if usage is not None:
+                payload['usage'] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        pieces = [content[index:index + 12] for index in range(0, len(content), 12)] or ['']
+        try:
+            time.sleep(latency * 0.2)
+            chunk({'role': 'assistant', 'content': ''})
+            for piece in pieces:
+                chunk({'content': piece})
+                time.sleep(latency * 0.8 / len(pieces))
+            chunk({}, finish=finish_reason)
+            if usage is not None:
+                chunk(None, chunk_usage=usage, with_choice=False)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.state.count('stream_disconnects')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible mock for XFLEXAI tests and benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', action='append', default=[],
+                        help="ACTION_OR_GROUP=DIST, groups: detection/analysis/default, "
+                             "DIST: fixed:S | uniform:A:B | lognormal:MEDIAN:SIGMA")
+    parser.add_argument('--time-scale', type=float, default=1.0, help='Multiply every sampled latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of completions answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of completions answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--long-analysis-rate', type=float, default=0.3,
+                        help='Share of analyses returned over 1024 chars (exercises the length fitter)')
+    parser.add_argument('--timeframe', default='M15', help='Timeframe answer when the image carries no hint')
+    parser.add_argument('--symbol', default='EUR/USD', help='Symbol answer when the image carries no hint')
+    parser.add_argument('--frame', default='metatrader', help='Frame type answer when the image carries no hint')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+
+def make_mock_server(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.state = MockOpenAIState(args)
+    return server
+
+
+def start_mock_server(args):
+    """Start the mock on a daemon thread; returns the server (call .shutdown() to stop)."""
+    server = make_mock_server(args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    server = make_mock_server(parse_args(argv))
+    args = server.state.args
+    print(f"🧪 MOCK OPENAI: listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"🧪 MOCK OPENAI: stopped, counters: {server.state.counters}")
+
+
+if __name__ == '__main__':
+    main()
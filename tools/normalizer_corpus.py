@@ -0,0 +1,51 @@
+# tools/normalizer_corpus.py
+# Raw model answers seen from the detection prompts and what services/chart_normalizer.py must make of them.
+
+TIMEFRAME_CORPUS = [
+    ('M15', 'M15'), ('m15', 'M15'), ('15', 'M15'), ('15M', 'M15'), ('15 MIN', 'M15'),
+    ('15 MINUTES', 'M15'), ('TF: M15', 'M15'), ('TIMEFRAME: 15M', 'M15'), ('M15M', 'M15'),
+    ('FIFTEEN MINUTES', 'M15'), ('15-MIN', 'M15'), ('M 15', 'M15'),
+    ('M30', 'M30'), ('30MIN', 'M30'), ('THIRTY MINUTES', 'M30'), ('PERIOD: 30M', 'M30'),
+    ('M5', 'M5'), ('5M', 'M5'), ('5 MINUTES', 'M5'), ('FIVE MIN', 'M5'),
+    ('M1', 'M1'), ('1M', 'M1'), ('1 MINUTE', 'M1'), ('1-MIN', 'M1'),
+    ('H4', 'H4'), ('4H', 'H4'), ('4 HOURS', 'H4'), ('240M', 'H4'), ('FOUR HOURS', 'H4'), ('TIMEFRAME H4', 'H4'),
+    ('H1', 'H1'), ('1H', 'H1'), ('1 HOUR', 'H1'), ('60M', 'H1'), ('60 MIN', 'H1'), ('1-HOUR', 'H1'),
+    ('D1', 'D1'), ('1D', 'D1'), ('DAILY', 'D1'), ('1 DAY', 'D1'), ('DAY', 'D1'),
+    ('W1', 'W1'), ('1W', 'W1'), ('WEEKLY', 'W1'), ('1 WEEK', 'W1'), ('WEEK', 'W1'),
+    ('MN', 'MN'), ('MONTHLY', 'MN'), ('1 MONTH', 'MN'), ('MONTH', 'MN'),
+    ('', 'UNKNOWN'), ('UNKNOWN', 'UNKNOWN'), ('NOT FOUND', 'UNKNOWN'), ('NONE', 'UNKNOWN'),
+    ('N/A', 'UNKNOWN'), ('TIMEFRAME:', 'UNKNOWN'), ('???', 'UNKNOWN'), ('1234', 'UNKNOWN'),
+    ('THE CHART IS M15', 'M15'), ('M15 (15 MINUTES)', 'M15'),
+]
+
+FRAME_CORPUS = [
+    ('investing,15', ('investing', 'M15')),
+    ('investing, 4H', ('investing', 'H4')),
+    ('Investing,D1', ('investing', 'D1')),
+    ('stock_chart,1M', ('stock_chart', 'MN')),
+    ('stock_chart,6M', ('stock_chart', '6MN')),
+    ('stock_chart,5D', ('stock_chart', 'D5')),
+    ('stock_chart,YEAR', ('stock_chart', 'YTD')),
+    ('metatrader,M30', ('metatrader', 'M30')),
+    ('trading_app,1 day', ('trading_app', 'D1')),
+    ('tradingview,4 HOURS', ('unknown', 'H4')),
+    ('chart,1 day', ('stock_chart', 'D1')),
+    ('chart,Prev close 1D', ('stock_chart', 'PREV CLOSE 1D')),
+    ('unknown,ABC', ('unknown', 'ABC')),
+    ('investing,DUNNO', ('investing', 'DUNNO')),
+    ('no comma here', ('unknown', 'D1')),
+]
+
+SYMBOL_CORPUS = [
+    ('EURUSD', 'EUR/USD'), ('EUR/USD', 'EUR/USD'), ('eur usd', 'EUR/USD'), ('"GBPJPY"', 'GBP/JPY'),
+    ("'XAUUSD'", 'XAU/USD'), ('GOLD', 'XAU/USD'), ('XAU', 'XAU/USD'), ('SILVER', 'XAG/USD'),
+    ('S&P500', 'SPX'), ('SP500', 'SPX'), ('DJI', 'DOW'), ('NASDAQ', 'NQ'), ('CRUDE', 'WTI'),
+    ('AAPL', 'AAPL'), ('BRK.B', 'BRK.B'), ('BTCUSDT', 'BTCUSDT'), ('BTC/USD', 'BTC/USD'),
+    ('UNKNOWN', 'UNKNOWN'), ('NOT FOUND', 'UNKNOWN'), ('', 'UNKNOWN'), ('X', 'UNKNOWN'),
+    ('THIS IS NOT A SYMBOL', 'UNKNOWN'),
+]
+
+SAME_INSTRUMENT_CORPUS = [
+    ('EUR/USD', 'EURUSD', True), ('XAU/USD', 'xauusd', True), ('EUR USD', 'EUR/USD', True),
+    ('EUR/USD', 'GBP/USD', False), ('AAPL', 'aapl', True), ('SPX', 'NQ', False),
+]
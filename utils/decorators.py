@@ -1,9 +1,17 @@
 # utils/decorators.py
+import json
 from functools import wraps
-from flask import request, jsonify, session
-from database.operations import get_user_by_telegram_id
+from flask import request, jsonify, session, make_response, current_app, url_for
+from config import Config
+from database.operations import get_idempotent_response, get_user_by_telegram_id, store_idempotent_response
+from services.job_queue import enqueue_analysis_job, get_callback_target_error
+from services.single_flight import build_flight_key, payload_digest, run_single_flight
+from utils.structured_log import get_logger
 from datetime import datetime
 
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+logger = get_logger('decorators')
+
 
 def subscription_required(f):
     """
@@ -82,3 +90,194 @@ def admin_session_required(f):
 
     return decorated_function
 
+
+
+def build_request_flight_key():
+    """
+    (endpoint, telegram_user_id, action_type, body hash), or None without a user id.
+    A resent webhook repeats the same body (image_url included), so nothing is downloaded here.
+    """
+    data = request.get_json(silent=True) or {}
+    telegram_user_id = data.get('telegram_user_id')
+    if not telegram_user_id or not (data.get('image_url') or data.get('user_analysis')):
+        return None
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    action_type = data.get('action_type') or endpoint
+    return build_flight_key(endpoint, telegram_user_id, action_type, request_fingerprint())
+
+
+def single_flight_request(f):
+    """
+    Decorator that collapses identical concurrent analysis requests (same user, action
+    and image) into one run; duplicates replay the first request's response.
+    Place it below @subscription_required so rejected requests never join a flight.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.SINGLE_FLIGHT_ENABLED:
+            return f(*args, **kwargs)
+
+        flight_key = build_request_flight_key()
+        if not flight_key:
+            return f(*args, **kwargs)
+
+        result = run_single_flight(flight_key, lambda: response_to_result(f(*args, **kwargs)))
+        return result_to_response(result)
+
+    return decorated_function
+
+
+def response_to_result(rv):
+    """Flatten a view return value into the dict the replay tables store."""
+    response = make_response(rv)
+    return {
+        'status_code': response.status_code,
+        'mimetype': response.mimetype,
+        'response_body': response.get_data(as_text=True),
+    }
+
+
+def result_to_response(result, headers=None):
+    return current_app.response_class(
+        result['response_body'], status=result['status_code'], mimetype=result['mimetype'], headers=headers
+    )
+
+
+def get_idempotency_key():
+    data = request.get_json(silent=True) or {}
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('request_id')
+    return str(idempotency_key).strip() if idempotency_key else None
+
+
+def request_fingerprint():
+    """Hash of the JSON body minus request_id, so a key reused for a different request is caught."""
+    data = dict(request.get_json(silent=True) or {})
+    data.pop('request_id', None)
+    return payload_digest(json.dumps(data, sort_keys=True, separators=(',', ':'), default=str))
+
+
+def idempotent_request(f):
+    """
+    Decorator that stores the final response of a request sent with an Idempotency-Key
+    header (or request_id field) and replays it byte-for-byte on retries, without
+    calling OpenAI or touching the analysis session again.
+    Place it below @subscription_required and above @single_flight_request.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.IDEMPOTENCY_ENABLED:
+            return f(*args, **kwargs)
+
+        idempotency_key = get_idempotency_key()
+        if not idempotency_key:
+            return f(*args, **kwargs)
+
+        if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return jsonify({
+                'success': False,
+                'code': 'invalid_idempotency_key',
+                'message': f'Idempotency key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+            }), 400
+
+        data = request.get_json(silent=True) or {}
+        telegram_user_id = int(data.get('telegram_user_id'))
+        endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+        request_hash = request_fingerprint()
+
+        try:
+            stored = get_idempotent_response(endpoint, telegram_user_id, idempotency_key, Config.IDEMPOTENCY_TTL_SECONDS)
+        except Exception as e:
+            logger.warning('idempotency.lookup_failed', error=str(e))
+            stored = None
+
+        if stored:
+            if stored['request_hash'] != request_hash:
+                return jsonify({
+                    'success': False,
+                    'code': 'idempotency_key_reused',
+                    'message': 'This idempotency key was already used for a different request'
+                }), 422
+            logger.info('idempotency.replayed', endpoint=endpoint, idempotency_key=idempotency_key)
+            return result_to_response(stored, headers={'Idempotent-Replayed': 'true'})
+
+        def compute():
+            result = response_to_result(f(*args, **kwargs))
+            # Server errors stay retryable
+            if result['status_code'] < 500:
+                try:
+                    store_idempotent_response(
+                        endpoint, telegram_user_id, idempotency_key, request_hash,
+                        result['status_code'], result['mimetype'], result['response_body'],
+                        Config.IDEMPOTENCY_TTL_SECONDS
+                    )
+                except Exception as e:
+                    logger.warning('idempotency.store_failed', idempotency_key=idempotency_key, error=str(e))
+            return result
+
+        # Retries that arrive while the first attempt is still running wait for it
+        flight_key = build_flight_key(
+            endpoint, telegram_user_id, 'idempotency', payload_digest(idempotency_key + request_hash)
+        )
+        return result_to_response(run_single_flight(flight_key, compute))
+
+    return decorated_function
+
+
+def is_async_request(data):
+    value = data.get('async')
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def async_job_request(f):
+    """
+    Decorator for "async": true requests: enqueue the job for services.job_worker and
+    answer 202 with a job id right away instead of holding a gunicorn worker for the
+    whole OpenAI chain. Results are polled from /jobs/<job_id> or POSTed to callback_url.
+    Place it below @idempotent_request so a retried enqueue replays the same job id.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        if not Config.ASYNC_JOBS_ENABLED or not is_async_request(data):
+            return f(*args, **kwargs)
+
+        # Let the handler answer malformed requests synchronously
+        if not data.get('image_url'):
+            return f(*args, **kwargs)
+
+        callback_url = data.get('callback_url')
+        callback_error = get_callback_target_error(callback_url) if callback_url else None
+        if callback_error:
+            logger.warning('job.callback_rejected', reason=callback_error)
+            return jsonify({
+                'success': False,
+                'code': 'invalid_callback_url',
+                'message': 'callback_url must be an allowed http(s) URL'
+            }), 400
+
+        try:
+            job = enqueue_analysis_job(
+                int(data.get('telegram_user_id')),
+                (request.endpoint or '').rsplit('.', 1)[-1],
+                request.path,
+                data,
+                callback_url=callback_url
+            )
+        except Exception as e:
+            logger.exception('job.enqueue_failed', error=str(e))
+            return jsonify({
+                'success': False,
+                'code': 'enqueue_failed',
+                'message': 'Could not queue the analysis, please retry'
+            }), 503
+
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'status_url': url_for('api_bp.get_analysis_job_status', job_id=job['job_id'], _external=True)
+        }), 202
+
+    return decorated_function
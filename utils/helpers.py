@@ -1,16 +1,14 @@
 # utils/helpers.py
-import time
 from datetime import datetime
-from services.openai_service import init_openai, OPENAI_AVAILABLE, openai_error_message, openai_last_check
+from services.openai_health import get_openai_status
 from database.operations import get_user_by_telegram_id
 
 def check_openai_status():
-    """Refresh OpenAI status if older than 5 minutes and return status dict."""
-    if time.time() - openai_last_check > 300:
-        init_openai()
+    """Current shared OpenAI status; a stale one is refreshed in the background."""
+    status = get_openai_status()
     return {
-        "openai_available": OPENAI_AVAILABLE,
-        "openai_error": openai_error_message
+        "openai_available": status['available'],
+        "openai_error": status['error']
     }
 
 def is_user_active_and_days_left(telegram_user_id):
@@ -0,0 +1,60 @@
+# utils/keyword_scanner.py
+
+
+class KeywordScanner:
+    """
+    A fixed set of keyword groups matched against analysis text. The keywords are
+    normalized once here and the text once per call; each keyword is then located
+    with str.find/`in`, which in CPython beats a per-character automaton walk for
+    keyword sets this size (see tools/bench_keyword_scanner.py).
+    """
+
+    def __init__(self, ignore_case=True, **groups):
+        self.ignore_case = ignore_case
+        self.groups = {}
+        for name, keywords in groups.items():
+            normalized = (keyword.lower() if ignore_case else keyword for keyword in keywords)
+            self.groups[name] = tuple(dict.fromkeys(normalized))
+        self.keywords = tuple(dict.fromkeys(keyword for keywords in self.groups.values() for keyword in keywords))
+
+    def prepare(self, text):
+        if not text:
+            return ''
+        return text.lower() if self.ignore_case else text
+
+    def scan(self, text):
+        """Every keyword occurrence, overlapping ones included, as (offset, keyword) sorted by offset."""
+        prepared = self.prepare(text)
+        hits = []
+        for keyword in self.keywords:
+            offset = prepared.find(keyword)
+            while offset != -1:
+                hits.append((offset, keyword))
+                offset = prepared.find(keyword, offset + 1)
+        hits.sort()
+        return hits
+
+    def first_offsets(self, text):
+        """{keyword: offset of its first occurrence} for the keywords present, in declaration order."""
+        prepared = self.prepare(text)
+        offsets = {}
+        for keyword in self.keywords:
+            offset = prepared.find(keyword)
+            if offset != -1:
+                offsets[keyword] = offset
+        return offsets
+
+    def found(self, text):
+        prepared = self.prepare(text)
+        return {keyword for keyword in self.keywords if keyword in prepared}
+
+    def matched_groups(self, text):
+        """Names of the groups with at least one keyword in the text."""
+        prepared = self.prepare(text)
+        matched = set()
+        for name, keywords in self.groups.items():
+            for keyword in keywords:
+                if keyword in prepared:
+                    matched.add(name)
+                    break
+        return matched
@@ -0,0 +1,174 @@
+# utils/structured_log.py
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context
+from config import Config
+
+ROOT_LOGGER_NAME = 'xflexai'
+# Request fields every event of an analysis request carries (set by set_openai_usage_context)
+CONTEXT_FIELDS = ('endpoint_name', 'telegram_user_id', 'flow_id')
+
+_setup_lock = threading.Lock()
+_listener = None
+_listener_pid = None
+_dropped_records = 0
+
+
+def format_field_value(value):
+    if isinstance(value, str):
+        if value and not any(char.isspace() or char in '="' for char in value):
+            return value
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, float):
+        return f"{value:.3f}".rstrip('0').rstrip('.')
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """`2026-10-19T12:00:00.123Z INFO xflexai.api analyze.completed key=value ...`"""
+
+    def format(self, record):
+        created = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))
+        line = f"{created}.{int(record.msecs):03d}Z {record.levelname} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={format_field_value(value)}" for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without ever blocking the request: a full
+    queue drops the record. The listener is (re)started lazily in each process,
+    since gunicorn workers fork after the app module is imported.
+    """
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, keep the traceback out of the message so it follows the fields
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global _dropped_records
+        ensure_listener(self)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped_records += 1
+
+
+def ensure_listener(queue_handler):
+    global _listener, _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _setup_lock:
+        if _listener_pid == os.getpid():
+            return
+        # A queue inherited through fork may have been locked by the parent's listener thread
+        queue_handler.queue = queue.Queue(maxsize=max(1, Config.LOG_QUEUE_SIZE))
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(KeyValueFormatter())
+        _listener = QueueListener(queue_handler.queue, stream_handler)
+        _listener.start()
+        if _listener_pid is None:
+            atexit.register(stop_logging)
+        _listener_pid = os.getpid()
+
+
+def stop_logging():
+    """Flush queued records; for scripts and tools/ that exit right after their work."""
+    global _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener_pid = None
+
+
+def configure_logging():
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if root.handlers:
+        return root
+    with _setup_lock:
+        if not root.handlers:
+            root.setLevel(getattr(logging, Config.LOG_LEVEL, logging.INFO))
+            root.addHandler(DroppingQueueHandler(queue.Queue(maxsize=max(1, Config.LOG_QUEUE_SIZE))))
+            root.propagate = False
+    return root
+
+
+def get_request_fields():
+    if not has_request_context():
+        return {}
+    usage_context = getattr(g, 'openai_usage_context', None) or {}
+    return {key: usage_context[key] for key in CONTEXT_FIELDS if usage_context.get(key) is not None}
+
+
+def should_log_bodies():
+    """One sampling decision per request, so a sampled request logs all of its bodies."""
+    if not has_request_context():
+        return random.random() < Config.LOG_BODY_SAMPLE_RATE
+    if not hasattr(g, 'log_bodies_sampled'):
+        g.log_bodies_sampled = random.random() < Config.LOG_BODY_SAMPLE_RATE
+    return g.log_bodies_sampled
+
+
+class EventLogger(logging.LoggerAdapter):
+    """
+    logger.info('stage.event', key=value, ...): the message is a short event name,
+    the keyword arguments become key=value fields after the request context fields
+    (None values are left out).
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def log(self, level, event, *args, exc_info=None, **fields):
+        if not self.isEnabledFor(level):
+            return
+        fields = {key: value for key, value in fields.items() if value is not None}
+        self.logger.log(level, event, *args, exc_info=exc_info,
+                        extra={'fields': {**get_request_fields(), **fields}})
+
+    def body(self, event, body, **fields):
+        """A request/response body, logged for LOG_BODY_SAMPLE_RATE of requests (always at DEBUG)."""
+        debug = self.isEnabledFor(logging.DEBUG)
+        if not debug and not (self.isEnabledFor(logging.INFO) and should_log_bodies()):
+            return
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False, default=str)
+        truncated = len(text) > Config.LOG_BODY_MAX_CHARS
+        self.log(logging.DEBUG if debug else logging.INFO, event, chars=len(text), truncated=truncated,
+                 body=text[:Config.LOG_BODY_MAX_CHARS], **fields)
+
+
+def get_logger(name):
+    configure_logging()
+    return EventLogger(logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}"))
+
+
+def get_logging_stats():
+    """Queue depth and dropped records, for /status."""
+    handlers = logging.getLogger(ROOT_LOGGER_NAME).handlers
+    record_queue = handlers[0].queue if handlers else None
+    return {
+        'level': Config.LOG_LEVEL,
+        'body_sample_rate': Config.LOG_BODY_SAMPLE_RATE,
+        'queued': record_queue.qsize() if record_queue is not None else 0,
+        'dropped': _dropped_records
+    }